@@ -0,0 +1,61 @@
+"""CPU cost versus bytes saved by gzip on typical API payloads.
+
+Builds /api/transactions-shaped bodies of several sizes and the currency codes
+list, then reports compressed size and compression time per zlib level.
+
+    uv run python -m benchmarks.compression
+"""
+import gzip
+import random
+import time
+from datetime import datetime, timedelta
+
+from src.expenis.server.application import currency_codes_payload
+from src.expenis.server.dto import Transaction, TransactionsResponse
+
+LEVELS = (1, 6, 9)
+ACCOUNTS = [("Наличные", "RUB"), ("Тинькофф", "RUB"), ("Wise", "EUR")]
+CATEGORIES = ["Продукты", "Кафе и рестораны", "Транспорт", "Зарплата", "Подписки", "Здоровье"]
+
+
+def _transactions(count: int) -> bytes:
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    rows = []
+    for i in range(count):
+        account_id = rng.randrange(len(ACCOUNTS))
+        category_id = rng.randrange(len(CATEGORIES))
+        amount = round(rng.uniform(50, 5000), 2)
+        rows.append(Transaction(
+            id=i + 1, account=ACCOUNTS[account_id][0], account_id=account_id + 1,
+            type="income" if category_id == 3 else "expense", category=CATEGORIES[category_id],
+            category_id=category_id + 1, amount=amount, amount_rubles=amount,
+            description=rng.choice([None, "", "обед", "такси до дома"]), tags=rng.choice([[], ["работа"]]),
+            currency_code=ACCOUNTS[account_id][1], created_at=start + timedelta(minutes=37 * i),
+        ))
+    response = TransactionsResponse(transactions=rows, total_amount_rubles=sum(r.amount_rubles for r in rows))
+    return response.model_dump_json().encode("utf-8")
+
+
+def _measure(body: bytes, level: int) -> tuple[int, float]:
+    repeat = max(3, 2_000_000 // len(body))
+    start = time.process_time()
+    for _ in range(repeat):
+        compressed = gzip.compress(body, level, mtime=0)
+    return len(compressed), (time.process_time() - start) / repeat
+
+
+def main() -> None:
+    payloads = {f"{n} transactions": _transactions(n) for n in (10, 100, 1000, 10000)}
+    payloads["currency codes"] = currency_codes_payload()[0]
+    print(f"{'payload':<20} {'raw':>10} " + " ".join(f"{f'level {level}':>26}" for level in LEVELS))
+    for name, body in payloads.items():
+        cells = []
+        for level in LEVELS:
+            size, seconds = _measure(body, level)
+            cells.append(f"{size:>9} ({size / len(body):4.0%}) {seconds * 1e3:7.2f} ms")
+        print(f"{name:<20} {len(body):>10} " + " ".join(f"{cell:>26}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
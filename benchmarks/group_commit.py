@@ -0,0 +1,83 @@
+"""Write throughput of many concurrent clients, one commit per write versus group commit.
+
+Each client is a task that saves transactions back to back through
+``save_transaction`` for ``--seconds``; the database lives on the temp
+directory's filesystem, so the fsync cost is that disk's.
+
+    uv run python -m benchmarks.group_commit --clients 1 16 64
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ExPenis group commit write throughput")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-delay-ms", type=float, default=0)
+    return parser.parse_args()
+
+
+async def _run(args: argparse.Namespace, clients: int, grouped: bool) -> None:
+    from src.expenis.core.group_commit import start_group_commit, stop_group_commit
+    from src.expenis.core.models import Account, Category, Transaction, db
+    from src.expenis.core.service.transaction_service import save_transaction
+
+    account = await db.run(lambda: Account.create(user_id=1, name="cash", adjustment_amount=0))
+    category = await db.run(lambda: Category.create(user_id=1, name="food", type="expense"))
+    if grouped:
+        start_group_commit(args.max_batch, args.max_delay_ms / 1000, 1 << 20)
+    latencies = []
+    deadline = time.perf_counter() + args.seconds
+
+    async def client() -> None:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await save_transaction(Transaction(user_id=1, account=account, category=category, amount=1.0))
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(asyncio.create_task(client()) for _ in range(clients)))
+    await stop_group_commit()
+    p50 = statistics.median(latencies) * 1e3
+    p99 = statistics.quantiles(latencies, n=100)[98] * 1e3 if len(latencies) > 1 else p50
+    print(f"{'group' if grouped else 'per-write':<10} {clients:>4} clients: {len(latencies) / args.seconds:>8.0f} "
+          f"writes/s  p50 {p50:6.1f} ms  p99 {p99:6.1f} ms")
+
+
+def main() -> int:
+    args = _parse_args()
+    directory = tempfile.mkdtemp(prefix="expenis-group-commit-")
+    # Must be set before the app is imported.
+    os.environ.update({
+        "database_path": os.path.join(directory, "bench.db"),
+        "sql_slow_query_ms": "100000",
+        # Compare commit strategies, not the admission queue.
+        "db_write_queue": str(max(args.clients) + 1),
+        "LOG_LEVEL": "WARNING",
+    })
+
+    from src.expenis.core.seed import create_schema
+    create_schema(os.environ["database_path"])
+
+    async def all_runs() -> None:
+        from src.expenis.core.models import db
+        for clients in args.clients:
+            for grouped in (False, True):
+                await _run(args, clients, grouped)
+        await db.close_pool()
+
+    # One "transaction saved" line per write would dominate the measurement.
+    logging.getLogger("src.expenis.core.service.transaction_service").setLevel(logging.WARNING)
+    asyncio.run(all_runs())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Cost of an INFO log call on the request path.
+
+Logs the same access-style record through file + console handlers called
+directly (the previous setup) and through the queue handler, whose listener
+thread does the formatting and I/O. Console output goes to /dev/null, the file
+to a temporary directory.
+
+    uv run python -m benchmarks.logging_overhead
+"""
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from src.expenis.core.logging_config import LOG_DATE_FORMAT, LOG_FORMAT, BackgroundQueueHandler
+from src.expenis.core.tracing import TraceIdFilter
+
+RECORDS = 50_000
+
+
+def _outputs(directory: Path, devnull) -> list[logging.Handler]:
+    handlers = [logging.FileHandler(directory / "bench.log", encoding="utf-8"), logging.StreamHandler(devnull)]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT))
+    return handlers
+
+
+def _drive(logger: logging.Logger) -> float:
+    start = time.perf_counter()
+    for i in range(RECORDS):
+        logger.info('%s - "%s %s HTTP/1.1" %d', "127.0.0.1:5000", "GET", f"/api/transactions/{i}", 200)
+    return time.perf_counter() - start
+
+
+def _run(handlers: list[logging.Handler]) -> tuple[float, float]:
+    logger = logging.getLogger("bench")
+    logger.handlers = handlers
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    call = _drive(logger)
+    start = time.perf_counter()
+    for handler in handlers:
+        handler.close()
+    return call, call + time.perf_counter() - start
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        directory = Path(tmp)
+        direct = _outputs(directory, devnull)
+        for handler in direct:
+            handler.addFilter(TraceIdFilter())
+        direct_call, _ = _run(direct)
+
+        queued = BackgroundQueueHandler(_outputs(directory, devnull))
+        queued.addFilter(TraceIdFilter())
+        queued_call, queued_total = _run([queued])
+
+    print(f"direct handlers: {direct_call / RECORDS * 1e6:.2f} us/record on the caller")
+    print(f"queue handler:   {queued_call / RECORDS * 1e6:.2f} us/record on the caller "
+          f"({queued_total / RECORDS * 1e6:.2f} us/record until drained)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Per-request cost of MetricsMiddleware.
+
+Drives a bare ASGI app directly (no HTTP, no event loop switches) with and
+without the middleware and prints the difference per request.
+
+    uv run python -m benchmarks.metrics_overhead
+"""
+import asyncio
+import time
+
+from src.expenis.server.middleware import MetricsMiddleware
+
+REQUESTS = 200_000
+
+
+class _Route:
+    path = "/api/transactions/{transaction_id}"
+
+
+async def _app(scope, receive, send):
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+async def _drive(app) -> float:
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await app({"type": "http", "method": "GET", "path": "/api/transactions/1"}, _receive, _send)
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    instrumented = MetricsMiddleware(_app)
+    await _drive(_app)
+    await _drive(instrumented)
+    bare = await _drive(_app)
+    with_metrics = await _drive(instrumented)
+    overhead_us = (with_metrics - bare) / REQUESTS * 1e6
+    print(f"bare:         {bare / REQUESTS * 1e6:.2f} us/request")
+    print(f"with metrics: {with_metrics / REQUESTS * 1e6:.2f} us/request")
+    print(f"overhead:     {overhead_us:.2f} us/request")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,203 @@
+"""API benchmark suite.
+
+Seeds a throwaway database with deterministic data, drives the real FastAPI
+app in-process through httpx's ASGI transport and records throughput,
+latency percentiles and peak RSS per scenario.
+
+    uv run python -m benchmarks.run                     # compare with benchmarks/baseline.json
+    uv run python -m benchmarks.run --save-baseline     # record a new baseline
+    uv run python -m benchmarks.run --transactions 1000000 --requests 500
+
+The run fails (exit code 1) when a scenario's p95 latency or the peak RSS
+grows, or its throughput drops, by more than ``--tolerance`` against the
+baseline. Baselines are machine specific: record and compare on the same host.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ExPenis API benchmarks")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--transactions", type=int, default=200_000, help="transactions per user")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--db", help="database file (default: a fresh temporary file)")
+    return parser.parse_args()
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1] if len(samples) > 1 else samples[0]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def _measure(name: str, requests: int, concurrency: int, call) -> dict:
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            response = await call(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: HTTP {response.status_code} {response.text[:200]}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    result = {
+        "requests": requests,
+        "rps": round(requests / elapsed, 2),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+    }
+    print(f"{name:<22} {result['rps']:>9.1f} req/s  p50 {result['p50_ms']:>8.2f}ms  "
+          f"p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms")
+    return result
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from src.expenis.core.models import Account, Category, Transaction, User, db
+    from src.expenis.core.seed import SEED_ANCHOR, SEED_PASSWORD, prime_exchange_rates, seed
+    from src.expenis.server.application import app, lifespan
+
+    async with lifespan(app):
+        stats = await seed(args.users, args.transactions, seed=args.seed)
+        print(f"seeded {stats.transactions} transactions for {stats.users} users in {stats.seconds:.1f}s")
+        prime_exchange_rates()
+
+        usernames = [f"seed{args.seed}-user{i}" for i in range(args.users)]
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            tokens = []
+            for username in usernames:
+                response = await client.post("/api/login", json={"username": username, "password": SEED_PASSWORD})
+                response.raise_for_status()
+                tokens.append(response.json()["access_token"])
+            headers = [{"Authorization": f"Bearer {token}"} for token in tokens]
+
+            user_ids = [await db.run(lambda u=u: User.get(User.username == u).id) for u in usernames]
+            accounts = [await db.run(lambda uid=uid: Account.select().where(Account.user_id == uid).first().id)
+                        for uid in user_ids]
+            categories = [await db.run(lambda uid=uid: Category.select().where(
+                (Category.user_id == uid) & (Category.type == 'expense')).first().id) for uid in user_ids]
+            transactions = [await db.run(lambda uid=uid: Transaction.select(Transaction.id).where(
+                Transaction.user_id == uid).order_by(Transaction.id.desc()).first().id) for uid in user_ids]
+
+            month_start = (SEED_ANCHOR - timedelta(days=30)).date()
+            period = {"date_from": month_start.isoformat(), "date_to": SEED_ANCHOR.date().isoformat()}
+            n = len(usernames)
+
+            def user(i: int) -> int:
+                return i % n
+
+            def transaction_body(i: int) -> dict:
+                return {"account_id": accounts[user(i)], "category_id": categories[user(i)],
+                        "amount": -100.0 - i, "description": f"bench #{i}",
+                        "created_at": SEED_ANCHOR.isoformat()}
+
+            scenarios = {
+                "list_transactions": lambda i: client.get("/api/transactions", params=period,
+                                                          headers=headers[user(i)]),
+                "create_transaction": lambda i: client.post("/api/transactions", json=transaction_body(i),
+                                                            headers=headers[user(i)]),
+                "update_transaction": lambda i: client.put(f"/api/transactions/{transactions[user(i)]}",
+                                                           json=transaction_body(i), headers=headers[user(i)]),
+                "accounts": lambda i: client.get("/api/accounts", headers=headers[user(i)]),
+                "categories": lambda i: client.get("/api/categories", headers=headers[user(i)]),
+                # bcrypt bound by design, fewer requests keep the run short.
+                "login": lambda i: client.post("/api/login", json={"username": usernames[user(i)],
+                                                                   "password": SEED_PASSWORD}),
+            }
+            results = {}
+            for name, call in scenarios.items():
+                requests = max(args.concurrency, args.requests // 10) if name == "login" else args.requests
+                results[name] = await _measure(name, requests, args.concurrency, call)
+
+    return {
+        "meta": {
+            "users": args.users,
+            "transactions_per_user": args.transactions,
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "scenarios": results,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    if baseline.get("meta") != result["meta"]:
+        print("warning: baseline was recorded with different parameters, comparison is approximate")
+    for name, current in result["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['rps']} -> {current['rps']} req/s")
+    if "peak_rss_mb" in baseline and result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(f"peak RSS {baseline['peak_rss_mb']}MB -> {result['peak_rss_mb']}MB")
+    return regressions
+
+
+def main() -> int:
+    args = _parse_args()
+    db_path = args.db or str(Path(tempfile.mkdtemp(prefix="expenis-bench-")) / "bench.db")
+    # Must be set before the app (and its db) is imported.
+    os.environ["database_path"] = db_path
+    os.environ.setdefault("loop_monitor", "0")
+    os.environ.setdefault("sql_slow_query_ms", "1000")
+
+    from src.expenis.core.seed import create_schema
+    if not Path(db_path).exists():
+        create_schema(db_path)
+
+    result = asyncio.run(_run(args))
+    print(f"peak RSS {result['peak_rss_mb']}MB")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline saved to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}, run with --save-baseline first")
+        return 0
+    regressions = _compare(result, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Read throughput of the real server by number of worker processes and runtime profile.
+
+Seeds a throwaway database, starts ``python -m src.expenis.server --workers N
+--profile P`` on a local port for each combination, and hammers
+/api/transactions and /api/accounts from several client processes. Scaling is
+bounded by the host's cores, the clients run on the same host and take their
+share.
+
+    uv run python -m benchmarks.workers --workers 1 2 4
+    uv run python -m benchmarks.workers --workers 1 --profiles default production
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ExPenis multi-worker read scaling")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--profiles", nargs="+", default=["default"], choices=["default", "production"])
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--transactions", type=int, default=20_000, help="transactions per user")
+    parser.add_argument("--clients", type=int, default=8, help="client processes")
+    parser.add_argument("--connections", type=int, default=4, help="concurrent requests per client process")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    return parser.parse_args()
+
+
+def _client(base_url: str, paths: list[tuple[str, dict, dict]], connections: int, seconds: float, results) -> None:
+    import httpx
+
+    async def run() -> int:
+        done = 0
+        deadline = time.perf_counter() + seconds
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            async def loop(offset: int) -> None:
+                nonlocal done
+                i = offset
+                while time.perf_counter() < deadline:
+                    path, params, headers = paths[i % len(paths)]
+                    response = await client.get(path, params=params, headers=headers)
+                    response.raise_for_status()
+                    done += 1
+                    i += connections
+            await asyncio.gather(*(loop(k) for k in range(connections)))
+        return done
+
+    results.put(asyncio.run(run()))
+
+
+def _wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/api/currency/codes", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+async def _prepare(args: argparse.Namespace) -> list[tuple[str, dict, dict]]:
+    from src.expenis.core.models import User, db
+    from src.expenis.core.seed import SEED_ANCHOR, prime_exchange_rates, seed
+    from src.expenis.server.application import auth
+
+    await db.aconnect()
+    try:
+        stats = await seed(args.users, args.transactions)
+        print(f"seeded {stats.transactions} transactions for {stats.users} users in {stats.seconds:.1f}s")
+        user_ids = [await db.run(lambda u=u: User.get(User.username == f"seed42-user{u}").id)
+                    for u in range(args.users)]
+    finally:
+        await db.aclose()
+        await db.close_pool()
+    # Workers read the rates from the shared cache instead of the upstream APIs.
+    prime_exchange_rates()
+
+    period = {"date_from": (SEED_ANCHOR - timedelta(days=30)).date().isoformat(),
+              "date_to": SEED_ANCHOR.date().isoformat()}
+    paths = []
+    for user_id in user_ids:
+        headers = {"Authorization": f"Bearer {auth.create_access_token(uid=str(user_id))}"}
+        paths.append(("/api/transactions", period, headers))
+        paths.append(("/api/accounts", {}, headers))
+    return paths
+
+
+def main() -> int:
+    args = _parse_args()
+    directory = Path(tempfile.mkdtemp(prefix="expenis-workers-"))
+    # Must be set before the app is imported; the servers inherit it.
+    os.environ.update({
+        "database_path": str(directory / "bench.db"),
+        "worker_state_dir": str(directory / "run"),
+        "shared_cache": "1",
+        "backup_interval_hours": "0",
+        "loop_monitor": "0",
+        "sql_slow_query_ms": "1000",
+        "LOG_LEVEL": "WARNING",
+    })
+
+    from src.expenis.core.seed import create_schema
+    create_schema(os.environ["database_path"])
+    paths = asyncio.run(_prepare(args))
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    baseline = None
+    for profile, workers in [(profile, workers) for profile in args.profiles for workers in args.workers]:
+        server = subprocess.Popen([sys.executable, "-m", "src.expenis.server", "--host", "127.0.0.1",
+                                   "--port", str(args.port), "--workers", str(workers), "--profile", profile,
+                                   "--no-reload"],
+                                  cwd=directory, env={**os.environ, "PYTHONPATH": str(ROOT)})
+        try:
+            _wait_ready(base_url, server)
+            results = multiprocessing.Queue()
+            clients = [multiprocessing.Process(target=_client,
+                                               args=(base_url, paths, args.connections, args.seconds, results))
+                       for _ in range(args.clients)]
+            for client in clients:
+                client.start()
+            requests = sum(results.get() for _ in clients)
+            for client in clients:
+                client.join()
+        finally:
+            server.terminate()
+            server.wait(30)
+        rps = requests / args.seconds
+        baseline = baseline or rps
+        print(f"{profile:<10} {workers:>2} workers: {rps:>9.1f} req/s  x{rps / baseline:.2f}")
+    print(f"host has {os.cpu_count()} CPUs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
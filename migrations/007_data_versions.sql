@@ -0,0 +1,11 @@
+-- 007: per-user monotonically increasing data version.
+--
+-- Bumped in the same transaction as every write to a user's accounts,
+-- categories, transactions or tags. The API exposes it as a weak ETag so
+-- clients can revalidate list endpoints with If-None-Match and get a 304
+-- without the server touching the underlying rows.
+CREATE TABLE IF NOT EXISTS data_versions
+(
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
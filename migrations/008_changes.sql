@@ -0,0 +1,28 @@
+-- 008: append-only change log for delta sync.
+--
+-- One row per write to a user's transactions, accounts, categories or tags.
+-- `id` is the sync cursor: /api/sync?since=<id> returns everything the user
+-- changed after it. Deletes (including account soft-deletes) are recorded
+-- as op = 'delete' rows, which act as tombstones for offline clients.
+CREATE TABLE IF NOT EXISTS changes
+(
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id    INTEGER NOT NULL,
+    entity     TEXT    NOT NULL CHECK (entity IN ('transaction', 'account', 'category', 'tag')),
+    entity_id  INTEGER NOT NULL,
+    op         TEXT    NOT NULL CHECK (op IN ('upsert', 'delete')),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_changes_user_id_id ON changes (user_id, id);
+
+-- Backfill: one upsert per existing live row, so a first sync with since=0
+-- returns the full current state.
+INSERT INTO changes (user_id, entity, entity_id, op)
+SELECT user_id, 'account', id, 'upsert' FROM accounts WHERE is_deleted = FALSE;
+INSERT INTO changes (user_id, entity, entity_id, op)
+SELECT user_id, 'category', id, 'upsert' FROM categories;
+INSERT INTO changes (user_id, entity, entity_id, op)
+SELECT user_id, 'tag', id, 'upsert' FROM tags;
+INSERT INTO changes (user_id, entity, entity_id, op)
+SELECT user_id, 'transaction', id, 'upsert' FROM transactions ORDER BY created_at;
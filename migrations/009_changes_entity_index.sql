@@ -0,0 +1,3 @@
+-- 009: per-section versions for /api/bootstrap are MAX(id) of the user's
+-- changes per entity; this index answers them without scanning the log.
+CREATE INDEX IF NOT EXISTS idx_changes_user_id_entity_id ON changes (user_id, entity, id);
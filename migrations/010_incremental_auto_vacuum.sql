@@ -0,0 +1,10 @@
+-- 010: switch to incremental auto-vacuum.
+--
+-- Deleted sessions, transactions and change log rows leave free pages that
+-- SQLite reuses but never gives back, so the file only grows. With
+-- auto_vacuum = INCREMENTAL the scheduled maintenance job returns them in
+-- small steps with PRAGMA incremental_vacuum. The mode only takes effect
+-- after a full VACUUM, which rewrites the file: run this migration with the
+-- server stopped and enough free disk space for a copy of the database.
+PRAGMA auto_vacuum = INCREMENTAL;
+VACUUM;
@@ -0,0 +1,18 @@
+-- 011: responses of POST requests sent with an Idempotency-Key header.
+--
+-- A retry with the same key gets the stored response instead of creating the
+-- object again. status_code 0 marks a request that is still being processed, its body is
+-- then a token of the worker processing it.
+-- Rows older than idempotency_ttl_hours are deleted by the scheduler.
+CREATE TABLE IF NOT EXISTS idempotency_keys
+(
+    user_id      INTEGER   NOT NULL,
+    key          TEXT      NOT NULL,
+    request_hash TEXT      NOT NULL,
+    status_code  INTEGER   NOT NULL DEFAULT 0,
+    body         BLOB      NOT NULL,
+    created_at   TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, key)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (created_at);
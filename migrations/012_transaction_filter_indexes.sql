@@ -0,0 +1,14 @@
+-- 012: indexes for filtered transaction lists.
+--
+-- /api/transactions selects a user's transactions in a date range, optionally
+-- narrowed to one account or category. Each composite index serves the range
+-- scan of one of those shapes. The single-column user_id and account_id
+-- indexes are prefixes of the new ones and only cost writes.
+-- Tag filters probe the UNIQUE (transaction_id, tag_id) index of
+-- transaction_tags and need nothing new.
+CREATE INDEX IF NOT EXISTS idx_transactions_user_id_created_at ON transactions (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_transactions_account_id_created_at ON transactions (account_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_transactions_category_id_created_at ON transactions (category_id, created_at);
+
+DROP INDEX IF EXISTS idx_transactions_user_id;
+DROP INDEX IF EXISTS idx_transactions_account_id;
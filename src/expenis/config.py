@@ -13,4 +13,123 @@ SECRET=os.getenv('secret')
 COOKIE_DOMAIN=os.getenv('cookie_domain')
 EXPIRATION_TIME_SECONDS=int(os.getenv('expiration_time_seconds'))
 REFRESH_TIME_SECONDS=int(os.getenv('refresh_time_seconds', '2592000'))
-ALPHAVANTAGE_KEY=os.getenv('alphavantage_key')
\ No newline at end of file
+ALPHAVANTAGE_KEY=os.getenv('alphavantage_key')
+DATABASE_PATH=os.getenv('database_path', './data/expenis.db')
+
+# Worker processes ("--workers N" sets it for the workers it starts), the directory
+# for state they share (scheduler leader lock, data version stamps, shared cache
+# entries), how often a non-leader retries the lock, and whether cached upstream
+# data such as exchange rates is shared through that directory.
+WORKERS=int(os.getenv('workers', '1'))
+WORKER_STATE_DIR=os.getenv('worker_state_dir', os.path.join(os.path.dirname(DATABASE_PATH) or '.', 'run'))
+LEADER_RETRY_SECONDS=float(os.getenv('leader_retry_seconds', '10'))
+SHARED_CACHE=os.getenv('shared_cache', '1' if WORKERS > 1 else '0') == '1'
+
+# /api/events: per-subscriber queue bound, SSE heartbeat period and cross-worker
+# fanout ("none" or "sqlite" - poll the changes table for other workers' writes).
+EVENTS_QUEUE_SIZE=int(os.getenv('events_queue_size', '100'))
+EVENTS_HEARTBEAT_SECONDS=float(os.getenv('events_heartbeat_seconds', '15'))
+EVENTS_FANOUT=os.getenv('events_fanout', 'sqlite' if WORKERS > 1 else 'none')
+EVENTS_FANOUT_INTERVAL_SECONDS=float(os.getenv('events_fanout_interval_seconds', '1'))
+
+# Users allowed to read operational endpoints such as /api/metrics, comma separated ids.
+ADMIN_USER_IDS=frozenset(int(user_id) for user_id in os.getenv('admin_user_ids', '').split(',') if user_id.strip())
+BCRYPT_WORKERS=int(os.getenv('bcrypt_workers', '2'))
+
+# SQL instrumentation: statements slower than the threshold are logged, a request
+# repeating one statement more than the repeat threshold is flagged as a possible
+# N+1, and debug headers expose per-request query count and DB time.
+SQL_SLOW_QUERY_MS=float(os.getenv('sql_slow_query_ms', '100'))
+SQL_REPEATED_QUERY_THRESHOLD=int(os.getenv('sql_repeated_query_threshold', '10'))
+SQL_DEBUG_HEADERS=os.getenv('sql_debug_headers', '1' if DEV else '0') == '1'
+
+# Database admission control: how many tasks (requests, jobs) may hold a pooled
+# connection, from their first query until they finish, and how many transactions
+# may be open at once; how many more may wait for a slot, the longest wait before
+# giving up, and the Retry-After sent with the resulting 503. A concurrency of 0
+# disables that budget.
+DB_READ_CONCURRENCY=int(os.getenv('db_read_concurrency', '10'))
+DB_READ_QUEUE=int(os.getenv('db_read_queue', '100'))
+DB_WRITE_CONCURRENCY=int(os.getenv('db_write_concurrency', '1'))
+DB_WRITE_QUEUE=int(os.getenv('db_write_queue', '50'))
+DB_ADMISSION_TIMEOUT_SECONDS=float(os.getenv('db_admission_timeout_seconds', '5'))
+DB_RETRY_AFTER_SECONDS=int(os.getenv('db_retry_after_seconds', '1'))
+
+# Group commit: concurrent writes are queued for one writer task that commits up
+# to max_batch of them in one transaction, waiting at most max_delay_ms for the
+# batch to fill (with 0 a batch is whatever queued up during the previous
+# commit, which costs a lone writer nothing). Past max_pending queued writes,
+# new ones get a 503.
+GROUP_COMMIT=os.getenv('group_commit', '0') == '1'
+GROUP_COMMIT_MAX_BATCH=int(os.getenv('group_commit_max_batch', '64'))
+GROUP_COMMIT_MAX_DELAY_MS=float(os.getenv('group_commit_max_delay_ms', '0'))
+GROUP_COMMIT_MAX_PENDING=int(os.getenv('group_commit_max_pending', '1024'))
+
+# Idempotency-Key support for creating POSTs: how long a key's stored response is
+# replayed, how many recent responses each worker keeps in memory, and how often
+# the scheduler deletes expired keys (0 disables the job).
+IDEMPOTENCY_TTL_HOURS=float(os.getenv('idempotency_ttl_hours', '24'))
+IDEMPOTENCY_CACHE_SIZE=int(os.getenv('idempotency_cache_size', '1024'))
+IDEMPOTENCY_GC_INTERVAL_MINUTES=float(os.getenv('idempotency_gc_interval_minutes', '60'))
+
+# On-demand profiling (X-Profile: 1 from an admin): output directory, number of
+# profiles kept and sampling period.
+PROFILE_DIR=os.getenv('profile_dir', 'logs/profiles')
+PROFILE_RETENTION=int(os.getenv('profile_retention', '50'))
+PROFILE_SAMPLE_INTERVAL_MS=float(os.getenv('profile_sample_interval_ms', '1'))
+
+# Event-loop lag monitor: probe period and the stall length that gets the loop
+# thread's stack logged.
+LOOP_MONITOR=os.getenv('loop_monitor', '1') == '1'
+LOOP_MONITOR_INTERVAL_MS=float(os.getenv('loop_monitor_interval_ms', '100'))
+LOOP_MONITOR_THRESHOLD_MS=float(os.getenv('loop_monitor_threshold_ms', '250'))
+
+# Tracing: exporter ("none", "jsonl" or "otlp"), share of requests recorded,
+# JSON-lines output file and OTLP/HTTP collector base url.
+TRACING=os.getenv('tracing', 'none')
+TRACING_SAMPLE_RATE=float(os.getenv('tracing_sample_rate', '0.01'))
+TRACING_JSONL_PATH=os.getenv('tracing_jsonl_path', 'logs/traces.jsonl')
+TRACING_OTLP_ENDPOINT=os.getenv('tracing_otlp_endpoint', 'http://localhost:4318')
+
+# Scheduled SQLite maintenance, a period of 0 disables the job: PRAGMA optimize,
+# ANALYZE, WAL checkpoint (TRUNCATE once the WAL exceeds the size threshold),
+# incremental vacuum (pages freed per statement) and a rolling per-table
+# quick_check. Maintenance gives up on a lock after the busy timeout.
+DB_OPTIMIZE_INTERVAL_MINUTES=float(os.getenv('db_optimize_interval_minutes', '60'))
+DB_ANALYZE_INTERVAL_MINUTES=float(os.getenv('db_analyze_interval_minutes', '1440'))
+DB_CHECKPOINT_INTERVAL_MINUTES=float(os.getenv('db_checkpoint_interval_minutes', '5'))
+DB_CHECKPOINT_WAL_MB=float(os.getenv('db_checkpoint_wal_mb', '64'))
+DB_VACUUM_INTERVAL_MINUTES=float(os.getenv('db_vacuum_interval_minutes', '60'))
+DB_VACUUM_STEP_PAGES=int(os.getenv('db_vacuum_step_pages', '256'))
+DB_QUICK_CHECK_INTERVAL_MINUTES=float(os.getenv('db_quick_check_interval_minutes', '30'))
+DB_MAINTENANCE_BUSY_TIMEOUT_SECONDS=float(os.getenv('db_maintenance_busy_timeout_seconds', '1'))
+
+# Backups, run by the app scheduler: directory, number of backups kept, hours
+# between runs (0 disables the job) and read rate cap of the compression and
+# verification passes in MB/s (0 for no cap).
+BACKUP_DIR=os.getenv('backup_dir', './data/backups')
+BACKUP_KEEP=int(os.getenv('backup_keep', '5'))
+BACKUP_INTERVAL_HOURS=float(os.getenv('backup_interval_hours', '24'))
+BACKUP_MAX_MB_PER_SECOND=float(os.getenv('backup_max_mb_per_second', '20'))
+
+# Continuous WAL archiving for point-in-time restore ("restore --to"): archive
+# directory (empty disables it), seconds between shipments of new WAL frames,
+# hours between base copies and base copies kept along with their segments.
+# While enabled, only the archiver checkpoints the WAL.
+WAL_ARCHIVE_DIR=os.getenv('wal_archive_dir', '')
+WAL_ARCHIVE_INTERVAL_SECONDS=float(os.getenv('wal_archive_interval_seconds', '60'))
+WAL_ARCHIVE_BASE_HOURS=float(os.getenv('wal_archive_base_hours', '24'))
+WAL_ARCHIVE_KEEP_BASES=int(os.getenv('wal_archive_keep_bases', '3'))
+
+# Response compression: gzip bodies of at least this many bytes for clients that
+# accept it (0 disables compression), and the zlib level used (1 fastest - 9 smallest).
+COMPRESSION_MIN_BYTES=int(os.getenv('compression_min_bytes', '1024'))
+COMPRESSION_LEVEL=int(os.getenv('compression_level', '6'))
+
+# "--profile production" uvicorn settings: listen backlog, keep-alive timeout
+# (above nginx's 60s upstream keepalive_timeout, so uvicorn never closes a
+# connection nginx is about to reuse) and the number of concurrent connections
+# and requests past which uvicorn answers 503 (0 for no limit).
+SERVER_BACKLOG=int(os.getenv('server_backlog', '4096'))
+SERVER_KEEP_ALIVE_SECONDS=float(os.getenv('server_keep_alive_seconds', '75'))
+SERVER_LIMIT_CONCURRENCY=int(os.getenv('server_limit_concurrency', '1000'))
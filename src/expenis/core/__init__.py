@@ -1,3 +1,8 @@
+import os
+
 from .cache import Cache
+from .events import EventBus
+from ..config import EVENTS_QUEUE_SIZE, SHARED_CACHE, WORKER_STATE_DIR
 
-cache = Cache()
+cache = Cache(os.path.join(WORKER_STATE_DIR, "cache") if SHARED_CACHE else None)
+events = EventBus(EVENTS_QUEUE_SIZE)
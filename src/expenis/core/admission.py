@@ -0,0 +1,95 @@
+"""Admission control for database work: bounded concurrency and a bounded queue.
+
+Without it every request that reaches ``db`` waits for its turn however long
+the line is, and under a spike most of them time out at nginx after having
+queued for nothing. A ``Budget`` lets a fixed number of operations run, a
+fixed number wait in FIFO order, and turns everything past that (or waiting
+longer than the timeout) into ``OverloadedException``, answered with 503 and
+``Retry-After``.
+"""
+import asyncio
+import time
+from collections import deque
+
+from .errors import OverloadedException
+from .metrics import registry
+
+DB_ADMISSION_IN_FLIGHT = registry.gauge("db_admission_in_flight", "Admitted database operations", labels=("kind",))
+DB_ADMISSION_QUEUED = registry.gauge("db_admission_queued", "Database operations waiting for admission",
+                                     labels=("kind",))
+DB_ADMISSION_WAIT_SECONDS = registry.histogram("db_admission_wait_seconds", "Time spent waiting for admission",
+                                               labels=("kind",),
+                                               buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+DB_ADMISSION_REJECTED = registry.counter("db_admission_rejected_total", "Database operations turned away",
+                                         labels=("kind", "reason"))
+
+
+class Budget:
+    """``concurrency`` slots for one kind of operation, ``queue`` waiters at most.
+
+    A released slot goes straight to the oldest waiter, so arrivals cannot
+    overtake the queue. A concurrency of 0 admits everything.
+    """
+
+    def __init__(self, kind: str, concurrency: int, queue: int, timeout_seconds: float, retry_after: int):
+        self.kind = kind
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout_seconds = timeout_seconds
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        if self.concurrency <= 0 or (self.in_flight < self.concurrency and not self._waiters):
+            self._admit()
+            DB_ADMISSION_WAIT_SECONDS.observe(0, self.kind)
+            return
+        if len(self._waiters) >= self.queue:
+            self._reject("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.timeout_seconds or None):
+                await waiter
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended.
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._publish()
+            if isinstance(e, TimeoutError):
+                self._reject("timeout")
+            raise
+        finally:
+            DB_ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, self.kind)
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot changes hands, in_flight stays the same.
+                waiter.set_result(None)
+                self._publish()
+                return
+        self.in_flight -= 1
+        self._publish()
+
+    def _admit(self) -> None:
+        self.in_flight += 1
+        self._publish()
+
+    def _reject(self, reason: str):
+        DB_ADMISSION_REJECTED.inc(self.kind, reason)
+        raise OverloadedException(self.kind, self.retry_after) from None
+
+    def _publish(self) -> None:
+        DB_ADMISSION_IN_FLIGHT.set(self.in_flight, self.kind)
+        DB_ADMISSION_QUEUED.set(len(self._waiters), self.kind)
@@ -1,30 +1,140 @@
-import sqlite3
 import datetime
+import gzip
+import hashlib
+import json
 import logging
+import sqlite3
+import time
 from pathlib import Path
 from typing import Optional
 
+from .metrics import registry
+from ..config import BACKUP_DIR, BACKUP_KEEP, BACKUP_MAX_MB_PER_SECOND, DATABASE_PATH
+
 logger = logging.getLogger(__name__)
 
+BACKUP_PHASE_SECONDS = registry.histogram("backup_phase_duration_seconds", "Backup run time per phase", ("phase",),
+                                          buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0))
+BACKUP_PROGRESS = registry.gauge("backup_progress_ratio", "Completed share of the running backup phase", ("phase",))
+BACKUP_LAST_SUCCESS = registry.gauge("backup_last_success_timestamp_seconds", "Unix time of the last verified backup")
+BACKUP_LAST_BYTES = registry.gauge("backup_last_size_bytes", "Compressed size of the last backup")
+
+_CHUNK_BYTES = 1024 * 1024
+_PREFIX = "expenis_backup_"
+
+
+class _Throttle:
+    """Sleeps as needed to keep a byte stream under ``mb_per_second``."""
+
+    def __init__(self, mb_per_second: float):
+        self.bytes_per_second = mb_per_second * 1024 * 1024
+        self.started = time.monotonic()
+        self.done = 0
+
+    def __call__(self, n: int) -> None:
+        self.done += n
+        if self.bytes_per_second <= 0:
+            return
+        ahead = self.done / self.bytes_per_second - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def _snapshot(source_db_path: str, snapshot_path: Path) -> None:
+    # VACUUM INTO on a read-only connection: one read transaction, so in WAL
+    # mode writers are never blocked, and unlike the page-stepping backup API
+    # it does not restart whenever the app writes mid-copy.
+    source_conn = sqlite3.connect(f"file:{source_db_path}?mode=ro", uri=True)
+    try:
+        source_conn.execute("VACUUM INTO ?", (str(snapshot_path),))
+    finally:
+        source_conn.close()
+
+
+def _quick_check(path: Path) -> str:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return "; ".join(row[0] for row in conn.execute("PRAGMA quick_check"))
+    finally:
+        conn.close()
+
+
+def _compress(snapshot_path: Path, target_path: Path, throttle: _Throttle) -> tuple[str, str]:
+    """Gzip ``snapshot_path`` into ``target_path``; returns the raw and compressed sha256."""
+    total = snapshot_path.stat().st_size or 1
+    raw_hash = hashlib.sha256()
+    with snapshot_path.open("rb") as src, target_path.open("wb") as raw_out:
+        with gzip.GzipFile(fileobj=raw_out, mode="wb", compresslevel=6, mtime=0) as out:
+            while chunk := src.read(_CHUNK_BYTES):
+                raw_hash.update(chunk)
+                out.write(chunk)
+                throttle(len(chunk))
+                BACKUP_PROGRESS.set(min(1.0, src.tell() / total), "compress")
+    return raw_hash.hexdigest(), _sha256(target_path)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _verify(target_path: Path, raw_size: int, raw_sha256: str, throttle: _Throttle) -> None:
+    """Decompress the written file and compare it with the snapshot's checksum."""
+    digest = hashlib.sha256()
+    size = 0
+    with gzip.open(target_path, "rb") as f:
+        while chunk := f.read(_CHUNK_BYTES):
+            digest.update(chunk)
+            size += len(chunk)
+            throttle(len(chunk))
+            BACKUP_PROGRESS.set(min(1.0, size / (raw_size or 1)), "verify")
+    if size != raw_size or digest.hexdigest() != raw_sha256:
+        raise RuntimeError(f"verification failed, {target_path.name} does not match the snapshot")
+
+
+def _rotate(backup_dir: Path, max_backups: int) -> None:
+    # Plain .db files are backups from before compression; the timestamp in
+    # the name orders both kinds.
+    backups = sorted(list(backup_dir.glob(f"{_PREFIX}*.db.gz")) + list(backup_dir.glob(f"{_PREFIX}*.db")),
+                     key=lambda p: p.name.split(".", 1)[0])
+    for old_backup in backups[:-max_backups]:
+        old_backup.unlink()
+        old_backup.with_name(old_backup.name.split(".", 1)[0] + ".json").unlink(missing_ok=True)
+
+
+def latest_backup_time(backup_dir: str = BACKUP_DIR) -> Optional[datetime.datetime]:
+    """Modification time of the newest backup, None when there is none."""
+    backups = list(Path(backup_dir).glob(f"{_PREFIX}*.db.gz")) + list(Path(backup_dir).glob(f"{_PREFIX}*.db"))
+    if not backups:
+        return None
+    return datetime.datetime.fromtimestamp(max(p.stat().st_mtime for p in backups))
 
-def _log_backup_progress(status, remaining, total):
-    percent = (total - remaining) / total * 100
-    logger.info("database backup progress: %.1f%% complete (%d pages remaining)", percent, remaining)
 
 def backup_database(
-    source_db_path: str = "./data/expenis.db",
-    backup_dir: str = "./data/backups",
-    max_backups: Optional[int] = 5
+    source_db_path: str = DATABASE_PATH,
+    backup_dir: str = BACKUP_DIR,
+    max_backups: Optional[int] = BACKUP_KEEP,
+    max_mb_per_second: float = BACKUP_MAX_MB_PER_SECOND,
 ) -> str:
     """
-    Creates a backup of the SQLite database using the online backup API.
-    Optionally rotates old backups to keep only the most recent ones.
-    
+    Creates a verified, gzip-compressed backup of the SQLite database.
+
+    The snapshot is taken with ``VACUUM INTO`` and checked with
+    ``PRAGMA quick_check`` on a read-only connection, then compressed at no
+    more than ``max_mb_per_second`` (0 for no limit) and verified by
+    decompressing it against the snapshot's checksum. A JSON manifest with
+    sizes and sha256 sums is written next to the backup. Optionally rotates
+    old backups to keep only the most recent ones.
+
     Args:
         source_db_path: Path to source database file
         backup_dir: Directory to store backups
         max_backups: Maximum number of backups to keep (None to keep all)
-        
+        max_mb_per_second: Read rate limit for compression and verification
+
     Returns:
         Path to the created backup file
     """
@@ -32,37 +142,61 @@ def backup_database(
     source_db_path = str(Path(source_db_path).absolute())
     backup_dir = Path(backup_dir).absolute()
     backup_dir.mkdir(parents=True, exist_ok=True)
-    
+
     # Create timestamped backup filename
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_path = backup_dir / f"expenis_backup_{timestamp}.db"
-    
+    name = f"{_PREFIX}{timestamp}"
+    backup_path = backup_dir / f"{name}.db.gz"
+    snapshot_path = backup_dir / f".{name}.db.tmp"
+    partial_path = backup_dir / f".{name}.db.gz.tmp"
+    started = time.monotonic()
+
     try:
-        # Connect to source and destination databases
-        source_conn = sqlite3.connect(source_db_path)
-        backup_conn = sqlite3.connect(str(backup_path))
-        
-        # Create backup with progress logging
-        with backup_conn:
-            source_conn.backup(backup_conn, pages=100, progress=_log_backup_progress)
-            logger.info("database backup completed successfully")
-        
+        with BACKUP_PHASE_SECONDS.time("snapshot"):
+            _snapshot(source_db_path, snapshot_path)
+            check = _quick_check(snapshot_path)
+        if check != "ok":
+            raise RuntimeError(f"quick_check reported {check}")
+        raw_size = snapshot_path.stat().st_size
+
+        with BACKUP_PHASE_SECONDS.time("compress"):
+            raw_sha256, sha256 = _compress(snapshot_path, partial_path, _Throttle(max_mb_per_second))
+        with BACKUP_PHASE_SECONDS.time("verify"):
+            _verify(partial_path, raw_size, raw_sha256, _Throttle(max_mb_per_second))
+        partial_path.rename(backup_path)
+
+        manifest = {
+            "file": backup_path.name,
+            "created_at": datetime.datetime.now(datetime.UTC).isoformat(),
+            "source": source_db_path,
+            "bytes": backup_path.stat().st_size,
+            "sha256": sha256,
+            "raw_bytes": raw_size,
+            "raw_sha256": raw_sha256,
+            "quick_check": check,
+            "seconds": round(time.monotonic() - started, 3),
+        }
+        (backup_dir / f"{name}.json").write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+        BACKUP_LAST_SUCCESS.set(time.time())
+        BACKUP_LAST_BYTES.set(manifest["bytes"])
+        logger.info("database backup completed: %s, %d -> %d bytes in %.1fs",
+                    backup_path.name, raw_size, manifest["bytes"], manifest["seconds"])
+
         # Rotate old backups if max_backups is set
         if max_backups is not None and max_backups > 0:
-            backups = sorted(backup_dir.glob("expenis_backup_*.db"))
-            for old_backup in backups[:-max_backups]:
-                old_backup.unlink()
-                
+            _rotate(backup_dir, max_backups)
+
         return str(backup_path)
-        
-    except sqlite3.Error as e:
+
+    except (sqlite3.Error, OSError, RuntimeError) as e:
         logger.error("database backup failed: %s", e)
         raise RuntimeError(f"Database backup failed: {e}")
     finally:
-        if 'source_conn' in locals():
-            source_conn.close()
-        if 'backup_conn' in locals():
-            backup_conn.close()
+        snapshot_path.unlink(missing_ok=True)
+        partial_path.unlink(missing_ok=True)
+        for phase in ("compress", "verify"):
+            BACKUP_PROGRESS.set(0, phase)
+
 
 if __name__ == '__main__':
-    backup_database()
\ No newline at end of file
+    backup_database()
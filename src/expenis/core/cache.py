@@ -1,11 +1,25 @@
+import asyncio
+import fcntl
+import json
+import os
+import re
 from datetime import UTC, datetime
 from functools import wraps
+from pathlib import Path
 from typing import Any
 
+from .metrics import registry
+
+CACHE_REQUESTS = registry.counter("cache_requests_total", "Cache lookups by cached function and result",
+                                  ("function", "result"))
+
+
+_UNSAFE_KEY = re.compile(r"[^A-Za-z0-9_.-]+")
+
 
 class Ttl:
-    def __init__(self, ttl_seconds: int):
-        self._creation_time = datetime.now(UTC)
+    def __init__(self, ttl_seconds: int, creation_time: datetime | None = None):
+        self._creation_time = creation_time or datetime.now(UTC)
         self._ttl_seconds = ttl_seconds
 
     @property
@@ -18,8 +32,18 @@ class Ttl:
 
 
 class Cache:
+    """In-process TTL cache for coroutine results.
+
+    With ``shared_dir`` set, functions cached with ``shared=True`` also keep
+    their (JSON serializable) result in a file there: worker processes reuse
+    each other's results, and a file lock makes sure only one of them calls
+    the function when the entry is missing or stale.
+    """
     _cache: dict[str, tuple[Any, Ttl]] = dict()
 
+    def __init__(self, shared_dir: str | None = None):
+        self.shared_dir = Path(shared_dir) if shared_dir else None
+
     def _reset_if_needed(self, key: str):
         if self._key_expired(key):
             del self._cache[key]
@@ -32,21 +56,93 @@ class Cache:
             return (datetime.now(UTC) - ttl.creation_time).total_seconds() >= ttl.ttl_seconds
         return False
 
-    def cached(self, ttl_seconds: int | None = None):
+    @staticmethod
+    def _key(name: str, args: tuple, kwargs: dict) -> str:
+        key_parts = [name]
+        key_parts.extend(str(arg) for arg in args)
+        key_parts.extend(f"{k}:{v}" for k, v in sorted(kwargs.items()))
+        return ":".join(key_parts)
+
+    def prime(self, func, value: Any, *args, ttl_seconds: int | None = None, **kwargs) -> None:
+        """Store ``value`` as the result of ``func(*args, **kwargs)``, e.g. to run offline.
+
+        Also written to the shared directory, if any, for other processes.
+        """
+        key = self._key(func.__name__, args, kwargs)
+        self._cache[key] = (value, Ttl(ttl_seconds))
+        if self.shared_dir is not None:
+            self._store_shared(key, value)
+
+    def _shared_path(self, key: str) -> Path:
+        return self.shared_dir / f"{_UNSAFE_KEY.sub('_', key)}.json"
+
+    def _load_shared(self, key: str, ttl_seconds: int | None) -> tuple[Any, Ttl] | None:
+        path = self._shared_path(key)
+        try:
+            created = datetime.fromtimestamp(path.stat().st_mtime, UTC)
+            ttl = Ttl(ttl_seconds, created)
+            if ttl_seconds is not None and (datetime.now(UTC) - created).total_seconds() >= ttl_seconds:
+                return None
+            return json.loads(path.read_text(encoding="utf-8")), ttl
+        except (OSError, ValueError):
+            return None
+
+    def _store_shared(self, key: str, value: Any) -> None:
+        path = self._shared_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f".{path.name}.{os.getpid()}")
+        partial.write_text(json.dumps(value), encoding="utf-8")
+        partial.replace(path)
+
+    async def _lock_shared(self, key: str) -> int:
+        # Waits for the worker currently computing this entry. Polled rather
+        # than blocking in a thread, which would hold the lock on cancellation.
+        self.shared_dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self._shared_path(key).with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fd
+                except BlockingIOError:
+                    await asyncio.sleep(0.05)
+        except BaseException:
+            os.close(fd)
+            raise
+
+    async def _compute_shared(self, func, key: str, ttl_seconds: int | None, args, kwargs) -> tuple[Any, Ttl]:
+        entry = await asyncio.to_thread(self._load_shared, key, ttl_seconds)
+        if entry is not None:
+            return entry
+        fd = await self._lock_shared(key)
+        try:
+            entry = await asyncio.to_thread(self._load_shared, key, ttl_seconds)
+            if entry is not None:
+                return entry
+            result = await func(*args, **kwargs)
+            await asyncio.to_thread(self._store_shared, key, result)
+            return result, Ttl(ttl_seconds)
+        finally:
+            os.close(fd)
+
+    def cached(self, ttl_seconds: int | None = None, shared: bool = False):
         def decorator(func):
             @wraps(func)
             async def wrapper(*args, **kwargs):
-                key_parts = [func.__name__]
-                key_parts.extend(str(arg) for arg in args)
-                key_parts.extend(f"{k}:{v}" for k, v in sorted(kwargs.items()))
-                key = ":".join(key_parts)
+                key = self._key(func.__name__, args, kwargs)
 
                 self._reset_if_needed(key)
 
                 if key in self._cache:
+                    CACHE_REQUESTS.inc(func.__name__, "hit")
                     value, ttl = self._cache[key]
                     return value
 
+                CACHE_REQUESTS.inc(func.__name__, "miss")
+                if shared and self.shared_dir is not None:
+                    result, ttl = await self._compute_shared(func, key, ttl_seconds, args, kwargs)
+                    self._cache[key] = (result, ttl)
+                    return result
                 result = await func(*args, **kwargs)
                 self._cache[key] = (result, Ttl(ttl_seconds))
                 return result
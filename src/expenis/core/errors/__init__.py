@@ -1,3 +1,9 @@
 class NotFoundException(Exception):
     def __init__(self, message: str):
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+class OverloadedException(Exception):
+    def __init__(self, kind: str, retry_after: int):
+        super().__init__(f"too many pending database {kind}s")
+        self.kind = kind
+        self.retry_after = retry_after
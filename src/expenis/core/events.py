@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from typing import Any
+
+from peewee import fn
+
+from .models import Change, db
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class EventBus:
+    """In-process pub/sub of per-user change notifications.
+
+    Publishing never blocks: a subscriber whose queue is full is dropped and
+    its stream ends, the client is expected to reconnect and catch up through
+    /api/sync. Events are hints, the change log stays the source of truth.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self._queue_size = queue_size
+        self._subscribers: dict[int, set[Subscription]] = {}
+        # user_id -> highest change cursor already published in this process.
+        self._published: dict[int, int] = {}
+        self._fanout_task: asyncio.Task | None = None
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, self._queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.user_id]
+            self._published.pop(subscription.user_id, None)
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id: int, event: dict[str, Any]) -> None:
+        subscribers = self._subscribers.get(user_id)
+        if not subscribers:
+            return
+        cursor = event.get("cursor")
+        if cursor is not None:
+            self._published[user_id] = max(cursor, self._published.get(user_id, 0))
+        for subscription in list(subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def _drop(self, subscription: Subscription) -> None:
+        logger.warning("dropping slow event subscriber: user_id=%d", subscription.user_id)
+        subscription.dropped = True
+        self.unsubscribe(subscription)
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    def start_fanout(self, interval_seconds: float) -> None:
+        """Pick up writes made by other worker processes from the changes table."""
+        if self._fanout_task is None:
+            self._fanout_task = asyncio.create_task(self._fanout(interval_seconds))
+
+    async def stop_fanout(self) -> None:
+        if self._fanout_task is not None:
+            self._fanout_task.cancel()
+            try:
+                await self._fanout_task
+            except asyncio.CancelledError:
+                pass
+            self._fanout_task = None
+
+    async def _fanout(self, interval_seconds: float) -> None:
+        last_seen = await db.run(lambda: Change.select(fn.MAX(Change.id)).scalar()) or 0
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                last_seen = await self._poll_changes(last_seen)
+            except Exception:
+                logger.exception("event fanout poll failed")
+
+    async def _poll_changes(self, last_seen: int) -> int:
+        rows = await db.run(lambda: list(
+            Change.select(Change.user_id, fn.MAX(Change.id).alias('cursor'))
+            .where(Change.id > last_seen)
+            .group_by(Change.user_id)
+            .tuples()
+        ))
+        for user_id, cursor in rows:
+            last_seen = max(last_seen, cursor)
+            if user_id in self._subscribers and cursor > self._published.get(user_id, 0):
+                self.publish(user_id, {"type": "change", "cursor": cursor})
+        return last_seen
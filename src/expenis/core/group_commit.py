@@ -0,0 +1,182 @@
+"""Group commit: concurrent small write transactions share one SQLite commit.
+
+Every commit in WAL mode ends with a write and an fsync of the log, and only
+one connection writes at a time. With ``group_commit`` on, services hand their
+write to a single writer task instead of opening a transaction each. The
+writer waits up to ``group_commit_max_delay_ms`` for more writes (or until it
+has ``group_commit_max_batch``), runs them in one ``BEGIN IMMEDIATE``
+transaction, each in its own savepoint, commits once and resolves every
+caller with its own result or exception. A failing write only rolls back its
+savepoint; a failing commit fails the whole batch.
+
+Each write runs in a copy of its caller's context, so its statements count in
+the caller's ``sql_stats`` and it shows up as a span of the caller's trace.
+"""
+import asyncio
+import contextvars
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from .errors import OverloadedException
+from .metrics import registry
+from .models import db
+from .tracing import is_recording, tracer
+from ..config import DB_RETRY_AFTER_SECONDS
+
+logger = logging.getLogger(__name__)
+
+GROUP_COMMIT_BATCH_SIZE = registry.histogram("group_commit_batch_size", "Writes per group commit",
+                                             buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+GROUP_COMMIT_PENDING = registry.gauge("group_commit_pending", "Writes waiting for the writer task")
+
+
+@dataclass
+class _Write:
+    fn: Callable
+    args: tuple
+    context: contextvars.Context = field(repr=False)
+    future: asyncio.Future = field(repr=False)
+
+
+class GroupCommitter:
+    def __init__(self, max_batch: int, max_delay_seconds: float, max_pending: int):
+        self.max_batch = max_batch
+        self.max_delay_seconds = max_delay_seconds
+        self.max_pending = max_pending
+        self._pending: list[_Write] = []
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="group-commit")
+
+    async def stop(self) -> None:
+        """Commit what is still pending, then stop the writer."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._full.set()
+        await self._task
+        self._task = None
+
+    async def submit(self, fn: Callable, *args) -> Any:
+        """Run synchronous ``fn(*args)`` in the next batch and return its result.
+
+        ``fn`` runs in a savepoint of the writer's transaction, so it must not
+        open a transaction of its own. A caller cancelled before its batch
+        starts withdraws the write.
+        """
+        if len(self._pending) >= self.max_pending:
+            raise OverloadedException("write", DB_RETRY_AFTER_SECONDS)
+        write = _Write(fn, args, contextvars.copy_context(), asyncio.get_running_loop().create_future())
+        self._pending.append(write)
+        GROUP_COMMIT_PENDING.set(len(self._pending))
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await write.future
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if not self._stopping and len(self._pending) < self.max_batch and self.max_delay_seconds > 0:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay_seconds)
+                except TimeoutError:
+                    pass
+            await self._commit(self._take())
+            if self._stopping and not self._pending:
+                return
+
+    def _take(self) -> list[_Write]:
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        batch = [write for write in batch if not write.future.cancelled()]
+        if not self._pending:
+            self._wakeup.clear()
+        if len(self._pending) < self.max_batch:
+            self._full.clear()
+        GROUP_COMMIT_PENDING.set(len(self._pending))
+        return batch
+
+    async def _commit(self, batch: list[_Write]) -> None:
+        if not batch:
+            return
+        GROUP_COMMIT_BATCH_SIZE.observe(len(batch))
+        try:
+            async with db.atomic(lock_type="IMMEDIATE"):
+                outcomes = await db.run(_apply, batch)
+        except Exception as e:
+            logger.warning("group commit of %d writes failed: %s", len(batch), e)
+            for write in batch:
+                if not write.future.done():
+                    write.future.set_exception(e)
+            return
+        for write, (error, result) in zip(batch, outcomes):
+            if write.future.done():
+                continue
+            if error is not None:
+                write.future.set_exception(error)
+            else:
+                write.future.set_result(result)
+
+
+def _apply(batch: list[_Write]) -> list[tuple[BaseException | None, Any]]:
+    outcomes = []
+    for write in batch:
+        if write.future.cancelled():
+            outcomes.append((None, None))
+            continue
+        outcomes.append(write.context.run(_apply_traced, write))
+    return outcomes
+
+
+def _apply_traced(write: _Write) -> tuple[BaseException | None, Any]:
+    if not is_recording():
+        return _apply_one(write)
+    with tracer.span("group_commit.write", function=getattr(write.fn, "__qualname__", type(write.fn).__name__)):
+        return _apply_one(write)
+
+
+def _apply_one(write: _Write) -> tuple[BaseException | None, Any]:
+    try:
+        # Callbacks of a rolled back savepoint must not run when the batch commits.
+        with db.holding_commit_callbacks() as callbacks, db.atomic():
+            result = write.fn(*write.args)
+    except Exception as e:
+        return e, None
+    for callback in callbacks:
+        db.after_commit(callback)
+    return None, result
+
+
+_committer: GroupCommitter | None = None
+
+
+def start_group_commit(max_batch: int, max_delay_seconds: float, max_pending: int) -> None:
+    global _committer
+    _committer = GroupCommitter(max_batch, max_delay_seconds, max_pending)
+    _committer.start()
+
+
+async def stop_group_commit() -> None:
+    global _committer
+    if _committer is not None:
+        committer, _committer = _committer, None
+        await committer.stop()
+
+
+async def atomic_write(fn: Callable, *args) -> Any:
+    """Run synchronous ``fn(*args)`` in a write transaction and return its result.
+
+    Batched with concurrent writes while group commit is on, its own
+    ``db.atomic()`` block otherwise.
+    """
+    if _committer is not None:
+        return await _committer.submit(fn, *args)
+    async with db.atomic():
+        return await db.run(fn, *args)
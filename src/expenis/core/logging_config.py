@@ -1,78 +1,199 @@
+import copy
+import datetime
+import json
 import logging
+import logging.config
 import os
-from logging.handlers import TimedRotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler, WatchedFileHandler
 from pathlib import Path
 
+from .metrics import registry
+from .tracing import TraceIdFilter
+
 LOG_DIR = Path("logs")
 LOG_FILE = LOG_DIR / "expenis.log"
-LOG_FORMAT = "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s"
+LOG_FORMAT = "%(asctime)s | %(levelname)-8s | %(trace_id)s | %(name)s | %(message)s"
 LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+LOG_RECORDS_SUPPRESSED = registry.counter("log_records_suppressed_total",
+                                          "Repeated warnings and errors dropped by deduplication", ("logger",))
 
-def setup_logging() -> dict:
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
 
-    log_level_str = os.getenv("LOG_LEVEL", "INFO").upper()
-    log_level = getattr(logging, log_level_str, logging.INFO)
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", None),
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeduplicateFilter(logging.Filter):
+    """Lets through ``burst`` warnings or errors per message template and window.
+
+    Floods of the same failure (say, expired tokens) are keyed by logger and
+    unformatted message, so differing arguments still count as repeats. The
+    first record after a window with drops notes how many were dropped.
+    """
+
+    def __init__(self, window_seconds: float = 10.0, burst: int = 5, level: int = logging.WARNING):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.burst = burst
+        self.level = level
+        self._lock = threading.Lock()
+        # (logger, level, template) -> [window start, seen in window, dropped in window]
+        self._seen: dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level or self.burst <= 0:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window = self._seen.get(key)
+            if window is None or now - window[0] >= self.window_seconds:
+                dropped = window[2] if window is not None else 0
+                self._seen[key] = [now, 1, 0]
+                if len(self._seen) > 10_000:
+                    self._prune(now)
+            elif window[1] < self.burst:
+                window[1] += 1
+                return True
+            else:
+                window[2] += 1
+                LOG_RECORDS_SUPPRESSED.inc(record.name)
+                return False
+        if dropped:
+            record.msg = f"{record.msg} [{dropped} similar suppressed in the previous {self.window_seconds:g}s]"
+        return True
+
+    def _prune(self, now: float) -> None:
+        for key in [key for key, window in self._seen.items() if now - window[0] >= self.window_seconds]:
+            del self._seen[key]
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """Hands records to a listener thread that does the actual file and console I/O.
+
+    Filters attached to this handler (trace id, deduplication) run on the
+    logging thread, where the request context still is.
+    """
 
-    formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+    def __init__(self, handlers: list[logging.Handler]):
+        super().__init__(queue.SimpleQueue())
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
 
-    file_handler = TimedRotatingFileHandler(
-        LOG_FILE,
-        when="midnight",
-        interval=1,
-        backupCount=5,
-        encoding="utf-8",
-    )
-    file_handler.setFormatter(formatter)
-    file_handler.setLevel(log_level)
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now, they may change after the call returns, and
+        # keep the traceback as text so formatters on the other side can use it.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
+    def close(self) -> None:
+        # Runs from logging.shutdown() and dictConfig: drain, then close outputs.
+        if self.listener._thread is not None:
+            self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        super().close()
+
+
+def _formatter(json_format: bool) -> logging.Formatter:
+    return JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+
+
+def queue_handler(json_format: bool = False, rotate: bool = True) -> BackgroundQueueHandler:
+    """dictConfig factory: rotating file plus console output behind one queue.
+
+    Levels and filters are applied to the queue handler itself. Without
+    ``rotate`` the file is reopened when it is moved away, by logrotate for
+    example: worker processes rotating the same file would lose records.
+    """
+    if rotate:
+        file_handler = TimedRotatingFileHandler(
+            LOG_FILE,
+            when="midnight",
+            interval=1,
+            backupCount=5,
+            encoding="utf-8",
+        )
+    else:
+        file_handler = WatchedFileHandler(LOG_FILE, encoding="utf-8")
     console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    console_handler.setLevel(log_level)
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(_formatter(json_format))
+    return BackgroundQueueHandler([file_handler, console_handler])
+
 
-    root_logger = logging.getLogger()
-    root_logger.setLevel(log_level)
-    root_logger.handlers.clear()
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+def setup_logging() -> dict:
+    """Configure logging for this process and return the same config for uvicorn.
+
+    ``LOG_LEVEL`` sets the level, ``LOG_JSON=1`` switches to JSON lines, and
+    ``LOG_DEDUP_WINDOW_SECONDS``/``LOG_DEDUP_BURST`` tune how many identical
+    warnings and errors get through per window (a burst of 0 keeps them all).
+    With several ``workers`` the file is not rotated by the app.
+    """
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+    log_level_str = os.getenv("LOG_LEVEL", "INFO").upper()
+    if not isinstance(getattr(logging, log_level_str, None), int):
+        log_level_str = "INFO"
+    json_format = os.getenv("LOG_JSON", "0") == "1"
 
     log_config = {
         "version": 1,
         "disable_existing_loggers": False,
-        "formatters": {
-            "default": {
-                "format": LOG_FORMAT,
-                "datefmt": LOG_DATE_FORMAT,
+        "filters": {
+            "trace_id": {"()": TraceIdFilter},
+            "dedup": {
+                "()": DeduplicateFilter,
+                "window_seconds": float(os.getenv("LOG_DEDUP_WINDOW_SECONDS", "10")),
+                "burst": int(os.getenv("LOG_DEDUP_BURST", "5")),
             },
         },
         "handlers": {
-            "file": {
-                "class": "logging.handlers.TimedRotatingFileHandler",
-                "filename": str(LOG_FILE),
-                "when": "midnight",
-                "backupCount": 5,
-                "encoding": "utf-8",
-                "formatter": "default",
-            },
-            "console": {
-                "class": "logging.StreamHandler",
-                "formatter": "default",
+            "queue": {
+                "()": queue_handler,
+                "level": log_level_str,
+                "json_format": json_format,
+                "rotate": int(os.getenv("workers", "1")) <= 1,
+                "filters": ["trace_id", "dedup"],
             },
         },
         "loggers": {
             "uvicorn": {
-                "handlers": ["file", "console"],
+                "handlers": ["queue"],
                 "level": log_level_str,
                 "propagate": False,
             },
             "uvicorn.error": {
-                "handlers": ["file", "console"],
+                "handlers": ["queue"],
                 "level": log_level_str,
                 "propagate": False,
             },
             "uvicorn.access": {
-                "handlers": ["file", "console"],
+                "handlers": ["queue"],
                 "level": log_level_str,
                 "propagate": False,
             },
@@ -82,9 +203,10 @@ def setup_logging() -> dict:
             },
         },
         "root": {
-            "handlers": ["file", "console"],
+            "handlers": ["queue"],
             "level": log_level_str,
         },
     }
 
-    return log_config
\ No newline at end of file
+    logging.config.dictConfig(log_config)
+    return log_config
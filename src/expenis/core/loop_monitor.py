@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SECONDS = registry.histogram("event_loop_lag_seconds", "Delay between scheduled and actual wake-up of the probe",
+                                      buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_STALLS = registry.counter("event_loop_stalls_total", "Times the loop was blocked longer than the threshold")
+
+
+class LoopLagMonitor:
+    """Measures event-loop scheduling lag and reports what blocked the loop.
+
+    A probe task sleeps for ``interval`` and records how late it woke up.
+    A watchdog thread checks the probe's heartbeat; when the loop has not
+    ticked for ``threshold`` seconds it logs the loop thread's stack while the
+    blocking call is still on it, once per stall.
+    """
+
+    def __init__(self, interval_seconds: float, threshold_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.threshold_seconds = threshold_seconds
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog.join()
+        self._watchdog = None
+
+    async def _probe(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - expected))
+            self._heartbeat = time.monotonic()
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stopped.wait(self.interval_seconds):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval_seconds
+            if blocked_for < self.threshold_seconds or reported == heartbeat:
+                continue
+            reported = heartbeat
+            LOOP_STALLS.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unavailable>\n"
+            logger.warning("event loop blocked for %.0fms, loop thread stack:\n%s", blocked_for * 1000, stack)
@@ -0,0 +1,337 @@
+"""Database maintenance: admin CLI commands and scheduled jobs.
+
+The CLI (``python -m src.expenis.server``) goes through the application's
+``db``, in short statements, so the commands can run next to a live server:
+SQLite serializes the writes and the server only waits for the lock as long
+as one statement holds it.
+
+The scheduled jobs run on a single low-priority thread with their own
+connection, so they never take a slot from the request pool and never
+overlap each other.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from . import wal_archive
+from .backup import backup_database
+from .metrics import registry
+from .models import Change, DataVersion, db
+from ..config import DB_MAINTENANCE_BUSY_TIMEOUT_SECONDS, WAL_ARCHIVE_BASE_HOURS, WAL_ARCHIVE_DIR, \
+    WAL_ARCHIVE_KEEP_BASES
+
+logger = logging.getLogger(__name__)
+
+DB_MAINTENANCE_PAGES = registry.counter("db_maintenance_pages_total",
+                                        "Pages freed by incremental vacuum or reset from the WAL", ("job",))
+DB_QUICK_CHECK_FAILURES = registry.counter("db_quick_check_failures_total", "Tables that failed PRAGMA quick_check")
+
+# entity -> (table, live rows filter), mirrors the backfill of migration 008.
+_CHANGE_SOURCES = {
+    'account': ('accounts', 'is_deleted = FALSE'),
+    'category': ('categories', '1'),
+    'tag': ('tags', '1'),
+    'transaction': ('transactions', '1'),
+}
+
+
+@dataclass
+class IndexStats:
+    name: str
+    table: str
+    pages: int | None
+    # sqlite_stat1 summary: "<rows> <avg rows per key prefix>...", filled by ANALYZE.
+    stat: str | None
+
+
+@dataclass
+class DatabaseStats:
+    path: str
+    db_bytes: int
+    wal_bytes: int
+    page_size: int
+    freelist_pages: int
+    auto_vacuum: str
+    row_counts: dict[str, int] = field(default_factory=dict)
+    indexes: list[IndexStats] = field(default_factory=list)
+    top_users: list[tuple[int, str, int]] = field(default_factory=list)
+
+
+@dataclass
+class OptimizeResult:
+    freelist_before: int
+    freelist_after: int
+    auto_vacuum: str
+
+
+@dataclass
+class RebuildResult:
+    backfilled_changes: dict[str, int] = field(default_factory=dict)
+    data_versions: int = 0
+
+
+_AUTO_VACUUM = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+def _pragma(name: str) -> int:
+    return db.execute_sql(f'PRAGMA {name}').fetchone()[0]
+
+
+def _file_size(path: Path) -> int:
+    return path.stat().st_size if path.exists() else 0
+
+
+def _wal_path() -> Path:
+    path = Path(db.database)
+    return path.with_name(path.name + '-wal')
+
+
+registry.gauge("db_wal_bytes", "Size of the WAL file", callback=lambda: _file_size(_wal_path()))
+
+
+def _index_pages() -> dict[str, int] | None:
+    # dbstat is an optional compile-time extension.
+    try:
+        return dict(db.execute_sql('SELECT name, SUM(pgsize) / (SELECT page_size FROM pragma_page_size) '
+                                   'FROM dbstat GROUP BY name').fetchall())
+    except Exception:
+        return None
+
+
+def _collect_stats(top_users: int) -> DatabaseStats:
+    path = Path(db.database)
+    stats = DatabaseStats(
+        path=str(path),
+        db_bytes=_file_size(path),
+        wal_bytes=_file_size(_wal_path()),
+        page_size=_pragma('page_size'),
+        freelist_pages=_pragma('freelist_count'),
+        auto_vacuum=_AUTO_VACUUM.get(_pragma('auto_vacuum'), 'unknown'),
+    )
+    tables = [row[0] for row in db.execute_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    for table in tables:
+        stats.row_counts[table] = db.execute_sql(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+    pages = _index_pages()
+    has_stat1 = db.execute_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").fetchone() is not None
+    stat1 = dict(db.execute_sql('SELECT idx, stat FROM sqlite_stat1 WHERE idx IS NOT NULL')) if has_stat1 else {}
+    for name, table in db.execute_sql(
+            "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' ORDER BY tbl_name, name"):
+        stats.indexes.append(IndexStats(name, table, pages.get(name) if pages is not None else None,
+                                        stat1.get(name)))
+
+    stats.top_users = list(db.execute_sql(
+        'SELECT u.id, u.username, COUNT(t.id) AS n FROM users u '
+        'JOIN transactions t ON t.user_id = u.id GROUP BY u.id ORDER BY n DESC LIMIT ?', (top_users,)))
+    return stats
+
+
+async def collect_stats(top_users: int = 10) -> DatabaseStats:
+    """Row counts, file sizes, per-index size and statistics, heaviest users.
+
+    SQLite does not count index hits; ``IndexStats.stat`` (from the last
+    ANALYZE) shows how selective an index is, which is what the planner uses.
+    """
+    return await db.run(_collect_stats, top_users)
+
+
+def _optimize() -> OptimizeResult:
+    before = _pragma('freelist_count')
+    db.execute_sql('ANALYZE')
+    db.execute_sql('PRAGMA optimize')
+    # Only reclaims pages with auto_vacuum = INCREMENTAL, otherwise a no-op.
+    db.execute_sql('PRAGMA incremental_vacuum')
+    return OptimizeResult(before, _pragma('freelist_count'), _AUTO_VACUUM.get(_pragma('auto_vacuum'), 'unknown'))
+
+
+async def optimize() -> OptimizeResult:
+    """Refresh planner statistics and return free pages to the filesystem."""
+    result = await db.run(_optimize)
+    logger.info("optimize: freelist %d -> %d pages", result.freelist_before, result.freelist_after)
+    return result
+
+
+def _backfill_changes(entity: str) -> int:
+    table, live = _CHANGE_SOURCES[entity]
+    changes = Change._meta.table_name
+    # EXCEPT sorts both sides once; a per-row NOT EXISTS/NOT IN has no usable
+    # index on entity_id and turns quadratic on large change logs.
+    return db.execute_sql(
+        f'INSERT INTO {changes} (user_id, entity, entity_id, op, created_at) '
+        f"SELECT user_id, ?, id, 'upsert', CURRENT_TIMESTAMP FROM ("
+        f'SELECT user_id, id FROM {table} WHERE {live} '
+        f'EXCEPT SELECT user_id, entity_id FROM {changes} WHERE entity = ?) ORDER BY id',
+        (entity, entity)).rowcount
+
+
+def _rebuild_data_versions() -> int:
+    # Bump rather than recompute: versions must only grow, or clients holding
+    # an old ETag could get a 304 for data that changed.
+    table = DataVersion._meta.table_name
+    db.execute_sql(f'UPDATE {table} SET version = version + 1')
+    db.execute_sql(f'INSERT INTO {table} (user_id, version) SELECT id, 1 FROM users '
+                   f'WHERE id NOT IN (SELECT user_id FROM {table})')
+    return db.execute_sql(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+async def rebuild_derived() -> RebuildResult:
+    """Rebuild data derived from the main tables.
+
+    Live rows missing from the change log (e.g. written by hand or by an
+    import) get an ``upsert`` entry so the next sync picks them up, and every
+    user's data version is bumped so cached list responses revalidate. A
+    running server keeps serving its in-memory versions until the user's
+    next write or a restart; both are still consistent with the data.
+    """
+    result = RebuildResult()
+    async with db.atomic():
+        for entity in _CHANGE_SOURCES:
+            result.backfilled_changes[entity] = await db.run(_backfill_changes, entity)
+        result.data_versions = await db.run(_rebuild_data_versions)
+    logger.info("rebuild-derived: %s", result)
+    return result
+
+
+def _lower_priority() -> None:
+    # Linux schedules threads individually: this demotes only the worker.
+    if sys.platform == "linux":
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except OSError:
+            pass
+
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-maintenance", initializer=_lower_priority)
+_quick_check_next = 0
+
+
+@contextmanager
+def _connect() -> Iterator[sqlite3.Connection]:
+    # Autocommit: every statement is its own short transaction. The short busy
+    # timeout makes maintenance give up instead of queueing behind requests.
+    conn = sqlite3.connect(db.database, timeout=DB_MAINTENANCE_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    if WAL_ARCHIVE_DIR:
+        conn.execute('PRAGMA wal_autocheckpoint = 0')
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+async def _in_maintenance_thread(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+def _periodic_optimize(analyze: bool) -> None:
+    with _connect() as conn:
+        if analyze:
+            # Sampled ANALYZE: bounded cost on large tables, good enough for the planner.
+            conn.execute('PRAGMA analysis_limit = 1000')
+            conn.execute('ANALYZE')
+        conn.execute('PRAGMA optimize')
+
+
+async def periodic_optimize(analyze: bool = False) -> None:
+    """``PRAGMA optimize``, preceded by a sampled ``ANALYZE`` when asked."""
+    await _in_maintenance_thread(_periodic_optimize, analyze)
+
+
+def _checkpoint_wal(threshold_bytes: int) -> int:
+    if _file_size(_wal_path()) < threshold_bytes:
+        return 0
+    with _connect() as conn:
+        # PASSIVE copies the pages and reports how many; TRUNCATE reports 0 once
+        # it has reset the log, so it only runs when everything was copied.
+        busy, wal_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        if not busy and checkpointed == wal_pages:
+            busy = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()[0]
+    if busy or checkpointed < wal_pages:
+        logger.info("wal checkpoint blocked by readers: %d of %d pages copied", checkpointed, wal_pages)
+        return 0
+    DB_MAINTENANCE_PAGES.inc("wal_checkpoint", amount=wal_pages)
+    logger.info("wal checkpoint: %d pages, WAL truncated", wal_pages)
+    return wal_pages
+
+
+async def checkpoint_wal(threshold_bytes: int) -> int:
+    """Checkpoint and truncate the WAL once it is larger than ``threshold_bytes``.
+
+    The automatic checkpoints copy pages back but never shrink the file, so
+    after a burst of writes the WAL stays at its peak size. Returns the
+    number of WAL pages reset, 0 when skipped or blocked by readers.
+    """
+    return await _in_maintenance_thread(_checkpoint_wal, threshold_bytes)
+
+
+def _vacuum_free_pages(step_pages: int) -> int:
+    with _connect() as conn:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            return 0
+        before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        remaining = before
+        while remaining:
+            conn.execute(f'PRAGMA incremental_vacuum({min(step_pages, remaining)})').fetchall()
+            left = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if left >= remaining:
+                break
+            remaining = left
+    reclaimed = before - remaining
+    if reclaimed:
+        DB_MAINTENANCE_PAGES.inc("incremental_vacuum", amount=reclaimed)
+        logger.info("incremental vacuum: %d pages returned to the filesystem", reclaimed)
+    return reclaimed
+
+
+async def vacuum_free_pages(step_pages: int) -> int:
+    """Return free pages to the filesystem, ``step_pages`` per transaction.
+
+    Needs ``auto_vacuum = INCREMENTAL`` (migration 010), otherwise a no-op.
+    """
+    return await _in_maintenance_thread(_vacuum_free_pages, step_pages)
+
+
+def _quick_check_next_table() -> str | None:
+    global _quick_check_next
+    with _connect() as conn:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+        if not tables:
+            return None
+        table = tables[_quick_check_next % len(tables)]
+        _quick_check_next += 1
+        problems = [row[0] for row in conn.execute(f'PRAGMA quick_check("{table}")') if row[0] != 'ok']
+    if problems:
+        DB_QUICK_CHECK_FAILURES.inc()
+        logger.error("quick_check failed for table %s: %s", table, "; ".join(problems[:10]))
+    return table
+
+
+async def quick_check_next_table() -> str | None:
+    """Run ``PRAGMA quick_check`` on the next table, round robin.
+
+    One table per run keeps each check short; over a full round every
+    table and its indexes get checked. Returns the checked table.
+    """
+    return await _in_maintenance_thread(_quick_check_next_table)
+
+
+async def backup() -> str:
+    """Verified, compressed backup (``backup.backup_database``) on the maintenance thread."""
+    return await _in_maintenance_thread(backup_database)
+
+
+async def archive_wal() -> wal_archive.ArchiveResult:
+    """Ship new WAL frames to ``WAL_ARCHIVE_DIR`` and checkpoint (see ``wal_archive``)."""
+    return await _in_maintenance_thread(wal_archive.archive, db.database, WAL_ARCHIVE_DIR,
+                                        WAL_ARCHIVE_BASE_HOURS * 3600, WAL_ARCHIVE_KEEP_BASES,
+                                        DB_MAINTENANCE_BUSY_TIMEOUT_SECONDS)
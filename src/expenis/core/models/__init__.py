@@ -5,4 +5,7 @@ from .transaction import Transaction
 from .transaction_tag import TransactionTag
 from .session import Session
 from .user import User
+from .data_version import DataVersion
+from .change import Change
+from .idempotency_key import IdempotencyKey
 from .database import db
\ No newline at end of file
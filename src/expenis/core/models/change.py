@@ -0,0 +1,22 @@
+from datetime import UTC, datetime
+
+from peewee import AutoField, Check, DateTimeField, IntegerField, Model, TextField
+
+from .database import db
+
+
+class Change(Model):
+    id = AutoField(primary_key=True)
+    user_id = IntegerField(null=False)
+    entity = TextField(null=False, constraints=[Check("entity IN ('transaction', 'account', 'category', 'tag')")])
+    entity_id = IntegerField(null=False)
+    op = TextField(null=False, constraints=[Check("op IN ('upsert', 'delete')")])
+    created_at = DateTimeField(null=False, default=lambda: datetime.now(UTC))
+
+    class Meta:
+        database = db
+        table_name = "changes"
+        indexes = (
+            (('user_id', 'id'), False),
+            (('user_id', 'entity', 'id'), False),
+        )
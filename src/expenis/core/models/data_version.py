@@ -0,0 +1,12 @@
+from peewee import IntegerField, Model
+
+from .database import db
+
+
+class DataVersion(Model):
+    user_id = IntegerField(primary_key=True)
+    version = IntegerField(null=False, default=0)
+
+    class Meta:
+        database = db
+        table_name = "data_versions"
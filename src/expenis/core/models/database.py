@@ -1,3 +1,206 @@
-from playhouse.pwasyncio import AsyncSqliteDatabase
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 
-db = AsyncSqliteDatabase('./data/expenis.db', pragmas={'foreign_keys': 1})
+from playhouse.pwasyncio import AsyncSqliteDatabase, await_
+
+from ..admission import Budget
+from ..metrics import registry
+from ..sql_stats import record_query
+from ..tracing import is_recording, tracer
+from ...config import DATABASE_PATH, DB_ADMISSION_TIMEOUT_SECONDS, DB_READ_CONCURRENCY, DB_READ_QUEUE, \
+    DB_RETRY_AFTER_SECONDS, DB_WRITE_CONCURRENCY, DB_WRITE_QUEUE, WAL_ARCHIVE_DIR
+
+DB_RUN_SECONDS = registry.histogram("db_run_duration_seconds", "Time spent in db.run, including pool wait")
+DB_RUN_IN_FLIGHT = registry.gauge("db_run_in_flight", "db.run calls currently executing")
+DB_POOL_WAITING = registry.gauge("db_pool_waiting", "Tasks waiting for a pooled connection")
+
+_held_commit_callbacks: ContextVar[list[Callable] | None] = ContextVar("held_commit_callbacks", default=None)
+
+
+class InstrumentedAsyncSqliteDatabase(AsyncSqliteDatabase):
+    """``AsyncSqliteDatabase`` that records latency and queue depth of ``run``
+    and reports every executed statement to ``sql_stats``.
+
+    Every query helper (``list``, ``get``, ``scalar``, ...) goes through
+    ``run``, so this covers all service-level database access.
+
+    With budgets, work is admitted at its start: a task takes a ``reads``
+    slot with its pooled connection, on its first query, and gives it back
+    with the connection when it finishes; an outermost ``atomic`` block takes
+    a ``writes`` slot for the whole transaction. So ``reads`` bounds the tasks
+    using the database at once, and in-progress requests are never queued or
+    rejected halfway: new ones are turned away instead.
+    """
+
+    def __init__(self, database, reads: Budget | None = None, writes: Budget | None = None, pool_size: int = 10,
+                 **kwargs):
+        super().__init__(database, pool_size=pool_size, **kwargs)
+        self.reads = reads
+        self.writes = writes
+        self.pool_size = pool_size
+        self.checked_out = 0
+
+    async def run(self, fn, *args, **kwargs):
+        DB_RUN_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            if not is_recording():
+                return await super().run(fn, *args, **kwargs)
+            with tracer.span("db.run", function=getattr(fn, "__qualname__", type(fn).__name__)):
+                return await super().run(fn, *args, **kwargs)
+        finally:
+            DB_RUN_SECONDS.observe(time.perf_counter() - start)
+            DB_RUN_IN_FLIGHT.dec()
+
+    def atomic(self, *args, **kwargs):
+        transaction = super().atomic(*args, **kwargs)
+        if self.writes is None or self.in_transaction():
+            return transaction
+        return _AdmittedTransaction(self, self.writes, transaction)
+
+    def execute_sql(self, sql, params=None):
+        # Synchronous peewee code, everything under run(), lands here in its
+        # greenlet. The query itself is awaited in the task's context, so record
+        # it in the greenlet's: for a group-committed write that is the caller's.
+        start = time.perf_counter()
+        cursor = None
+        try:
+            cursor = await_(super().aexecute_sql(sql, params or ()))
+            return cursor
+        finally:
+            record_query(sql, params, time.perf_counter() - start, _row_count(cursor))
+
+    async def aexecute_sql(self, sql, params=None):
+        start = time.perf_counter()
+        cursor = None
+        try:
+            cursor = await super().aexecute_sql(sql, params)
+            return cursor
+        finally:
+            record_query(sql, params, time.perf_counter() - start, _row_count(cursor))
+
+    def after_commit(self, fn):
+        held = _held_commit_callbacks.get()
+        if held is not None:
+            held.append(fn)
+            return fn
+        return super().after_commit(fn)
+
+    @contextmanager
+    def holding_commit_callbacks(self) -> Iterator[list[Callable]]:
+        """Collect the ``after_commit`` callbacks registered in the block instead of scheduling them.
+
+        For work that can still be rolled back on its own, like a savepoint:
+        register them with ``after_commit`` once it succeeded.
+        """
+        held: list[Callable] = []
+        token = _held_commit_callbacks.set(held)
+        try:
+            yield held
+        finally:
+            _held_commit_callbacks.reset(token)
+
+    async def _acquire_conn_async(self):
+        budget = self.reads
+        if budget is not None:
+            await budget.acquire()
+        try:
+            conn = await super()._acquire_conn_async()
+        except BaseException:
+            if budget is not None:
+                budget.release()
+            raise
+        conn.read_budget = budget
+        self.checked_out += 1
+        return conn
+
+    async def _release_conn(self, conn):
+        # Also how pwasyncio returns the connection of a finished task.
+        budget, conn.read_budget = getattr(conn, "read_budget", None), None
+        try:
+            await super()._release_conn(conn)
+        finally:
+            self.checked_out -= 1
+            if budget is not None:
+                budget.release()
+
+    async def _pool_acquire(self, pool):
+        DB_POOL_WAITING.inc()
+        try:
+            return await super()._pool_acquire(pool)
+        finally:
+            DB_POOL_WAITING.dec()
+
+    def pool_available(self) -> int:
+        return self.pool_size - self.checked_out if self._pool is not None else 0
+
+
+class _AdmittedTransaction:
+    """``async with`` wrapper holding a write slot for the lifetime of a transaction."""
+
+    def __init__(self, db: InstrumentedAsyncSqliteDatabase, budget: Budget, transaction):
+        self.db = db
+        self.budget = budget
+        self.transaction = transaction
+
+    async def __aenter__(self):
+        # Connect first: a slot holder waiting on the pool, whose connections may
+        # belong to tasks queued for this very slot, would stall them all.
+        await self.db.aconnect()
+        await self.budget.acquire()
+        try:
+            return await self.transaction.__aenter__()
+        except BaseException:
+            self.budget.release()
+            raise
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            return await self.transaction.__aexit__(exc_type, exc, tb)
+        finally:
+            self.budget.release()
+
+    # Synchronous use (peewee's own get_or_create, ``with db``) happens inside a
+    # ``run``, whose task already holds its connection.
+    def __enter__(self):
+        return self.transaction.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self.transaction.__exit__(exc_type, exc, tb)
+
+
+def _row_count(cursor) -> int:
+    if cursor is None:
+        return 0
+    # sqlite reports -1 for SELECT; results are buffered, so count them.
+    if cursor.rowcount is not None and cursor.rowcount >= 0:
+        return cursor.rowcount
+    return len(getattr(cursor, "_rows", ()))
+
+
+# WAL: readers never block the writer, and the scheduled checkpoint job keeps the log small.
+# With WAL archiving on, the archiver must be the only checkpointer.
+db = InstrumentedAsyncSqliteDatabase(
+    DATABASE_PATH,
+    reads=Budget("read", DB_READ_CONCURRENCY, DB_READ_QUEUE, DB_ADMISSION_TIMEOUT_SECONDS, DB_RETRY_AFTER_SECONDS),
+    # One writer at a time is all SQLite runs anyway; the others wait here
+    # instead of on the database lock.
+    writes=Budget("write", DB_WRITE_CONCURRENCY, DB_WRITE_QUEUE, DB_ADMISSION_TIMEOUT_SECONDS,
+                  DB_RETRY_AFTER_SECONDS),
+    pragmas={
+        'foreign_keys': 1,
+        'journal_mode': 'wal',
+        **({'wal_autocheckpoint': 0} if WAL_ARCHIVE_DIR else {}),
+    },
+)
+
+
+@db.func("casefold", 1, deterministic=True)
+def _casefold(text: str | None) -> str | None:
+    # SQLite's lower() and LIKE only fold ASCII, descriptions are mostly Cyrillic.
+    return text.casefold() if text is not None else None
+
+
+registry.gauge("db_pool_available", "Idle connections in the pool", callback=db.pool_available)
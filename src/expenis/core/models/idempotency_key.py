@@ -0,0 +1,18 @@
+from peewee import BlobField, CompositeKey, DateTimeField, IntegerField, Model, TextField
+
+from .database import db
+
+
+class IdempotencyKey(Model):
+    user_id = IntegerField(null=False)
+    key = TextField(null=False)
+    request_hash = TextField(null=False)
+    status_code = IntegerField(null=False, default=0)
+    body = BlobField(null=False)
+    created_at = DateTimeField(null=False, index=True)
+
+    class Meta:
+        database = db
+        table_name = "idempotency_keys"
+        primary_key = CompositeKey('user_id', 'key')
+        without_rowid = True
@@ -21,3 +21,8 @@ class Transaction(Model):
     class Meta:
         database = db
         table_name = "transactions"
+        indexes = (
+            (('user_id', 'created_at'), False),
+            (('account', 'created_at'), False),
+            (('category', 'created_at'), False),
+        )
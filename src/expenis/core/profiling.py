@@ -0,0 +1,100 @@
+"""On-demand profiling of single requests.
+
+``SamplingProfiler`` samples the stack of one thread from a helper thread and
+aggregates it into collapsed stacks (``frame;frame;frame count`` per line),
+the input format of flamegraph.pl, speedscope and inferno. ``cProfile`` is
+available as a deterministic fallback and is saved as a ``pstats`` dump.
+
+The event loop interleaves requests, so a profile covers everything the loop
+thread did while the profiled request was in flight, not only that request.
+"""
+import cProfile
+import logging
+import sys
+import threading
+from collections import Counter
+from datetime import UTC, datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{code.co_name}:{frame.f_lineno}"
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id: int, interval_seconds: float = 0.001):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+
+def sampling_supported() -> bool:
+    return hasattr(sys, "_current_frames")
+
+
+class RequestProfile:
+    """Profiles the code between ``start`` and ``stop`` and saves it under ``directory``."""
+
+    def __init__(self, directory: Path, name: str, mode: str = "sample", interval_seconds: float = 0.001):
+        if mode == "sample" and not sampling_supported():
+            mode = "cprofile"
+        self.directory = directory
+        self.name = name
+        self.mode = mode
+        self._sampler = SamplingProfiler(threading.get_ident(), interval_seconds) if mode == "sample" else None
+        self._profile = cProfile.Profile() if mode == "cprofile" else None
+        self.path: Path | None = None
+
+    def start(self) -> None:
+        if self._sampler is not None:
+            self._sampler.start()
+        else:
+            self._profile.enable()
+
+    def stop(self, retention: int) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%S%f")
+        if self._sampler is not None:
+            stacks = self._sampler.stop()
+            path = self.directory / f"{stamp}-{self.name}.collapsed"
+            path.write_text("".join(f"{stack} {count}\n" for stack, count in stacks.most_common()),
+                            encoding="utf-8")
+        else:
+            self._profile.disable()
+            path = self.directory / f"{stamp}-{self.name}.prof"
+            self._profile.dump_stats(path)
+        prune_profiles(self.directory, retention)
+        self.path = path
+        return path
+
+
+def prune_profiles(directory: Path, retention: int) -> None:
+    profiles = sorted((p for p in directory.iterdir() if p.suffix in (".collapsed", ".prof")),
+                      key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale in profiles[retention:]:
+        stale.unlink(missing_ok=True)
+        logger.debug("profile removed by retention: %s", stale.name)
@@ -0,0 +1,176 @@
+"""Deterministic synthetic data for benchmarks and capacity planning.
+
+The same ``seed`` and sizes always produce the same rows (ids depend only on
+what the database already holds). Rows are written with bulk inserts, and
+every entity also gets its change log entry and data version, so seeded
+users behave like real ones, including /api/sync.
+"""
+import logging
+import random
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import bcrypt
+
+from . import cache
+from .models import Account, Category, Change, DataVersion, Tag, Transaction, TransactionTag, User, db
+from .service.exchage_rate_service import get_course
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[3] / "migrations"
+
+SEED_PASSWORD = "benchmark-password"
+# Timestamps are spread back from a fixed date rather than "now" so reruns match.
+SEED_ANCHOR = datetime(2025, 1, 1, tzinfo=UTC)
+
+SEED_EXCHANGE_RATES = {"Valute": {
+    "USD": {"Value": 90.0},
+    "EUR": {"Value": 98.0},
+    "CNY": {"Value": 12.5},
+    "BTC": {"Value": 5_400_000.0},
+    "ETH": {"Value": 210_000.0},
+}}
+
+_ACCOUNTS = (("Наличные", "RUB"), ("Карта", "RUB"), ("Доллары", "USD"), ("Евро", "EUR"))
+_INCOME = ("Зарплата", "Подработка", "Проценты")
+_EXPENSE = ("Продукты", "Транспорт", "Кафе", "Жильё", "Здоровье", "Развлечения", "Одежда")
+_TAGS = ("work", "family", "travel", "gift", "subscription", "weekend", "cashback", "home")
+_CHUNK_ROWS = 2000
+
+
+@dataclass
+class SeedStats:
+    users: int = 0
+    accounts: int = 0
+    categories: int = 0
+    tags: int = 0
+    transactions: int = 0
+    transaction_tags: int = 0
+    seconds: float = 0.0
+
+
+def create_schema(db_path: str) -> None:
+    """Apply every migration to a fresh database file."""
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        for migration in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            conn.executescript(migration.read_text(encoding="utf-8"))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def prime_exchange_rates() -> None:
+    """Serve fixed exchange rates instead of calling the upstream APIs."""
+    cache.prime(get_course, SEED_EXCHANGE_RATES)
+
+
+def _insert_chunked(model, fields: list, rows: list[tuple]) -> list[int]:
+    """Bulk insert and return the new ids, in row order.
+
+    Plain SQL on purpose: building the statement through peewee costs several
+    times more than SQLite's own work for multi-row inserts of this size.
+    """
+    columns = ", ".join(f'"{field.column_name}"' for field in fields)
+    placeholder = "(" + ", ".join("?" * len(fields)) + ")"
+    ids = []
+    for start in range(0, len(rows), _CHUNK_ROWS):
+        chunk = rows[start:start + _CHUNK_ROWS]
+        sql = f'INSERT INTO "{model._meta.table_name}" ({columns}) VALUES ' + ", ".join([placeholder] * len(chunk))
+        last_id = db.execute_sql(sql, [value for row in chunk for value in row]).lastrowid
+        # A single INSERT gets consecutive rowids on an otherwise idle connection.
+        ids.extend(range(last_id - len(chunk) + 1, last_id + 1))
+    return ids
+
+
+def _record_seed_changes(user_id: int, entity: str, ids: list[int], created_at: datetime) -> None:
+    _insert_chunked(Change, [Change.user_id, Change.entity, Change.entity_id, Change.op, Change.created_at],
+                    [(user_id, entity, entity_id, 'upsert', created_at) for entity_id in ids])
+
+
+def _seed_user(rng: random.Random, username: str, password_hash: str, transactions: int, days: int,
+               stats: SeedStats) -> None:
+    created_at = SEED_ANCHOR - timedelta(days=days)
+    user_id = User.insert(username=username, password_hash=password_hash, telegram_id=None,
+                          created_at=created_at, updated_at=created_at).execute()
+
+    account_ids = _insert_chunked(
+        Account, [Account.user_id, Account.name, Account.currency_code, Account.adjustment_amount,
+                  Account.created_at, Account.updated_at],
+        [(user_id, name, currency, float(rng.randrange(0, 100_000)), created_at, created_at)
+         for name, currency in _ACCOUNTS])
+    rates = [1.0 if currency == "RUB" else SEED_EXCHANGE_RATES["Valute"][currency]["Value"]
+             for _, currency in _ACCOUNTS]
+    category_fields = [Category.user_id, Category.name, Category.type, Category.created_at, Category.updated_at]
+    income_ids = _insert_chunked(Category, category_fields,
+                                 [(user_id, name, 'income', created_at, created_at) for name in _INCOME])
+    expense_ids = _insert_chunked(Category, category_fields,
+                                  [(user_id, name, 'expense', created_at, created_at) for name in _EXPENSE])
+    tag_ids = _insert_chunked(Tag, [Tag.user_id, Tag.name, Tag.created_at, Tag.updated_at],
+                              [(user_id, name, created_at, created_at) for name in _TAGS])
+
+    transaction_fields = [Transaction.user_id, Transaction.account, Transaction.category, Transaction.amount,
+                          Transaction.description, Transaction.exchange_rate, Transaction.created_at,
+                          Transaction.updated_at]
+    rows = []
+    span_seconds = days * 86400
+    for index in range(transactions):
+        account = rng.randrange(len(account_ids))
+        income = rng.random() < 0.15
+        when = SEED_ANCHOR - timedelta(seconds=rng.randrange(span_seconds))
+        rows.append((
+            user_id,
+            account_ids[account],
+            rng.choice(income_ids if income else expense_ids),
+            round(rng.uniform(50, 150_000) if income else -rng.uniform(10, 20_000), 2),
+            f"seed #{index}" if rng.random() < 0.3 else None,
+            rates[account],
+            when,
+            when,
+        ))
+    transaction_ids = _insert_chunked(Transaction, transaction_fields, rows)
+
+    links = []
+    for transaction_id in transaction_ids:
+        if rng.random() < 0.3:
+            for tag_id in rng.sample(tag_ids, rng.randint(1, 2)):
+                links.append((transaction_id, tag_id))
+    _insert_chunked(TransactionTag, [TransactionTag.transaction, TransactionTag.tag], links)
+
+    for entity, ids in (('account', account_ids), ('category', income_ids + expense_ids), ('tag', tag_ids),
+                        ('transaction', transaction_ids)):
+        _record_seed_changes(user_id, entity, ids, SEED_ANCHOR)
+    DataVersion.insert(user_id=user_id, version=1).on_conflict_replace().execute()
+
+    stats.users += 1
+    stats.accounts += len(account_ids)
+    stats.categories += len(income_ids) + len(expense_ids)
+    stats.tags += len(tag_ids)
+    stats.transactions += len(transaction_ids)
+    stats.transaction_tags += len(links)
+
+
+async def seed(users: int, transactions_per_user: int, seed: int = 42, days: int = 730) -> SeedStats:
+    """Create ``users`` users named ``seed<seed>-user<n>`` with ``transactions_per_user`` each.
+
+    All of them log in with ``SEED_PASSWORD``. Seeding the same ``seed`` twice
+    into one database fails on the unique usernames.
+    """
+    rng = random.Random(seed)
+    # One hash for everyone: bcrypt per user would dominate seeding time.
+    password_hash = bcrypt.hashpw(SEED_PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    stats = SeedStats()
+    started = time.perf_counter()
+    for index in range(users):
+        async with db.atomic():
+            await db.run(_seed_user, rng, f"seed{seed}-user{index}", password_hash, transactions_per_user, days,
+                         stats)
+        logger.info("seeded user %d/%d", index + 1, users)
+    stats.seconds = time.perf_counter() - started
+    logger.info("seeding done: %s", stats)
+    return stats
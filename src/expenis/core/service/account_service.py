@@ -1,17 +1,22 @@
 import logging
+from collections.abc import Callable
 from datetime import UTC, datetime
 from typing import Literal
 
 from peewee import JOIN, fn
 
 from ..errors import NotFoundException
+from ..group_commit import atomic_write
 from ..models import Account, Category, Transaction, db
-from ..utils.currency_codes import CODES
+from ..tracing import traced
+from ..utils.currency_codes import CHAR_CODES
+from .data_version_service import record_changes
 from fastapi import HTTPException
 
 logger = logging.getLogger(__name__)
 
 
+@traced()
 async def get_user_accounts(user_id: int) -> list[Account]:
     accounts = await db.list((Account.select()
                               .where((Account.user_id == user_id) & (Account.is_deleted == False))
@@ -19,11 +24,13 @@ async def get_user_accounts(user_id: int) -> list[Account]:
     return accounts
 
 
+@traced()
 async def get_account_by_id(user_id: int, id: int) -> Account | None:
     account = await db.run(lambda: Account.get_or_none((Account.user_id == user_id) & (Account.id == id)))
     return account
 
 
+@traced()
 async def get_active_account_by_id(user_id: int, id: int) -> Account | None:
     account = await db.run(
         lambda: Account.get_or_none(
@@ -47,6 +54,7 @@ def _accounts_with_balance_query(filterr):
     ).where(filterr).group_by(Account.name).order_by(Account.name)
 
 
+@traced()
 async def get_user_accounts_with_balance(user_id: int) -> list[tuple[Account, float]]:
     accounts = await db.list(
         _accounts_with_balance_query((Account.user_id == user_id) & (Account.is_deleted == False))
@@ -54,6 +62,7 @@ async def get_user_accounts_with_balance(user_id: int) -> list[tuple[Account, fl
     return [(a, a.balance) for a in accounts]
 
 
+@traced()
 async def get_user_account_with_balance(user_id: int, account_id) -> tuple[Account, float] | tuple[None, None]:
     accounts = await db.list(
         _accounts_with_balance_query(
@@ -63,26 +72,45 @@ async def get_user_account_with_balance(user_id: int, account_id) -> tuple[Accou
     return (accounts[0], accounts[0].balance) if len(accounts) > 0 else (None, None)
 
 
-async def create_account(user_id: int, name: str, adjustment_amount: float, currency_code="RUB"):
-    if currency_code not in CODES:
+def _save_account(user_id: int, account: Account) -> None:
+    account.save()
+    record_changes(user_id, 'account', [account.id])
+
+
+def _update_account(user_id: int, account: Account, new_balance: float | None, now: datetime) -> None:
+    if new_balance is not None:
+        # Read in the transaction, so no write lands between the balance and the adjustment.
+        balance = _accounts_with_balance_query((Account.id == account.id) & (Account.user_id == user_id)
+                                               & (Account.is_deleted == False)).get().balance
+        account.adjustment_amount = new_balance - balance + account.adjustment_amount
+    account.updated_at = now
+    _save_account(user_id, account)
+
+
+def _create_account(user_id: int, account: Account, on_created: Callable[[Account], None] | None) -> None:
+    _save_account(user_id, account)
+    if on_created is not None:
+        on_created(account)
+
+
+@traced()
+async def create_account(user_id: int, name: str, adjustment_amount: float, currency_code="RUB",
+                         on_created: Callable[[Account], None] | None = None):
+    """Create an account. ``on_created`` runs synchronously in the write's transaction."""
+    if currency_code not in CHAR_CODES:
         logger.warning("unknown currency code: %s", currency_code)
         raise HTTPException(status_code=400, detail="Unknown currency code")
     now = datetime.now(UTC)
     account = Account(user_id=user_id, name=name, adjustment_amount=adjustment_amount, currency_code=currency_code,
                       created_at=now, updated_at=now)
-    await db.run(account.save)
+    await atomic_write(_create_account, user_id, account, on_created)
     logger.info("account created: id=%d user_id=%d name=%s currency=%s", account.id, user_id, name, currency_code)
     return account
 
 
+@traced()
 async def update_account(user_id: int, account: Account, new_balance: float | None = None):
-    now = datetime.now(UTC)
-    async with db.atomic():
-        if new_balance is not None:
-            _, balance = await get_user_account_with_balance(user_id, account.id)
-            account.adjustment_amount = new_balance - balance + account.adjustment_amount
-        account.updated_at = now
-        await db.run(account.save)
+    await atomic_write(_update_account, user_id, account, new_balance, datetime.now(UTC))
     logger.info("account updated: id=%d user_id=%d", account.id, user_id)
     return account
 
@@ -90,6 +118,7 @@ async def _has_transactions(account_id: int) -> bool:
     return await db.run(lambda: Transaction.select().where(Transaction.account_id == account_id).exists())
 
 
+@traced()
 async def delete_account_by_id(account_id: int) -> Literal["soft", "hard"]:
     account = await db.run(lambda: Account.get_or_none(Account.id == account_id))
     if account is None:
@@ -100,13 +129,17 @@ async def delete_account_by_id(account_id: int) -> Literal["soft", "hard"]:
             account.is_deleted = True
             account.deleted_at = now
             await db.run(account.save)
+            await db.run(record_changes, account.user_id, 'account', [account_id], 'delete')
         logger.info("account soft-deleted: id=%d", account_id)
         return "soft"
-    await db.run(account.delete_instance)
+    async with db.atomic():
+        await db.run(account.delete_instance)
+        await db.run(record_changes, account.user_id, 'account', [account_id], 'delete')
     logger.info("account deleted: id=%d", account_id)
     return "hard"
 
 
+@traced()
 async def delete_account_by_id_and_user_id(user_id: int, account_id: int) -> Literal["soft", "hard"]:
     account = await get_account_by_id(user_id, account_id)
     if account is None:
@@ -117,8 +150,11 @@ async def delete_account_by_id_and_user_id(user_id: int, account_id: int) -> Lit
             account.is_deleted = True
             account.deleted_at = now
             await db.run(account.save)
+            await db.run(record_changes, user_id, 'account', [account_id], 'delete')
         logger.info("account soft-deleted: id=%d user_id=%d", account_id, user_id)
         return "soft"
-    await db.run(account.delete_instance)
+    async with db.atomic():
+        await db.run(account.delete_instance)
+        await db.run(record_changes, user_id, 'account', [account_id], 'delete')
     logger.info("account deleted: id=%d user_id=%d", account_id, user_id)
     return "hard"
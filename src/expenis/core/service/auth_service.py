@@ -1,10 +1,15 @@
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import UTC, datetime
 
 import bcrypt
 
 from ..errors import NotFoundException
+from ..metrics import registry
 from ..models import User, db
+from ..tracing import traced
+from ...config import BCRYPT_WORKERS
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +34,23 @@ def _verify_password(password: str, password_hash: str | None) -> bool:
     return bcrypt.checkpw(encoded, password_hash.encode("utf-8"))
 
 
+# bcrypt is deliberately slow (~250ms); running it on the event loop would
+# stall every other request, so it gets a small dedicated thread pool.
+_bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_BCRYPT_OUTSTANDING = registry.gauge("bcrypt_pool_outstanding", "bcrypt jobs running or queued")
+registry.gauge("bcrypt_pool_workers", "bcrypt thread pool size", callback=lambda: BCRYPT_WORKERS)
+registry.gauge("bcrypt_pool_queued", "bcrypt jobs waiting for a free thread",
+               callback=lambda: max(0, _BCRYPT_OUTSTANDING.value() - BCRYPT_WORKERS))
+
+
+async def _in_bcrypt_pool(fn, *args):
+    _BCRYPT_OUTSTANDING.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_bcrypt_executor, fn, *args)
+    finally:
+        _BCRYPT_OUTSTANDING.dec()
+
+
 class UsernameTakenError(Exception):
     pass
 
@@ -47,6 +69,7 @@ def _validate_new_password(password: str) -> None:
         raise ValueError("password must be at most 72 bytes")
 
 
+@traced()
 async def register_user(username: str, password: str) -> User:
     existing = await db.run(lambda: User.get_or_none(User.username == username))
     if existing is not None:
@@ -55,7 +78,7 @@ async def register_user(username: str, password: str) -> User:
     now = datetime.now(UTC)
     user = User(
         username=username,
-        password_hash=_hash_password(password),
+        password_hash=await _in_bcrypt_pool(_hash_password, password),
         telegram_id=None,
         created_at=now,
         updated_at=now,
@@ -65,17 +88,19 @@ async def register_user(username: str, password: str) -> User:
     return user
 
 
+@traced()
 async def authenticate_user(username: str, password: str) -> User | None:
     user = await db.run(lambda: User.get_or_none(User.username == username))
     if user is None:
         logger.warning("auth failed, no such username: %s", username)
         return None
-    if not _verify_password(password, user.password_hash):
+    if not await _in_bcrypt_pool(_verify_password, password, user.password_hash):
         logger.warning("auth failed, bad password: username=%s", username)
         return None
     return user
 
 
+@traced()
 async def get_or_create_user_by_telegram_id(telegram_id: int) -> User:
     user = await db.run(lambda: User.get_or_none(User.telegram_id == telegram_id))
     if user is not None:
@@ -93,6 +118,7 @@ async def get_or_create_user_by_telegram_id(telegram_id: int) -> User:
     return user
 
 
+@traced()
 async def get_user_by_id(user_id: int) -> User:
     user = await db.run(lambda: User.get_or_none(User.id == user_id))
     if user is None:
@@ -100,13 +126,14 @@ async def get_user_by_id(user_id: int) -> User:
     return user
 
 
+@traced()
 async def change_password(user_id: int, old_password: str, new_password: str) -> User:
     user = await get_user_by_id(user_id)
-    if not _verify_password(old_password, user.password_hash):
+    if not await _in_bcrypt_pool(_verify_password, old_password, user.password_hash):
         logger.warning("change_password rejected, bad old password: user_id=%d", user_id)
         raise InvalidPasswordError("invalid current password")
     _validate_new_password(new_password)
-    user.password_hash = _hash_password(new_password)
+    user.password_hash = await _in_bcrypt_pool(_hash_password, new_password)
     user.updated_at = datetime.now(UTC)
     await db.run(user.save)
     logger.info("password changed: user_id=%d", user_id)
@@ -3,6 +3,8 @@ from datetime import UTC, datetime
 from typing import Literal
 
 from ..models import Category, db
+from ..tracing import traced
+from .data_version_service import record_changes
 
 logger = logging.getLogger(__name__)
 
@@ -28,46 +30,67 @@ DEFAULT_EXPENSE = [
 ]
 
 
+@traced()
 async def get_user_categories(user_id: int) -> tuple[list[Category], list[Category]]:
     categories = await db.list(Category.select()
                                .where(Category.user_id == user_id))
     return [c for c in categories if c.type == 'income'], [c for c in categories if c.type == 'expense']
 
 
+@traced()
 async def get_category_by_id(user_id: int, id: int) -> Category | None:
     category = await db.run(lambda:
                             Category.get_or_none(Category.id == id)) # TODO filter by user_id
     return category
 
 
+@traced()
 async def create_category(user_id: int, name: str, type: CategoryType) -> Category:
     now = datetime.now(UTC)
     category = Category(user_id=user_id, name=name, type=type, created_at=now, updated_at=now)
-    await db.run(category.save)
+    async with db.atomic():
+        await db.run(category.save)
+        await db.run(record_changes, user_id, 'category', [category.id])
     logger.info("category created: id=%d user_id=%d name=%s type=%s", category.id, user_id, name, type)
     return category
 
 
+@traced()
 async def update_category(category: Category) -> Category:
     now = datetime.now(UTC)
     category.updated_at = now
-    await db.run(category.save)
+    async with db.atomic():
+        await db.run(category.save)
+        await db.run(record_changes, category.user_id, 'category', [category.id])
     logger.info("category updated: id=%d name=%s", category.id, category.name)
     return category
 
 
+@traced()
 async def delete_category(category: Category):
-    await db.run(category.delete_instance)
+    async with db.atomic():
+        await db.run(category.delete_instance)
+        await db.run(record_changes, category.user_id, 'category', [category.id], 'delete')
 
+@traced()
 async def delete_category_by_id(category_id: int):
     """Delete a category"""
-    await db.run(lambda: Category.delete_by_id(category_id))
+    category = await db.run(lambda: Category.get_or_none(Category.id == category_id))
+    if category is not None:
+        await delete_category(category)
 
+@traced()
 async def delete_category_by_id_and_user_id(user_id: int, category_id: int):
     logger.info("category deleted: id=%d user_id=%d", category_id, user_id)
-    await db.run(lambda: Category.delete().where((Category.id == category_id) & (Category.user_id == user_id)).execute())
+    async with db.atomic():
+        deleted = await db.run(
+            lambda: Category.delete().where((Category.id == category_id) & (Category.user_id == user_id)).execute()
+        )
+        if deleted:
+            await db.run(record_changes, user_id, 'category', [category_id], 'delete')
 
 
+@traced()
 async def create_default_categories(user_id: int):
     now = datetime.now(UTC)
     async with db.atomic():
@@ -95,3 +118,5 @@ async def create_default_categories(user_id: int):
                 for category in DEFAULT_EXPENSE
             ]
             await db.run(lambda: Category.bulk_create(incomes + expenses))
+            created = await db.list(Category.select(Category.id).where(Category.user_id == user_id))
+            await db.run(record_changes, user_id, 'category', [category.id for category in created])
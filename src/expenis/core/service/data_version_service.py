@@ -0,0 +1,101 @@
+import logging
+from collections.abc import Iterable
+from typing import Literal
+
+from .. import events
+from ..models import Change, DataVersion, db
+from ..tracing import traced
+from ..workers import SharedCounters
+
+logger = logging.getLogger(__name__)
+
+Entity = Literal['transaction', 'account', 'category', 'tag']
+ChangeOp = Literal['upsert', 'delete']
+
+# user_id -> last known data version. Versions only grow, so a stale read can
+# never overwrite a newer value (see _remember).
+_versions: dict[int, int] = {}
+
+# Multi-worker mode: a cached version is only trusted while the user's shared
+# stamp still has the value read before the version was loaded.
+_counters: SharedCounters | None = None
+_stamps: dict[int, int] = {}
+
+
+def share_data_versions(counters: SharedCounters) -> None:
+    """Invalidate cached versions across worker processes through ``counters``."""
+    global _counters
+    _counters = counters
+    reset_data_version_cache()
+
+
+def _remember(user_id: int, version: int) -> None:
+    if version > _versions.get(user_id, -1):
+        _versions[user_id] = version
+
+
+def _committed(user_id: int, version: int) -> None:
+    if _counters is None:
+        _remember(user_id, version)
+        return
+    # Another worker may have committed a newer version in between, reload.
+    _counters.bump(user_id)
+    _versions.pop(user_id, None)
+
+
+def bump_data_version(user_id: int) -> int:
+    """Increment the user's data version.
+
+    Synchronous on purpose: call it through ``db.run`` inside the same
+    ``db.atomic()`` block as the write it versions, so both commit together.
+    The in-memory copy is only updated once the transaction commits.
+    """
+    (DataVersion
+     .insert(user_id=user_id, version=1)
+     .on_conflict(conflict_target=[DataVersion.user_id],
+                  update={DataVersion.version: DataVersion.version + 1})
+     .execute())
+    version = (DataVersion
+               .select(DataVersion.version)
+               .where(DataVersion.user_id == user_id)
+               .scalar())
+    db.after_commit(lambda: _committed(user_id, version))
+    return version
+
+
+def record_changes(user_id: int, entity: Entity, entity_ids: Iterable[int], op: ChangeOp = 'upsert') -> int:
+    """Append rows to the change log and bump the user's data version.
+
+    Same contract as ``bump_data_version``: run it through ``db.run`` in the
+    transaction of the write it describes. Subscribers of /api/events are
+    notified once that transaction commits. Returns the new data version.
+    """
+    rows = [{'user_id': user_id, 'entity': entity, 'entity_id': entity_id, 'op': op} for entity_id in entity_ids]
+    if not rows:
+        return bump_data_version(user_id)
+    cursor = Change.insert_many(rows).execute()
+    version = bump_data_version(user_id)
+    event = {'type': 'change', 'cursor': cursor, 'data_version': version, 'entity': entity, 'op': op}
+    db.after_commit(lambda: events.publish(user_id, event))
+    return version
+
+
+@traced()
+async def get_data_version(user_id: int) -> int:
+    stamp = _counters.get(user_id) if _counters is not None else None
+    version = _versions.get(user_id)
+    if version is not None and (_counters is None or _stamps.get(user_id) == stamp):
+        return version
+    row = await db.run(lambda: DataVersion.get_or_none(DataVersion.user_id == user_id))
+    version = row.version if row is not None else 0
+    if _counters is not None:
+        _versions[user_id] = version
+        _stamps[user_id] = stamp
+        return version
+    _remember(user_id, version)
+    return _versions[user_id]
+
+
+def reset_data_version_cache() -> None:
+    _versions.clear()
+    _stamps.clear()
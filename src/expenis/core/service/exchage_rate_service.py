@@ -1,29 +1,44 @@
 import asyncio
+import hashlib
+import json
 import logging
 
-import httpx
-
 from .. import cache
+from ..metrics import registry
+from ..tracing import traced, tracer
 from ...config import ALPHAVANTAGE_KEY
 
 logger = logging.getLogger(__name__)
 
 crypto_list = ['BTC', 'ETH']
 
+FETCH_SECONDS = registry.histogram("exchange_rate_fetch_duration_seconds", "Exchange rate API request latency",
+                                   ("source",))
+
+# The rates last hashed by exchange_rates_version, and their hash.
+_versioned: tuple[dict | None, str] = (None, "")
 
-@cache.cached(ttl_seconds=60*60*4)
+
+@traced()
+@cache.cached(ttl_seconds=60*60*4, shared=True)
 async def get_course():
+    import httpx  # first used when the rates are fetched, not at import
+
     url = "https://www.cbr-xml-daily.ru/daily_json.js"
     crypto_url = f"https://www.alphavantage.co/query"
     async with httpx.AsyncClient() as client:
-        res = await client.get(url)
+        with FETCH_SECONDS.time("cbr"), tracer.span("GET cbr-xml-daily", url=url) as span:
+            res = await client.get(url)
+            span.set_attribute("http.status_code", res.status_code)
         if res.status_code != 200:
             logger.error("CBR API request failed with status %d", res.status_code)
             raise RuntimeError(f"request ended with code {res.status_code}")
         rates = res.json()
         for crypto in crypto_list:
-            res = await client.get(crypto_url, params={'apikey': ALPHAVANTAGE_KEY, 'function': 'CURRENCY_EXCHANGE_RATE',
-                                          'from_currency': crypto, 'to_currency': 'USD'})
+            with FETCH_SECONDS.time("alphavantage"), tracer.span("GET alphavantage", currency=crypto) as span:
+                res = await client.get(crypto_url, params={'apikey': ALPHAVANTAGE_KEY, 'function': 'CURRENCY_EXCHANGE_RATE',
+                                              'from_currency': crypto, 'to_currency': 'USD'})
+                span.set_attribute("http.status_code", res.status_code)
             if res.status_code != 200:
                 logger.error("alphavantage API request failed for %s with status %d", crypto, res.status_code)
                 raise RuntimeError(f"request ended with code {res.status_code}")
@@ -34,6 +49,7 @@ async def get_course():
         return rates
 
 
+@traced()
 async def get_currency_exchange_rate(currency_code: str) -> float:
     rates = await get_course()
     valutes = rates.get("Valute", dict())
@@ -43,8 +59,23 @@ async def get_currency_exchange_rate(currency_code: str) -> float:
         raise RuntimeError(f"exchange rate not found for {currency_code}")
     return valute.get("Value")
 
+@traced()
 async def convert_to_rubles(amount: float, currency_code: str) -> float | None:
     if amount is None:
         return amount
     rate = await get_currency_exchange_rate(currency_code)
     return amount * rate
+
+
+async def exchange_rates_version() -> str:
+    """Short hash of the exchange rates in use, for ETags of responses in rubles.
+
+    Changes whenever the rates are refetched, and is the same in every worker
+    sharing the cached rates.
+    """
+    global _versioned
+    rates = await get_course()
+    if _versioned[0] is not rates:
+        digest = hashlib.sha256(json.dumps(rates, sort_keys=True).encode()).hexdigest()[:12]
+        _versioned = (rates, digest)
+    return _versioned[1]
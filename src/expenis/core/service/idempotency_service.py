@@ -0,0 +1,230 @@
+"""``Idempotency-Key`` handling for requests that create objects.
+
+The first request with a key claims it with a pending row, runs, and stores
+its JSON response; repeats within the TTL get that response back without
+running again. Repeats arriving while the first is still running wait for it
+in the same worker; in another worker they get 409 and retry. Reusing a key
+for a different request is a 422. Failed requests release their key, so the
+client's retry runs for real.
+
+A request that creates something stores its response with ``store_response``
+in the transaction of the create, so the object and the response commit
+together: no crash or failed write in between can leave a created object
+behind a claim that a retry would take over.
+"""
+import asyncio
+import hashlib
+import logging
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from ..group_commit import atomic_write
+from ..metrics import registry
+from ..models import IdempotencyKey, db
+from ..tracing import traced
+from ...config import IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_HOURS
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_REPLAYS = registry.counter("idempotent_replays_total", "Requests answered with a stored response",
+                                      labels=("source",))
+
+MAX_KEY_LENGTH = 255
+# Longer than nginx waits for a response: a claim this old belongs to a request
+# that crashed or could not release it.
+PENDING_TIMEOUT = timedelta(minutes=1)
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    request_hash: str
+    status_code: int
+    body: bytes
+    created_at: datetime
+
+
+@dataclass
+class _Claim:
+    user_id: int
+    key: str
+    request_hash: str
+    created_at: datetime
+    response: StoredResponse | None = None
+
+
+# The claim of the request run_idempotent is producing, for store_response.
+_producing: ContextVar[_Claim | None] = ContextVar("idempotency_claim", default=None)
+
+# (user_id, key) -> completed response, most recently used last.
+_responses: OrderedDict[tuple[int, str], StoredResponse] = OrderedDict()
+# (user_id, key) -> response of the request still running in this worker.
+_running: dict[tuple[int, str], asyncio.Future] = {}
+
+
+def request_hash(operation: str, request: BaseModel) -> str:
+    return hashlib.sha256(f"{operation}\n{request.model_dump_json()}".encode()).hexdigest()
+
+
+def _remember(cache_key: tuple[int, str], response: StoredResponse) -> None:
+    _responses[cache_key] = response
+    _responses.move_to_end(cache_key)
+    while len(_responses) > IDEMPOTENCY_CACHE_SIZE:
+        _responses.popitem(last=False)
+
+
+def _cached(cache_key: tuple[int, str], now: datetime) -> StoredResponse | None:
+    response = _responses.get(cache_key)
+    if response is None:
+        return None
+    if response.created_at <= now - timedelta(hours=IDEMPOTENCY_TTL_HOURS):
+        del _responses[cache_key]
+        return None
+    _responses.move_to_end(cache_key)
+    return response
+
+
+def _check_same_request(response: StoredResponse, request_hash: str) -> StoredResponse:
+    if response.request_hash != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    return response
+
+
+def _claim(user_id: int, key: str, request_hash: str, now: datetime) -> IdempotencyKey | None:
+    """Claim the key and return None, or return the row of whoever holds it."""
+    expired = IdempotencyKey.created_at <= now - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    abandoned = (IdempotencyKey.status_code == 0) & (IdempotencyKey.created_at <= now - PENDING_TIMEOUT)
+    # A pending row's body identifies its claimer.
+    token = uuid.uuid4().bytes
+    # Expired rows the cleanup job has not deleted yet are taken over, and so
+    # are claims of requests that died without releasing them.
+    (IdempotencyKey
+     .insert(user_id=user_id, key=key, request_hash=request_hash, status_code=0, body=token, created_at=now)
+     .on_conflict(conflict_target=[IdempotencyKey.user_id, IdempotencyKey.key],
+                  update={IdempotencyKey.request_hash: request_hash, IdempotencyKey.status_code: 0,
+                          IdempotencyKey.body: token, IdempotencyKey.created_at: now},
+                  where=expired | abandoned)
+     .execute())
+    row = IdempotencyKey.get((IdempotencyKey.user_id == user_id) & (IdempotencyKey.key == key))
+    if row.status_code == 0 and bytes(row.body) == token:
+        return None
+    return row
+
+
+def _complete(user_id: int, key: str, status_code: int, body: bytes) -> None:
+    (IdempotencyKey
+     .update(status_code=status_code, body=body)
+     .where((IdempotencyKey.user_id == user_id) & (IdempotencyKey.key == key))
+     .execute())
+
+
+def _release(user_id: int, key: str) -> None:
+    (IdempotencyKey
+     .delete()
+     .where((IdempotencyKey.user_id == user_id) & (IdempotencyKey.key == key) & (IdempotencyKey.status_code == 0))
+     .execute())
+
+
+def store_response(response: BaseModel) -> None:
+    """Store ``response`` for the Idempotency-Key of the request being produced, if any.
+
+    Same contract as ``record_changes``: run it through ``db.run`` in the
+    transaction of the write that creates what the response describes.
+    """
+    claim = _producing.get()
+    if claim is None:
+        return
+    body = response.model_dump_json().encode()
+    _complete(claim.user_id, claim.key, 200, body)
+    claim.response = StoredResponse(claim.request_hash, 200, body, claim.created_at)
+
+
+@traced()
+async def run_idempotent(user_id: int, key: str, request_hash: str,
+                         produce: Callable[[], Awaitable[BaseModel]]) -> tuple[StoredResponse, bool]:
+    """Return the stored response for ``key``, or run ``produce`` once and store its result.
+
+    The flag tells whether the response is a replay.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+    cache_key = (user_id, key)
+    now = datetime.now(UTC)
+
+    response = _cached(cache_key, now)
+    if response is not None:
+        IDEMPOTENT_REPLAYS.inc("memory")
+        return _check_same_request(response, request_hash), True
+
+    running = _running.get(cache_key)
+    if running is not None:
+        try:
+            response = await asyncio.shield(running)
+        except asyncio.CancelledError:
+            if not running.cancelled():
+                raise
+            # The first request was abandoned before it finished, take over.
+            return await run_idempotent(user_id, key, request_hash, produce)
+        IDEMPOTENT_REPLAYS.inc("coalesced")
+        return _check_same_request(response, request_hash), True
+
+    future = asyncio.get_running_loop().create_future()
+    _running[cache_key] = future
+    try:
+        row = await atomic_write(_claim, user_id, key, request_hash, now)
+        if row is not None:
+            if row.status_code == 0:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress",
+                                    headers={"Retry-After": "1"})
+            response = StoredResponse(row.request_hash, row.status_code, bytes(row.body), row.created_at)
+            _remember(cache_key, response)
+            IDEMPOTENT_REPLAYS.inc("database")
+            future.set_result(response)
+            return _check_same_request(response, request_hash), True
+        claim = _Claim(user_id, key, request_hash, now)
+        token = _producing.set(claim)
+        try:
+            result = await produce()
+        except BaseException:
+            # Only releases a claim still pending, not one completed with its create.
+            await atomic_write(_release, user_id, key)
+            raise
+        finally:
+            _producing.reset(token)
+        response = claim.response
+        if response is None:
+            # produce() created nothing in the database, store its result now.
+            response = StoredResponse(request_hash, 200, result.model_dump_json().encode(), now)
+            await atomic_write(_complete, user_id, key, response.status_code, response.body)
+        _remember(cache_key, response)
+        future.set_result(response)
+        return response, False
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        if not future.done():
+            future.set_exception(e)
+            # Waiters re-raise it; without them nobody would retrieve it.
+            future.exception()
+        raise
+    finally:
+        _running.pop(cache_key, None)
+
+
+@traced()
+async def delete_expired_idempotency_keys() -> int:
+    cutoff = datetime.now(UTC) - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    deleted = await db.run(lambda: IdempotencyKey.delete().where(IdempotencyKey.created_at <= cutoff).execute())
+    logger.info("deleted %d expired idempotency keys", deleted)
+    return deleted
+
+
+def reset_idempotency_cache() -> None:
+    _responses.clear()
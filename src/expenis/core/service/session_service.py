@@ -4,9 +4,11 @@ from datetime import UTC, datetime, timedelta
 
 from ..errors import NotFoundException
 from ..models import db, Session
+from ..tracing import traced
 
 logger = logging.getLogger(__name__)
 
+@traced()
 async def create_session() -> str:
     now = datetime.now(UTC)
     session_id = str(uuid.uuid4())
@@ -20,6 +22,7 @@ async def create_session() -> str:
     logger.info("session created: %s", session_id)
     return session_id
 
+@traced()
 async def get_session(session_id: str) -> Session:
     session = await db.run(lambda:
                            Session.get_or_none(Session.id == session_id))
@@ -28,6 +31,7 @@ async def get_session(session_id: str) -> Session:
         raise NotFoundException(f"session {session_id} not found")
     return session
 
+@traced()
 async def clear_old_sessions():
     now = datetime.now(UTC)
     old_time = now - timedelta(minutes=5)
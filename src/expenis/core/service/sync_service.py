@@ -0,0 +1,101 @@
+import logging
+from dataclasses import dataclass, field
+
+from peewee import fn
+
+from ..models import Account, Category, Change, Tag, Transaction, db
+from ..tracing import traced
+from .account_service import _accounts_with_balance_query
+from .transaction_service import get_transaction_tags_by_transaction_ids
+
+logger = logging.getLogger(__name__)
+
+SYNC_PAGE_MAX = 1000
+
+
+@dataclass
+class SyncPage:
+    cursor: int
+    has_more: bool
+    transactions: list[Transaction] = field(default_factory=list)
+    transaction_tags: dict[int, list[str]] = field(default_factory=dict)
+    accounts: list[tuple[Account, float]] = field(default_factory=list)
+    categories: list[Category] = field(default_factory=list)
+    tags: list[str] = field(default_factory=list)
+    deleted: dict[str, list[int]] = field(default_factory=dict)
+
+
+@traced()
+async def get_changes_since(user_id: int, since: int, limit: int = 500) -> SyncPage:
+    """Return one page of the user's changes after the ``since`` cursor.
+
+    Only the change log and the rows it points at are read, so the cost is
+    proportional to the number of changes, not to the user's history.
+    Several changes of the same row inside a page collapse into its last op;
+    upserts carry the row's current state.
+    """
+    limit = max(1, min(limit, SYNC_PAGE_MAX))
+    changes = await db.list(
+        Change.select()
+        .where((Change.user_id == user_id) & (Change.id > since))
+        .order_by(Change.id)
+        .limit(limit + 1)
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    page = SyncPage(cursor=changes[-1].id if changes else since, has_more=has_more)
+
+    last_op: dict[tuple[str, int], str] = {}
+    for change in changes:
+        last_op[(change.entity, change.entity_id)] = change.op
+
+    upserts: dict[str, list[int]] = {'transaction': [], 'account': [], 'category': [], 'tag': []}
+    deleted: dict[str, list[int]] = {'transaction': [], 'account': [], 'category': [], 'tag': []}
+    for (entity, entity_id), op in last_op.items():
+        if op == 'delete':
+            deleted[entity].append(entity_id)
+        else:
+            upserts[entity].append(entity_id)
+    page.deleted = deleted
+
+    if upserts['transaction']:
+        page.transactions = await db.run(lambda: Transaction
+                                         .select()
+                                         .where((Transaction.user_id == user_id) &
+                                                (Transaction.id.in_(upserts['transaction'])))
+                                         .order_by(Transaction.created_at.desc())
+                                         .prefetch(Account, Category))
+        page.transaction_tags = await get_transaction_tags_by_transaction_ids(
+            user_id, [transaction.id for transaction in page.transactions])
+    if upserts['account']:
+        accounts = await db.list(_accounts_with_balance_query(
+            (Account.user_id == user_id) & (Account.id.in_(upserts['account'])) & (Account.is_deleted == False)
+        ))
+        page.accounts = [(a, a.balance) for a in accounts]
+    if upserts['category']:
+        page.categories = await db.list(
+            Category.select().where((Category.user_id == user_id) & (Category.id.in_(upserts['category'])))
+        )
+    if upserts['tag']:
+        tags = await db.list(
+            Tag.select().where((Tag.user_id == user_id) & (Tag.id.in_(upserts['tag']))).order_by(Tag.name)
+        )
+        page.tags = [tag.name for tag in tags]
+
+    logger.info("sync page served: user_id=%d since=%d cursor=%d changes=%d has_more=%s",
+                user_id, since, page.cursor, len(changes), has_more)
+    return page
+
+
+@traced()
+async def get_entity_versions(user_id: int) -> dict[str, int]:
+    """Latest change cursor per entity type, 0 for entities never written."""
+    rows = await db.run(lambda: list(
+        Change.select(Change.entity, fn.MAX(Change.id))
+        .where(Change.user_id == user_id)
+        .group_by(Change.entity)
+        .tuples()
+    ))
+    versions = {'transaction': 0, 'account': 0, 'category': 0, 'tag': 0}
+    versions.update(rows)
+    return versions
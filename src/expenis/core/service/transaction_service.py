@@ -1,7 +1,16 @@
 import logging
+import operator
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
 from datetime import UTC, date, datetime
+from functools import reduce
 
+from peewee import SQL, Expression, Model, fn
+
+from ..group_commit import atomic_write
 from ..models import Account, Category, Tag, Transaction, TransactionTag, db
+from ..tracing import traced
+from .data_version_service import record_changes
 
 logger = logging.getLogger(__name__)
 
@@ -19,23 +28,69 @@ def normalize_tags(tags: list[str] | None) -> list[str]:
     return normalized
 
 
-async def get_transactions_for_period(user_id: int, start_date: date, end_date: date) -> list[Transaction]:
-    """Get transactions for a specific period"""
+@dataclass(frozen=True)
+class TransactionFilter:
+    """Optional conditions on a transaction list, all of which must hold."""
+    account_id: int | None = None
+    category_id: int | None = None
+    type: str | None = None
+    # Every tag must be on the transaction.
+    tags: tuple[str, ...] = ()
+    min_amount: float | None = None
+    max_amount: float | None = None
+    description_contains: str | None = None
+
+
+def _filter_condition(user_id: int, filters: TransactionFilter) -> Expression | None:
+    conditions = []
+    if filters.account_id is not None:
+        conditions.append(Transaction.account == filters.account_id)
+    if filters.category_id is not None:
+        conditions.append(Transaction.category == filters.category_id)
+    if filters.type is not None:
+        conditions.append(Transaction.category.in_(
+            Category.select(Category.id).where((Category.user_id == user_id) & (Category.type == filters.type))))
+    for tag in normalize_tags(list(filters.tags)):
+        conditions.append(fn.EXISTS(
+            TransactionTag
+            .select(SQL('1'))
+            .join(Tag)
+            .where((TransactionTag.transaction == Transaction.id) & (Tag.user_id == user_id) & (Tag.name == tag))))
+    if filters.min_amount is not None:
+        conditions.append(Transaction.amount >= filters.min_amount)
+    if filters.max_amount is not None:
+        conditions.append(Transaction.amount <= filters.max_amount)
+    if filters.description_contains:
+        # casefold() is registered on every connection, see models.database.
+        conditions.append(fn.instr(fn.casefold(Transaction.description),
+                                   filters.description_contains.casefold()) > 0)
+    return reduce(operator.and_, conditions) if conditions else None
+
+
+@traced()
+async def get_transactions_for_period(user_id: int, start_date: date, end_date: date,
+                                      filters: TransactionFilter | None = None,
+                                      related: Sequence[type[Model]] = (Account, Category)) -> list[Transaction]:
+    """Get transactions for a specific period, optionally narrowed by ``filters``
+
+    Only the ``related`` models are prefetched; callers that leave one out
+    must not touch that relation on the results.
+    """
     start_datetime = datetime.combine(start_date, datetime.min.time())
     end_datetime = datetime.combine(end_date, datetime.max.time())
-    transactions = await db.run(lambda: Transaction
-                                 .select()
-                                 .where(
-                                    (Transaction.user_id == user_id) &
-                                    (Transaction.created_at >= start_datetime) &
-                                    (Transaction.created_at <= end_datetime))
-                                 .order_by(Transaction.created_at.desc())
-                                 .prefetch(Account, Category)
-                                )
+    condition = ((Transaction.user_id == user_id) &
+                 (Transaction.created_at >= start_datetime) &
+                 (Transaction.created_at <= end_datetime))
+    extra = _filter_condition(user_id, filters) if filters is not None else None
+    if extra is not None:
+        condition &= extra
+    query = Transaction.select().where(condition).order_by(Transaction.created_at.desc())
+    transactions = await db.run(lambda: query.prefetch(*related) if related else list(query))
     return transactions
 
 
 # TODO deprecated use get_transaction_by_id_and_user_id
+@traced()
 async def get_transaction_by_id(transaction_id: int) -> Transaction | None:
     """Get a transaction by its ID"""
     transaction = await db.run(lambda: Transaction
@@ -44,6 +99,7 @@ async def get_transaction_by_id(transaction_id: int) -> Transaction | None:
                                .prefetch(Account, Category))
     return transaction[0] if len(transaction) > 0 else None
 
+@traced()
 async def get_transaction_by_id_and_user_id(user_id: int, transaction_id: int) -> Transaction | None:
     """Get a transaction by its ID"""
     transaction = await db.run(lambda: Transaction
@@ -53,72 +109,129 @@ async def get_transaction_by_id_and_user_id(user_id: int, transaction_id: int) -
     return transaction[0] if len(transaction) > 0 else None
 
 
+def _record_balance_changes(user_id: int, account_ids: list[int | None]) -> None:
+    # Accounts sync with their balance, which every transaction write moves.
+    record_changes(user_id, 'account', sorted({account_id for account_id in account_ids if account_id is not None}))
+
+
+def _save_transaction(transaction: Transaction) -> None:
+    previous_account_id = None
+    if transaction.id is not None:
+        previous_account_id = (Transaction
+                               .select(Transaction.account)
+                               .where(Transaction.id == transaction.id)
+                               .scalar())
+    transaction.save()
+    record_changes(transaction.user_id, 'transaction', [transaction.id])
+    _record_balance_changes(transaction.user_id, [transaction.account_id, previous_account_id])
+
+
+def _delete_transaction(user_id: int, transaction_id: int) -> bool:
+    condition = (Transaction.id == transaction_id) & (Transaction.user_id == user_id)
+    account_id = Transaction.select(Transaction.account).where(condition).scalar()
+    if account_id is None:
+        return False
+    Transaction.delete().where(condition).execute()
+    record_changes(user_id, 'transaction', [transaction_id], 'delete')
+    _record_balance_changes(user_id, [account_id])
+    return True
+
+
+@traced()
 async def save_transaction(transaction: Transaction) -> Transaction:
     now = datetime.now(UTC)
     transaction.created_at = now if transaction.created_at is None else transaction.created_at
     transaction.updated_at = now if transaction.updated_at is None else transaction.updated_at
-    await db.run(transaction.save)
+    await atomic_write(_save_transaction, transaction)
     logger.info("transaction saved: id=%d user_id=%d amount=%s", transaction.id, transaction.user_id, transaction.amount)
     return transaction
 
+def _create_transaction(transaction: Transaction, tags: list[str],
+                        on_created: Callable[[Transaction, list[str]], None] | None) -> None:
+    _save_transaction(transaction)
+    _replace_transaction_tags(transaction.user_id, transaction.id, tags)
+    if on_created is not None:
+        on_created(transaction, tags)
+
+
+@traced()
+async def create_transaction(transaction: Transaction, tags: list[str] | None = None,
+                             on_created: Callable[[Transaction, list[str]], None] | None = None) -> list[str]:
+    """Save a new transaction with its tags in one write and return the normalized tags.
+
+    ``on_created`` runs synchronously in that write's transaction, once both are saved.
+    """
+    normalized_tags = normalize_tags(tags)
+    now = datetime.now(UTC)
+    transaction.created_at = now if transaction.created_at is None else transaction.created_at
+    transaction.updated_at = now if transaction.updated_at is None else transaction.updated_at
+    await atomic_write(_create_transaction, transaction, normalized_tags, on_created)
+    logger.info("transaction created: id=%d user_id=%d amount=%s", transaction.id, transaction.user_id,
+                transaction.amount)
+    return normalized_tags
+
+@traced()
 async def update_transaction(transaction: Transaction) -> Transaction:
-    await db.run(transaction.save)
+    await atomic_write(_save_transaction, transaction)
     logger.info("transaction updated: id=%d user_id=%d", transaction.id, transaction.user_id)
     return transaction
 
+@traced()
 async def delete_transaction(transaction: Transaction):
     """Delete a transaction"""
-    await db.run(transaction.delete_instance)
+    async with db.atomic():
+        await db.run(_delete_transaction, transaction.user_id, transaction.id)
 
+@traced()
 async def delete_transaction_by_id(transaction_id: int):
     """Delete a transaction"""
-    await db.run(lambda: Transaction.delete_by_id(transaction_id))
+    transaction = await db.run(lambda: Transaction.get_or_none(Transaction.id == transaction_id))
+    if transaction is not None:
+        await delete_transaction(transaction)
 
+@traced()
 async def delete_transaction_by_id_and_user_id(user_id: int, transaction_id: int):
     logger.info("transaction deleted: id=%d user_id=%d", transaction_id, user_id)
-    await db.run(lambda: Transaction.delete().where((Transaction.id == transaction_id) & (Transaction.user_id == user_id)).execute())
+    async with db.atomic():
+        await db.run(_delete_transaction, user_id, transaction_id)
 
 
+@traced()
 async def set_transaction_tags(user_id: int, transaction_id: int, tags: list[str] | None) -> list[str]:
     normalized_tags = normalize_tags(tags)
+    await atomic_write(_replace_transaction_tags, user_id, transaction_id, normalized_tags)
+    return normalized_tags
 
-    async with db.atomic():
-        await db.run(
-            lambda: TransactionTag.delete().where(TransactionTag.transaction_id == transaction_id).execute()
-        )
-
-        if not normalized_tags:
-            return []
-
-        existing_tags = await db.list(
-            Tag.select().where((Tag.user_id == user_id) & (Tag.name.in_(normalized_tags)))
-        )
-        existing_names = {tag.name for tag in existing_tags}
-
-        now = datetime.now(UTC)
-        new_tags = [
-            Tag(user_id=user_id, name=tag_name, created_at=now, updated_at=now)
-            for tag_name in normalized_tags
-            if tag_name not in existing_names
-        ]
-        if new_tags:
-            await db.run(lambda: Tag.bulk_create(new_tags))
-
-        all_tags = await db.list(
-            Tag.select().where((Tag.user_id == user_id) & (Tag.name.in_(normalized_tags)))
-        )
-        tags_by_name = {tag.name: tag for tag in all_tags}
-
-        await db.run(
-            lambda: TransactionTag.bulk_create([
-                TransactionTag(transaction=transaction_id, tag=tags_by_name[tag_name].id)
-                for tag_name in normalized_tags
-            ])
-        )
 
-    return normalized_tags
+def _replace_transaction_tags(user_id: int, transaction_id: int, tags: list[str]) -> None:
+    TransactionTag.delete().where(TransactionTag.transaction_id == transaction_id).execute()
+    record_changes(user_id, 'transaction', [transaction_id])
+
+    if not tags:
+        return
+
+    existing_names = {tag.name for tag in Tag.select().where((Tag.user_id == user_id) & (Tag.name.in_(tags)))}
+
+    now = datetime.now(UTC)
+    new_tags = [
+        Tag(user_id=user_id, name=tag_name, created_at=now, updated_at=now)
+        for tag_name in tags
+        if tag_name not in existing_names
+    ]
+    if new_tags:
+        Tag.bulk_create(new_tags)
+
+    tags_by_name = {tag.name: tag for tag in Tag.select().where((Tag.user_id == user_id) & (Tag.name.in_(tags)))}
+    if new_tags:
+        record_changes(user_id, 'tag', [tags_by_name[tag.name].id for tag in new_tags])
+
+    TransactionTag.bulk_create([
+        TransactionTag(transaction=transaction_id, tag=tags_by_name[tag_name].id)
+        for tag_name in tags
+    ])
 
 
+@traced()
 async def get_transaction_tags_by_transaction_ids(user_id: int, transaction_ids: list[int]) -> dict[int, list[str]]:
     if not transaction_ids:
         return {}
@@ -136,6 +249,7 @@ async def get_transaction_tags_by_transaction_ids(user_id: int, transaction_ids:
     return tags_by_transaction_id
 
 
+@traced()
 async def get_user_tags(user_id: int) -> list[str]:
     tags = await db.list(
         Tag.select().where(Tag.user_id == user_id).order_by(Tag.name)
@@ -0,0 +1,94 @@
+"""Per-request SQL accounting: query count, DB time, slow and repeated statements.
+
+``db`` reports every executed statement to ``record_query``. Statements are
+attributed to the request whose ``RequestQueryStats`` is active in the
+current context (see ``track_queries``); outside a request only the slow
+query log applies.
+"""
+import logging
+import re
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from .metrics import registry
+from ..config import SQL_REPEATED_QUERY_THRESHOLD, SQL_SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+DB_QUERIES = registry.counter("db_queries_total", "Executed SQL statements")
+DB_SLOW_QUERIES = registry.counter("db_slow_queries_total", "SQL statements over the slow query threshold")
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_REPEATED_GROUPS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+_SHAPE_MAX_PARAMS = 16
+
+
+def fingerprint(sql: str) -> str:
+    """Normalize a statement so that calls differing only in values compare equal."""
+    sql = _LITERAL.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    sql = _REPEATED_GROUPS.sub("(...), ...", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def param_shape(params: Any) -> str:
+    # Types only: values may hold user data and do not belong in logs.
+    if not params:
+        return "()"
+    shape = ", ".join(type(param).__name__ for param in params[:_SHAPE_MAX_PARAMS])
+    if len(params) > _SHAPE_MAX_PARAMS:
+        shape += f", ... {len(params)} params"
+    return "(" + shape + ")"
+
+
+@dataclass
+class RequestQueryStats:
+    label: str = ""
+    count: int = 0
+    seconds: float = 0.0
+    rows: int = 0
+    by_fingerprint: Counter = field(default_factory=Counter)
+
+
+_current: ContextVar[RequestQueryStats | None] = ContextVar("request_query_stats", default=None)
+
+
+@contextmanager
+def track_queries(label: str = "") -> Iterator[RequestQueryStats]:
+    stats = RequestQueryStats(label=label)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def current_stats() -> RequestQueryStats | None:
+    return _current.get()
+
+
+def record_query(sql: str, params: Any, seconds: float, rows: int) -> None:
+    DB_QUERIES.inc()
+    if seconds * 1000 >= SQL_SLOW_QUERY_MS:
+        DB_SLOW_QUERIES.inc()
+        logger.warning("slow query: %.1fms rows=%d params=%s sql=%s",
+                       seconds * 1000, rows, param_shape(params), fingerprint(sql))
+
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.count += 1
+    stats.seconds += seconds
+    stats.rows += max(rows, 0)
+    key = fingerprint(sql)
+    stats.by_fingerprint[key] += 1
+    # Warn once per fingerprint, the moment it crosses the threshold.
+    if stats.by_fingerprint[key] == SQL_REPEATED_QUERY_THRESHOLD + 1:
+        logger.warning("possible N+1: %s issued more than %d times by %s",
+                       key, SQL_REPEATED_QUERY_THRESHOLD, stats.label or "unknown")
@@ -0,0 +1,248 @@
+"""Lightweight request tracing.
+
+A root span is opened per HTTP request by ``TracingMiddleware``; service
+functions decorated with ``@traced()``, ``db.run`` and upstream HTTP calls
+open child spans. The active span lives in a contextvar, so tasks started
+with ``asyncio.gather``/``create_task`` inherit their parent.
+
+Sampling is decided once per trace. Unsampled traces still get a trace id
+(it is attached to log records by ``TraceIdFilter``) but record no spans.
+Finished spans are handed to a background thread that writes them out, so
+exporting never blocks the event loop.
+"""
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from ..config import TRACING, TRACING_JSONL_PATH, TRACING_OTLP_ENDPOINT, TRACING_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    name: str
+    sampled: bool
+    start_ns: int = 0
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class JsonLinesExporter:
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def export(self, spans: list[Span]) -> None:
+        with self.path.open("a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpExporter:
+    """Posts spans as OTLP/HTTP JSON to ``{endpoint}/v1/traces``.
+
+    Any collector speaking OTLP/HTTP works, including a local stand-in.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "expenis"):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        import httpx  # only needed with this exporter, keeps it out of the app's import time
+
+        self._client = httpx.Client(timeout=5)
+
+    def export(self, spans: list[Span]) -> None:
+        otlp_spans = [{
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+            "name": span.name,
+            "kind": 2 if span.parent_id is None else 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        } for span in spans]
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "expenis"}, "spans": otlp_spans}],
+        }]}
+        self._client.post(self.url, json=body).raise_for_status()
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.0, exporter=None, batch_size: int = 256,
+                 flush_interval_seconds: float = 1.0):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self._queue: queue.SimpleQueue[Span | None] = queue.SimpleQueue()
+        self._worker: threading.Thread | None = None
+        self._pid = os.getpid()
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None and self.sample_rate > 0
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        parent = _current_span.get()
+        if parent is None:
+            # Unsampled roots are still created: their trace id ends up in the logs.
+            span = Span(_new_id(128), _new_id(64), None, name, self.enabled and random.random() < self.sample_rate)
+        elif not parent.sampled:
+            # Children of unsampled traces cost one contextvar read.
+            yield parent
+            return
+        else:
+            span = Span(parent.trace_id, _new_id(64), parent.span_id, name, True)
+        if span.sampled:
+            span.attributes.update(attributes)
+        token = _current_span.set(span)
+        span.start_ns = time.time_ns()
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            if span.sampled:
+                self._submit(span)
+
+    def _submit(self, span: Span) -> None:
+        if self._worker is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._export_loop, name="span-exporter", daemon=True)
+            self._worker.start()
+        self._queue.put(span)
+
+    def _export_loop(self) -> None:
+        batch: list[Span] = []
+        deadline = time.monotonic() + self.flush_interval_seconds
+        stopping = False
+        while not stopping:
+            try:
+                span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                span = False
+            if span is None:
+                stopping = True
+            elif span:
+                batch.append(span)
+            flush_due = time.monotonic() >= deadline
+            if batch and (stopping or flush_due or len(batch) >= self.batch_size):
+                try:
+                    self.exporter.export(batch)
+                except Exception:
+                    logger.warning("span export failed, dropped %d spans", len(batch), exc_info=True)
+                batch = []
+            if flush_due:
+                deadline = time.monotonic() + self.flush_interval_seconds
+
+    def shutdown(self) -> None:
+        """Export buffered spans and stop the worker."""
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join(timeout=10)
+            self._worker = None
+
+
+def is_recording() -> bool:
+    """Whether the current context belongs to a sampled trace."""
+    span = _current_span.get()
+    return span is not None and span.sampled
+
+
+def current_trace_id() -> str | None:
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+def traced(name: str | None = None) -> Callable:
+    """Wrap a coroutine function in a child span named ``module.function``."""
+    def decorator(func):
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            parent = _current_span.get()
+            if parent is not None and not parent.sampled:
+                return await func(*args, **kwargs)
+            with tracer.span(span_name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds ``trace_id`` to every record so formatters can print it."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id() or "-"
+        return True
+
+
+def _make_exporter():
+    if TRACING == "jsonl":
+        return JsonLinesExporter(TRACING_JSONL_PATH)
+    if TRACING == "otlp":
+        return OtlpHttpExporter(TRACING_OTLP_ENDPOINT)
+    return None
+
+
+tracer = Tracer(TRACING_SAMPLE_RATE, _make_exporter())
@@ -1,4 +1,6 @@
-CODES = {
+from types import MappingProxyType
+
+_CODES = {
     "AUD": {
         "ID": "R01010",
         "NumCode": "036",
@@ -495,3 +497,8 @@ CODES = {
         "CharCode": "ETH",
     }
 }
+
+# Read-only views: the table is static per release and shared by request
+# validation, account creation and the /api/currency/codes payload.
+CODES = MappingProxyType({char_code: MappingProxyType(code) for char_code, code in _CODES.items()})
+CHAR_CODES = frozenset(CODES)
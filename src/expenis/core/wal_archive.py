@@ -0,0 +1,328 @@
+"""Continuous WAL archiving and point-in-time restore.
+
+Every run ships the committed WAL frames written since the previous run into
+a numbered segment file, then checkpoints. Together with a periodic base
+copy of the database file, the segments replay the database to the state of
+any run, so recovery granularity is the archive interval.
+
+This only works if the archiver is the sole checkpointer: automatic
+checkpoints are off while archiving is enabled (see ``models.database``).
+Frames are read and the checkpoint is run under a write lock, so nothing is
+appended in between. A checkpoint by anyone else (for example the last
+connection closing after an unarchived write) shows up as a change of the
+database file the archiver did not make; the archive then starts over from a
+new base instead of producing a replay with a hole in it.
+
+Archive layout::
+
+    base-<seq>-<unix ms>.db.gz      database file, includes segments up to <seq>
+    segment-<seq>-<unix ms>.wal.gz  frames of whole transactions, in commit order
+    state.json                      WAL position of the last run
+"""
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+WAL_ARCHIVED_FRAMES = registry.counter("wal_archive_frames_total", "WAL frames shipped to the archive")
+WAL_ARCHIVE_BASES = registry.counter("wal_archive_bases_total", "Base copies taken, by reason", ("reason",))
+WAL_ARCHIVE_LAST_SUCCESS = registry.gauge("wal_archive_last_success_timestamp_seconds",
+                                          "Unix time of the last archive run that left no unshipped frames")
+
+_WAL_HEADER = struct.Struct(">IIIIIIII")
+_FRAME_HEADER = struct.Struct(">IIIIII")
+_SEGMENT_MAGIC = b"EXPW"
+_SEGMENT_HEADER = struct.Struct(">4sII")
+_SEGMENT_FRAME = struct.Struct(">II")
+_STATE_FILE = "state.json"
+
+
+class RestoreError(Exception):
+    pass
+
+
+@dataclass
+class ArchiveResult:
+    frames: int = 0
+    segment: Path | None = None
+    base: Path | None = None
+    checkpointed: bool = False
+
+
+@dataclass
+class RestoreResult:
+    path: Path
+    base: Path
+    segments: list[Path] = field(default_factory=list)
+    restored_to: datetime | None = None
+
+
+@dataclass
+class _WalFrames:
+    salts: tuple[int, int] | None
+    page_size: int
+    end: int
+    # (page number, database size in pages for commit frames else 0, page data)
+    frames: list[tuple[int, int, bytes]] = field(default_factory=list)
+
+
+def _read_wal(wal_path: Path, offset: int | None) -> _WalFrames:
+    """Committed frames from ``offset`` (None: the start) up to the last commit."""
+    try:
+        f = wal_path.open("rb")
+    except FileNotFoundError:
+        return _WalFrames(None, 0, 0)
+    with f:
+        header = f.read(_WAL_HEADER.size)
+        if len(header) < _WAL_HEADER.size:
+            return _WalFrames(None, 0, 0)
+        _, _, page_size, _, salt1, salt2, _, _ = _WAL_HEADER.unpack(header)
+        start = offset if offset is not None else _WAL_HEADER.size
+        f.seek(start)
+        data = f.read()
+    wal = _WalFrames((salt1, salt2), page_size, start)
+    frame_size = _FRAME_HEADER.size + page_size
+    position = 0
+    pending = []
+    while position + frame_size <= len(data):
+        page, commit, frame_salt1, frame_salt2, _, _ = _FRAME_HEADER.unpack_from(data, position)
+        # Frames left over from an earlier WAL generation carry other salts.
+        if (frame_salt1, frame_salt2) != wal.salts:
+            break
+        page_start = position + _FRAME_HEADER.size
+        pending.append((page, commit, data[page_start:page_start + page_size]))
+        position += frame_size
+        if commit:
+            # Only whole transactions: anything after the last commit frame is
+            # a rolled back transaction's spill.
+            wal.frames.extend(pending)
+            pending = []
+            wal.end = start + position
+    return wal
+
+
+def _entries(archive_dir: Path, prefix: str) -> list[tuple[int, int, Path]]:
+    entries = []
+    for path in archive_dir.glob(f"{prefix}-*"):
+        _, seq, millis = path.name.split(".", 1)[0].split("-")
+        entries.append((int(seq), int(millis), path))
+    return sorted(entries)
+
+
+def _write_atomic(path: Path, write) -> None:
+    partial = path.with_name("." + path.name + ".tmp")
+    with partial.open("wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    partial.rename(path)
+
+
+def _write_segment(path: Path, page_size: int, frames: list[tuple[int, int, bytes]]) -> None:
+    def write(f):
+        with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6, mtime=0) as out:
+            out.write(_SEGMENT_HEADER.pack(_SEGMENT_MAGIC, 1, page_size))
+            for page, commit, data in frames:
+                out.write(_SEGMENT_FRAME.pack(page, commit))
+                out.write(data)
+    _write_atomic(path, write)
+
+
+def _read_segment(path: Path):
+    with gzip.open(path, "rb") as f:
+        magic, version, page_size = _SEGMENT_HEADER.unpack(f.read(_SEGMENT_HEADER.size))
+        if magic != _SEGMENT_MAGIC or version != 1:
+            raise RestoreError(f"{path.name} is not a WAL archive segment")
+        while header := f.read(_SEGMENT_FRAME.size):
+            page, commit = _SEGMENT_FRAME.unpack(header)
+            data = f.read(page_size)
+            if len(data) != page_size:
+                raise RestoreError(f"{path.name} is truncated")
+            yield page_size, page, commit, data
+
+
+def _load_state(archive_dir: Path) -> dict | None:
+    try:
+        return json.loads((archive_dir / _STATE_FILE).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def _save_state(archive_dir: Path, state: dict) -> None:
+    _write_atomic(archive_dir / _STATE_FILE, lambda f: f.write(json.dumps(state).encode("utf-8")))
+
+
+def _db_signature(db_path: Path) -> list[int]:
+    stat = db_path.stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _copy_base(db_path: Path, path: Path) -> None:
+    def write(f):
+        with db_path.open("rb") as src, gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6, mtime=0) as out:
+            shutil.copyfileobj(src, out, 1024 * 1024)
+    _write_atomic(path, write)
+
+
+def archive(db_path: str, archive_dir: str, base_interval_seconds: float = 86400, keep_bases: int = 3,
+            busy_timeout: float = 1.0) -> ArchiveResult:
+    """Ship new WAL frames, checkpoint and take a base copy when one is due.
+
+    Holds the database write lock while reading the WAL and checkpointing,
+    which takes as long as reading the frames written since the last run.
+    """
+    db_path = Path(db_path).absolute()
+    wal_path = db_path.with_name(db_path.name + "-wal")
+    archive_dir = Path(archive_dir).absolute()
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    result = ArchiveResult()
+
+    state = _load_state(archive_dir)
+    # Pruning may leave no segments, so bases count too.
+    last_seq = max((entry[0] for prefix in ("segment", "base") for entry in _entries(archive_dir, prefix)), default=0)
+    need_base = reason = None
+    if state is None:
+        need_base, reason = True, "initial"
+    elif state.get("need_base"):
+        need_base, reason = True, state.get("reason", "gap")
+    elif time.time() - state["base_at"] >= base_interval_seconds:
+        need_base, reason = True, "scheduled"
+
+    lock = sqlite3.connect(db_path, timeout=busy_timeout, isolation_level=None)
+    checkpointer = sqlite3.connect(db_path, timeout=busy_timeout, isolation_level=None)
+    try:
+        lock.execute("BEGIN IMMEDIATE")
+        try:
+            offset = None
+            if state is not None and _db_signature(db_path) != state["db"]:
+                # Someone else checkpointed: frames may have reached the
+                # database file without passing through the archive.
+                if not state.get("need_base"):
+                    logger.warning("wal archive: database changed outside the archiver, taking a new base")
+                need_base, reason = True, "gap"
+            elif state is not None and state.get("salts") is not None:
+                offset = state["offset"]
+            wal = _read_wal(wal_path, offset)
+            if wal.salts is not None and state is not None and wal.salts != state.get("salts"):
+                # A new WAL generation. It can only start after a checkpoint
+                # copied everything, and ours are the only ones: read from the top.
+                wal = _read_wal(wal_path, None)
+
+            # After a gap the frames do not apply to the previous base.
+            if wal.frames and reason != "gap":
+                last_seq += 1
+                result.segment = archive_dir / f"segment-{last_seq:010d}-{int(time.time() * 1000)}.wal.gz"
+                _write_segment(result.segment, wal.page_size, wal.frames)
+                result.frames = len(wal.frames)
+                WAL_ARCHIVED_FRAMES.inc(amount=result.frames)
+
+            busy, wal_frames, copied = checkpointer.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+            result.checkpointed = not busy and wal_frames == copied
+            new_state = {
+                "salts": list(wal.salts) if wal.salts is not None else None,
+                "offset": wal.end,
+                "db": _db_signature(db_path),
+                "base_at": state["base_at"] if state is not None else 0,
+                "need_base": bool(need_base),
+                "reason": reason,
+            }
+        finally:
+            lock.execute("ROLLBACK")
+    finally:
+        lock.close()
+        checkpointer.close()
+
+    if need_base and result.checkpointed:
+        # The database file now holds every archived frame and only our next
+        # checkpoint writes to it, so it can be copied without the lock.
+        base = archive_dir / f"base-{last_seq:010d}-{int(time.time() * 1000)}.db.gz"
+        _copy_base(db_path, base)
+        if _db_signature(db_path) == new_state["db"]:
+            result.base = base
+            new_state.update(base_at=time.time(), need_base=False, reason=None)
+            WAL_ARCHIVE_BASES.inc(reason)
+            logger.info("wal archive: new base %s (%s)", base.name, reason)
+        else:
+            base.unlink()
+            logger.warning("wal archive: database changed while copying the base, retrying next run")
+    _save_state(archive_dir, new_state)
+    if not new_state["need_base"]:
+        WAL_ARCHIVE_LAST_SUCCESS.set(time.time())
+    _prune(archive_dir, keep_bases)
+    return result
+
+
+def _prune(archive_dir: Path, keep_bases: int) -> None:
+    bases = _entries(archive_dir, "base")
+    if keep_bases <= 0 or len(bases) <= keep_bases:
+        return
+    for _, _, path in bases[:-keep_bases]:
+        path.unlink()
+    oldest_kept = bases[-keep_bases][0]
+    for seq, _, path in _entries(archive_dir, "segment"):
+        if seq <= oldest_kept:
+            path.unlink()
+
+
+def restore(archive_dir: str, target_path: str, to: datetime | None = None) -> RestoreResult:
+    """Rebuild the database as of ``to`` (default: the last archived run) into ``target_path``.
+
+    Uses the newest base taken at or before ``to`` and replays the segments
+    archived after it up to ``to``. The target must not exist.
+    """
+    archive_dir = Path(archive_dir)
+    target = Path(target_path)
+    if target.exists():
+        raise RestoreError(f"{target} already exists")
+    limit = int(to.timestamp() * 1000) if to is not None else None
+    bases = [entry for entry in _entries(archive_dir, "base") if limit is None or entry[1] <= limit]
+    if not bases:
+        raise RestoreError("no base copy at or before the requested time")
+    base_seq, base_millis, base_path = bases[-1]
+    segments = [entry for entry in _entries(archive_dir, "segment")
+                if entry[0] > base_seq and (limit is None or entry[1] <= limit)]
+    for expected, (seq, _, path) in enumerate(segments, start=base_seq + 1):
+        if seq != expected:
+            raise RestoreError(f"segment {expected} is missing before {path.name}")
+
+    result = RestoreResult(target, base_path)
+    partial = target.with_name("." + target.name + ".tmp")
+    try:
+        with gzip.open(base_path, "rb") as src, partial.open("wb") as out:
+            shutil.copyfileobj(src, out, 1024 * 1024)
+        last_millis = base_millis
+        with partial.open("r+b") as out:
+            for _, millis, path in segments:
+                for page_size, page, commit, data in _read_segment(path):
+                    out.seek((page - 1) * page_size)
+                    out.write(data)
+                    if commit:
+                        out.truncate(commit * page_size)
+                result.segments.append(path)
+                last_millis = millis
+            out.flush()
+            os.fsync(out.fileno())
+        conn = sqlite3.connect(partial)
+        try:
+            check = "; ".join(row[0] for row in conn.execute("PRAGMA quick_check"))
+        finally:
+            conn.close()
+        if check != "ok":
+            raise RestoreError(f"restored database failed quick_check: {check}")
+        partial.rename(target)
+    finally:
+        for leftover in (partial, partial.with_name(partial.name + "-wal"), partial.with_name(partial.name + "-shm")):
+            leftover.unlink(missing_ok=True)
+    result.restored_to = datetime.fromtimestamp(last_millis / 1000)
+    return result
@@ -0,0 +1,85 @@
+"""Coordination between uvicorn worker processes sharing one database.
+
+Both primitives live in files under ``WORKER_STATE_DIR`` and rely on
+``flock``, so they only work between processes on the same host, which is
+the only way workers share a SQLite file anyway.
+"""
+import fcntl
+import mmap
+import os
+import struct
+from pathlib import Path
+
+_SLOT = struct.Struct("<Q")
+
+
+class LeaderLock:
+    """Non-blocking exclusive lock; the worker holding it runs the scheduled jobs.
+
+    The kernel drops the lock when its holder exits or crashes, so another
+    worker's next ``try_acquire`` takes over.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._fd: int | None = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SharedCounters:
+    """Fixed array of 64-bit counters in a memory-mapped file, indexed by key modulo size.
+
+    Readers compare a slot with the value they saw when they cached something
+    for that key; writers bump it after their change is committed. Keys that
+    share a slot only cost each other an extra reload.
+    """
+
+    def __init__(self, path: str | Path, slots: int = 4096):
+        self.path = Path(path)
+        self.slots = slots
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = slots * _SLOT.size
+        # Concurrent first starts may both extend the file; the result is the same.
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def get(self, key: int) -> int:
+        return _SLOT.unpack_from(self._map, key % self.slots * _SLOT.size)[0]
+
+    def bump(self, key: int) -> None:
+        offset = key % self.slots * _SLOT.size
+        # Increments from different workers must not get lost.
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            _SLOT.pack_into(self._map, offset, _SLOT.unpack_from(self._map, offset)[0] + 1)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
@@ -1,14 +1,20 @@
 import argparse
 import asyncio
+import logging
+import os
 import sys
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 import uvicorn
 
-from ..config import DEV
+from peewee import IntegrityError
+
+from ..config import DATABASE_PATH, DEV, WAL_ARCHIVE_DIR, WORKERS
 from ..core.logging_config import setup_logging
 from ..core.models import User, db
-from .application import auth
+from . import runtime
+
+logger = logging.getLogger(__name__)
 
 
 async def _generate_token(username: str, days: int) -> None:
@@ -17,6 +23,8 @@ async def _generate_token(username: str, days: int) -> None:
     The user must already exist (created via the app or other means).
     If the username is not found, the command will exit with an error.
     """
+    from .application import auth
+
     await db.aconnect()
     try:
         user = await db.run(lambda: User.get_or_none(User.username == username))
@@ -52,7 +60,128 @@ async def _generate_token(username: str, days: int) -> None:
             pass
 
 
+async def _with_db(coro):
+    """Run a maintenance coroutine against the app's ``db`` and release the pool."""
+    await db.aconnect()
+    try:
+        return await coro
+    finally:
+        await db.aclose()
+        await db.close_pool()
+
+
+def _size(n: int) -> str:
+    if n < 1024:
+        return f"{n} B"
+    size = n / 1024
+    for unit in ("KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def _seed(argv: list[str]) -> None:
+    from ..core.seed import SEED_PASSWORD, seed
+
+    parser = argparse.ArgumentParser(prog="seed", description="Generate synthetic users and transactions.")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--transactions", type=int, default=1000, help="transactions per user")
+    parser.add_argument("--seed", type=int, default=42, help="random seed, also part of the usernames")
+    parser.add_argument("--days", type=int, default=730, help="spread transactions over this many days")
+    args = parser.parse_args(argv)
+    try:
+        stats = asyncio.run(_with_db(seed(args.users, args.transactions, seed=args.seed, days=args.days)))
+    except IntegrityError:
+        print(f"Error: users for seed {args.seed} already exist, pick another --seed.", file=sys.stderr)
+        sys.exit(1)
+    print(f"Seeded {stats.users} users, {stats.accounts} accounts, {stats.categories} categories, "
+          f"{stats.tags} tags, {stats.transactions} transactions in {stats.seconds:.1f}s")
+    print(f"Usernames: seed{args.seed}-user0..{args.users - 1}, password: {SEED_PASSWORD}")
+
+
+def _stats(argv: list[str]) -> None:
+    from ..core import maintenance
+
+    parser = argparse.ArgumentParser(prog="stats", description="Show database size, row counts and indexes.")
+    parser.add_argument("--top", type=int, default=10, help="number of users to list by transaction count")
+    args = parser.parse_args(argv)
+    stats = asyncio.run(_with_db(maintenance.collect_stats(args.top)))
+
+    print(f"Database: {stats.path}")
+    print(f"  size {_size(stats.db_bytes)}, WAL {_size(stats.wal_bytes)}, page size {stats.page_size}, "
+          f"free pages {stats.freelist_pages}, auto_vacuum {stats.auto_vacuum}")
+    print("\nRows:")
+    for table, count in stats.row_counts.items():
+        print(f"  {table:<24} {count:>12}")
+    print("\nIndexes (size, sqlite_stat1 from the last optimize):")
+    for index in stats.indexes:
+        size = _size(index.pages * stats.page_size) if index.pages is not None else "?"
+        print(f"  {index.table + '.' + index.name:<56} {size:>10}  {index.stat or '-'}")
+    print(f"\nTop {args.top} users by transactions:")
+    for user_id, username, count in stats.top_users:
+        print(f"  {user_id:>8} {username:<32} {count:>10}")
+
+
+def _optimize(argv: list[str]) -> None:
+    from ..core import maintenance
+
+    parser = argparse.ArgumentParser(prog="optimize", description="ANALYZE, PRAGMA optimize, incremental vacuum.")
+    parser.parse_args(argv)
+    result = asyncio.run(_with_db(maintenance.optimize()))
+    print(f"Free pages: {result.freelist_before} -> {result.freelist_after} (auto_vacuum {result.auto_vacuum})")
+    if result.auto_vacuum != "incremental" and result.freelist_after:
+        print("Free pages are only returned to the filesystem with auto_vacuum = INCREMENTAL.")
+
+
+def _rebuild_derived(argv: list[str]) -> None:
+    from ..core import maintenance
+
+    parser = argparse.ArgumentParser(prog="rebuild-derived",
+                                     description="Backfill the change log and bump data versions.")
+    parser.parse_args(argv)
+    result = asyncio.run(_with_db(maintenance.rebuild_derived()))
+    for entity, count in result.backfilled_changes.items():
+        print(f"  {entity:<12} {count} change log entries added")
+    print(f"Bumped data versions of {result.data_versions} users.")
+
+
+def _restore(argv: list[str]) -> None:
+    from ..core import wal_archive
+
+    parser = argparse.ArgumentParser(prog="restore", description="Point-in-time restore from the WAL archive.")
+    parser.add_argument("--to", type=datetime.fromisoformat,
+                        help="local time, e.g. 2025-01-31T18:05 (default: the latest archived state)")
+    parser.add_argument("--archive", default=WAL_ARCHIVE_DIR, required=not WAL_ARCHIVE_DIR,
+                        help="WAL archive directory (default: wal_archive_dir)")
+    parser.add_argument("--output", default=f"{DATABASE_PATH}.restored", help="file to write, must not exist")
+    args = parser.parse_args(argv)
+    try:
+        result = wal_archive.restore(args.archive, args.output, args.to)
+    except wal_archive.RestoreError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Restored to {result.restored_to:%Y-%m-%d %H:%M:%S} from {result.base.name} "
+          f"and {len(result.segments)} WAL segments: {result.path}")
+    print(f"Stop the server and replace {DATABASE_PATH} (and its -wal/-shm files) with it to go live.")
+
+
+# Admin commands: run them while the server is up, they share its database.
+# Each imports what it needs, so starting the server does not pay for them.
+COMMANDS = {
+    "seed": _seed,
+    "stats": _stats,
+    "optimize": _optimize,
+    "rebuild-derived": _rebuild_derived,
+    "restore": _restore,
+}
+
+
 def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
     if len(sys.argv) > 1 and sys.argv[1] == "token":
         parser = argparse.ArgumentParser(
             description="Generate a long-lived JWT token for LLM agents or automation."
@@ -73,11 +202,31 @@ def main() -> None:
         return
 
     # Normal server run
+    parser = argparse.ArgumentParser(description="Run the API server.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="worker processes; one of them runs the scheduled jobs (default: workers setting)")
+    parser.add_argument("--reload", action=argparse.BooleanOptionalAction, default=None,
+                        help="restart on code changes, single worker only (default: on in dev, default profile)")
+    parser.add_argument("--profile", choices=runtime.PROFILES, default="default",
+                        help="production: uvloop/httptools when installed, tuned backlog, keep-alive "
+                             "and concurrency limit, no access log")
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.workers > 1:
+        # Workers are fresh interpreters: they read their mode from the environment.
+        os.environ["workers"] = str(args.workers)
     log_config = setup_logging()
-    options = {"host": "0.0.0.0", "port": 8000, "log_config": log_config}
-    if DEV:
+    options = {"host": args.host, "port": args.port, "log_config": log_config,
+               **runtime.uvicorn_options(args.profile)}
+    reload = args.reload if args.reload is not None else DEV and args.profile == "default"
+    if args.workers > 1:
+        options["workers"] = args.workers
+    elif reload:
         options["reload"] = True
         options["reload_excludes"] = ["logs/"]
+    logger.info("runtime: %s", runtime.describe(args.profile, options))
     uvicorn.run("src.expenis.server.application:app", **options)
 
 
@@ -1,26 +1,49 @@
+import asyncio
+import calendar
+import contextlib
+import functools
+import gzip
+import hashlib
+import json
 import logging
+import os
 from contextlib import asynccontextmanager
-from datetime import UTC, date, datetime
-from typing import Annotated
+from datetime import UTC, date, datetime, timedelta
+from typing import Annotated, Literal
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
 from authx import AuthX, AuthXConfig, TokenPayload
 from authx import exceptions as authx_exceptions
-from fastapi import Depends, FastAPI, HTTPException, Query, Response
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
 from fastapi.exception_handlers import request_validation_exception_handler
 from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel
 from starlette.middleware.cors import CORSMiddleware
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
 from .dto import AccountCreateRequest, AccountDto, AccountUpdateRequest, AccountsResponse, AuthResponse, \
+    BootstrapResponse, BootstrapVersions, \
     CategoriesResponse, CategoryCreateRequest, CategoryDto, CurrencyCode, \
     CurrencyCodes, DeleteAccountResponse, \
     LoginRequest, LogoutResponse, MeResponse, PasswordChangeRequest, \
-    RegisterRequest, Transaction, \
+    RegisterRequest, DeletedEntities, SyncResponse, Transaction, \
     TransactionCreateRequest, TransactionsResponse, UserTagsResponse
-from ..config import COOKIE_DOMAIN, DEV, EXPIRATION_TIME_SECONDS, REFRESH_TIME_SECONDS, SECRET
+from .runtime import NATIVE_JSON_RESPONSES, FastJSONResponse
+from .middleware import CompressionMiddleware, MetricsMiddleware, ProfilingMiddleware, SqlStatsMiddleware, \
+    TracingMiddleware, accepts_gzip
+from ..config import ADMIN_USER_IDS, BACKUP_DIR, BACKUP_INTERVAL_HOURS, COMPRESSION_LEVEL, COMPRESSION_MIN_BYTES, \
+    COOKIE_DOMAIN, DB_ANALYZE_INTERVAL_MINUTES, DB_CHECKPOINT_INTERVAL_MINUTES, \
+    DB_CHECKPOINT_WAL_MB, DB_OPTIMIZE_INTERVAL_MINUTES, DB_QUICK_CHECK_INTERVAL_MINUTES, DB_VACUUM_INTERVAL_MINUTES, \
+    DB_VACUUM_STEP_PAGES, DEV, EVENTS_FANOUT, EVENTS_FANOUT_INTERVAL_SECONDS, EVENTS_HEARTBEAT_SECONDS, \
+    EXPIRATION_TIME_SECONDS, GROUP_COMMIT, GROUP_COMMIT_MAX_BATCH, GROUP_COMMIT_MAX_DELAY_MS, \
+    GROUP_COMMIT_MAX_PENDING, IDEMPOTENCY_GC_INTERVAL_MINUTES, LEADER_RETRY_SECONDS, LOOP_MONITOR, LOOP_MONITOR_INTERVAL_MS, LOOP_MONITOR_THRESHOLD_MS, PROFILE_DIR, PROFILE_RETENTION, PROFILE_SAMPLE_INTERVAL_MS, REFRESH_TIME_SECONDS, \
+    SECRET, SQL_DEBUG_HEADERS, WAL_ARCHIVE_DIR, WAL_ARCHIVE_INTERVAL_SECONDS, WORKER_STATE_DIR, WORKERS
+from ..core import events, group_commit
+from ..core.events import Subscription
+from ..core.loop_monitor import LoopLagMonitor
+from ..core.metrics import registry
+from ..core.tracing import tracer
+from ..core.workers import LeaderLock, SharedCounters
 from ..core.models import Account, Category, Transaction as ModelTransaction, db
 from ..core.service import authenticate_user, change_password, clear_old_sessions, create_account, create_category, \
     create_default_categories, \
@@ -29,34 +52,155 @@ from ..core.service import authenticate_user, change_password, clear_old_session
     get_category_by_id, \
     get_transaction_by_id_and_user_id, get_transaction_tags_by_transaction_ids, get_transactions_for_period, \
     get_user_account_with_balance, get_user_accounts_with_balance, get_user_categories, get_user_by_id, register_user, \
-    save_transaction, set_transaction_tags, update_account, update_category, update_transaction, get_user_tags
+    save_transaction, set_transaction_tags, update_account, update_category, update_transaction, get_user_tags, \
+    TransactionFilter, create_transaction, get_user_accounts as list_user_accounts
 from ..core.service.auth_service import InvalidPasswordError, UsernameTakenError
-from ..core.errors import NotFoundException
-from ..core.service.exchage_rate_service import convert_to_rubles, get_currency_exchange_rate
+from ..core.errors import NotFoundException, OverloadedException
+from ..core.service.data_version_service import get_data_version, share_data_versions
+from ..core.service.idempotency_service import delete_expired_idempotency_keys, request_hash, run_idempotent, \
+    store_response
+from ..core.service.exchage_rate_service import convert_to_rubles, exchange_rates_version, \
+    get_currency_exchange_rate
+from ..core.service.sync_service import SYNC_PAGE_MAX, get_changes_since, get_entity_versions
 from ..core.utils.currency_codes import CODES
 from ..version import __version__
 
 logger = logging.getLogger(__name__)
 
 
+JOB_SECONDS = registry.histogram("scheduler_job_duration_seconds", "Scheduler job run time", ("job",))
+JOB_FAILURES = registry.counter("scheduler_job_failures_total", "Scheduler job runs that raised", ("job",))
+
+
+async def _run_job(name: str, job, *args) -> None:
+    try:
+        with JOB_SECONDS.time(name):
+            await job(*args)
+    except Exception:
+        JOB_FAILURES.inc(name)
+        raise
+
+
 async def clear_job():
     logger.info("clearing old sessions")
-    await clear_old_sessions()
+    await _run_job("clear_old_sessions", clear_old_sessions)
+
+
+# name -> (period in minutes, function in core.maintenance, args); a period of 0 disables the job.
+MAINTENANCE_JOBS = {
+    "db_optimize": (DB_OPTIMIZE_INTERVAL_MINUTES, "periodic_optimize", (False,)),
+    "db_analyze": (DB_ANALYZE_INTERVAL_MINUTES, "periodic_optimize", (True,)),
+    # The WAL archiver checkpoints after shipping frames and must be the only one to.
+    "db_wal_checkpoint": (0 if WAL_ARCHIVE_DIR else DB_CHECKPOINT_INTERVAL_MINUTES, "checkpoint_wal",
+                          (int(DB_CHECKPOINT_WAL_MB * 1024 * 1024),)),
+    "db_wal_archive": (WAL_ARCHIVE_INTERVAL_SECONDS / 60 if WAL_ARCHIVE_DIR else 0, "archive_wal", ()),
+    "db_incremental_vacuum": (DB_VACUUM_INTERVAL_MINUTES, "vacuum_free_pages", (DB_VACUUM_STEP_PAGES,)),
+    "db_quick_check": (DB_QUICK_CHECK_INTERVAL_MINUTES, "quick_check_next_table", ()),
+}
+# Startup work that requests do not need waits this long, so uvicorn binds and serves first.
+DEFERRED_STARTUP_SECONDS = 1.0
+
+
+def _first_backup_time() -> datetime:
+    from ..core.backup import latest_backup_time
+
+    # Continue the existing schedule across restarts, but never back up while
+    # the server is still starting.
+    last = latest_backup_time(BACKUP_DIR)
+    due = last + timedelta(hours=BACKUP_INTERVAL_HOURS) if last is not None else datetime.now()
+    return max(due, datetime.now() + timedelta(minutes=1))
+
+
+# Created by the worker that runs the jobs; apscheduler is only imported there.
+scheduler = None
+loop_monitor = LoopLagMonitor(LOOP_MONITOR_INTERVAL_MS / 1000, LOOP_MONITOR_THRESHOLD_MS / 1000)
+# With several workers only the holder of this lock runs the scheduler.
+leader_lock = LeaderLock(os.path.join(WORKER_STATE_DIR, "scheduler.lock"))
+registry.gauge("scheduler_leader", "1 in the worker that runs the scheduled jobs",
+               callback=lambda: 1 if _scheduler_running() else 0)
 
 
-scheduler = AsyncIOScheduler()
+def _scheduler_running() -> bool:
+    return scheduler is not None and scheduler.running
+
+
+def _start_scheduler() -> None:
+    global scheduler
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from apscheduler.triggers.interval import IntervalTrigger
+    from ..core import maintenance
+
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(clear_job, IntervalTrigger(minutes=5))
+    for name, (minutes, job, args) in MAINTENANCE_JOBS.items():
+        if minutes > 0:
+            scheduler.add_job(_run_job, IntervalTrigger(minutes=minutes), args=(name, getattr(maintenance, job), *args),
+                              id=name, max_instances=1, coalesce=True)
+    if IDEMPOTENCY_GC_INTERVAL_MINUTES > 0:
+        scheduler.add_job(_run_job, IntervalTrigger(minutes=IDEMPOTENCY_GC_INTERVAL_MINUTES),
+                          args=("idempotency_gc", delete_expired_idempotency_keys), id="idempotency_gc",
+                          max_instances=1, coalesce=True)
+    if BACKUP_INTERVAL_HOURS > 0:
+        scheduler.add_job(_run_job, IntervalTrigger(hours=BACKUP_INTERVAL_HOURS, start_date=_first_backup_time()),
+                          args=("db_backup", maintenance.backup), id="db_backup", max_instances=1, coalesce=True)
+    scheduler.start()
+
+
+async def _campaign_for_leader() -> None:
+    # The lock is freed by the kernel when the leader exits, whichever way.
+    while not leader_lock.try_acquire():
+        await asyncio.sleep(LEADER_RETRY_SECONDS)
+    logger.info("worker %d took over the scheduled jobs", os.getpid())
+    _start_scheduler()
+
+
+async def _deferred_startup() -> None:
+    await asyncio.sleep(DEFERRED_STARTUP_SECONDS)
+    currency_codes_gzip()
+    try:
+        await clear_old_sessions()
+    except Exception:
+        logger.exception("clearing old sessions at startup failed")
+    if WORKERS <= 1:
+        _start_scheduler()
+    else:
+        await _campaign_for_leader()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if LOOP_MONITOR:
+        loop_monitor.start()
     await db.aconnect()
-    scheduler.add_job(clear_job, IntervalTrigger(minutes=5))
-    scheduler.start()
-    await clear_old_sessions()
+    if WORKERS > 1:
+        share_data_versions(SharedCounters(os.path.join(WORKER_STATE_DIR, "data_versions")))
+    if EVENTS_FANOUT == "sqlite":
+        events.start_fanout(EVENTS_FANOUT_INTERVAL_SECONDS)
+    if GROUP_COMMIT:
+        group_commit.start_group_commit(GROUP_COMMIT_MAX_BATCH, GROUP_COMMIT_MAX_DELAY_MS / 1000,
+                                        GROUP_COMMIT_MAX_PENDING)
+    startup = asyncio.create_task(_deferred_startup())
     yield
-    scheduler.shutdown()
+    startup.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await startup
+    await group_commit.stop_group_commit()
+    await events.stop_fanout()
+    await loop_monitor.stop()
+    if _scheduler_running():
+        from ..core import maintenance
+
+        scheduler.shutdown()
+        if WAL_ARCHIVE_DIR:
+            # Ship the tail before the last connection closes and checkpoints it.
+            try:
+                await _run_job("db_wal_archive", maintenance.archive_wal)
+            except Exception:
+                logger.exception("final WAL archive failed, the next run starts from a new base")
+    leader_lock.release()
     await db.aclose()
     await db.close_pool()
+    tracer.shutdown()
 
 
 tags_metadata = [
@@ -64,6 +208,7 @@ tags_metadata = [
     {"name": "accounts", "description": "Управление счетами, балансами и валютами."},
     {"name": "transactions", "description": "Создание, просмотр, обновление и удаление транзакций."},
     {"name": "categories", "description": "Управление категориями доходов и расходов."},
+    {"name": "sync", "description": "Инкрементальная синхронизация для офлайн-клиентов."},
     {"name": "other", "description": "Вспомогательные данные: теги пользователя, коды валют."},
 ]
 
@@ -74,6 +219,7 @@ app = FastAPI(
     version=__version__,
     openapi_tags=tags_metadata,
     lifespan=lifespan,
+    **({} if NATIVE_JSON_RESPONSES else {"default_response_class": FastJSONResponse}),
 )
 
 if DEV:
@@ -85,6 +231,11 @@ if DEV:
         allow_headers=["*"],
     )
 
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES, level=COMPRESSION_LEVEL)
+app.add_middleware(SqlStatsMiddleware, debug_headers=SQL_DEBUG_HEADERS)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
 
 # Customize OpenAPI generation so that the security scheme is present both
 # when the server serves /openapi.json and in the committed docs/openapi.json.
@@ -131,6 +282,24 @@ auth = AuthX(config)
 auth.handle_errors(app)
 
 
+async def _is_admin_request(scope) -> bool:
+    try:
+        token = await auth.get_access_token_from_request(Request(scope))
+        payload = auth.verify_token(token, verify_csrf=False)
+    except authx_exceptions.AuthXException:
+        return False
+    return int(payload.sub) in ADMIN_USER_IDS
+
+
+app.add_middleware(
+    ProfilingMiddleware,
+    authorize=_is_admin_request,
+    directory=PROFILE_DIR,
+    retention=PROFILE_RETENTION,
+    interval_seconds=PROFILE_SAMPLE_INTERVAL_MS / 1000,
+)
+
+
 @app.exception_handler(authx_exceptions.JWTDecodeError)
 async def jwt_decode_error_handler(request: Request, exc: authx_exceptions.JWTDecodeError) -> JSONResponse:
     logger.error(
@@ -141,14 +310,6 @@ async def jwt_decode_error_handler(request: Request, exc: authx_exceptions.JWTDe
         request.url.query,
         getattr(request.client, "host", None),
     )
-    logging.getLogger("uvicorn.error").error(
-        "auth failure (invalid/expired token): %s | method=%s path=%s query=%s client=%s",
-        exc,
-        request.method,
-        request.url.path,
-        request.url.query,
-        getattr(request.client, "host", None),
-    )
     # Return 401 (correct semantics for bad/expired credentials) instead of authx's 422.
     # Preserves the payload shape so clients see error_type/message.
     return JSONResponse(
@@ -166,13 +327,6 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         getattr(request.client, "host", None),
         exc.errors(),
     )
-    logging.getLogger("uvicorn.error").error(
-        "request validation error: path=%s query=%s client=%s errors=%s",
-        request.url.path,
-        request.url.query,
-        getattr(request.client, "host", None),
-        exc.errors(),
-    )
     return await request_validation_exception_handler(request, exc)
 
 
@@ -182,34 +336,144 @@ async def not_found_handler(request: Request, exc: NotFoundException) -> JSONRes
     return JSONResponse(status_code=404, content={"detail": str(exc)})
 
 
+@app.exception_handler(OverloadedException)
+async def overloaded_handler(request: Request, exc: OverloadedException) -> JSONResponse:
+    logger.warning("shedding load: %s | method=%s path=%s", exc, request.method, request.url.path)
+    return JSONResponse(status_code=503, content={"detail": "Service is overloaded, retry later"},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception) -> JSONResponse:
     logger.exception("unhandled exception: method=%s path=%s", request.method, request.url.path)
     return JSONResponse(status_code=500, content={"detail": "Internal server error"})
 
 
+IDEMPOTENCY_KEY_HEADER = Header(
+    default=None, alias="Idempotency-Key",
+    description="Уникальный ключ запроса: повтор с тем же ключом вернёт сохранённый ответ, а не создаст дубликат.",
+)
+
+
+async def _idempotent(user_id: int, key: str, operation: str, request: BaseModel, produce) -> Response:
+    stored, replayed = await run_idempotent(user_id, key, request_hash(operation, request), produce)
+    return Response(stored.body, status_code=stored.status_code, media_type="application/json",
+                    headers={"Idempotent-Replayed": "true"} if replayed else None)
+
+
+FIELDS_QUERY = Query(description="Поля элементов списка через запятую, например id,amount_rubles,created_at. "
+                                  "Итоги в рублях возвращаются, только если выбрано amount_rubles")
+
+
+def _parse_fields(fields: str | None, model: type[BaseModel]) -> set[str] | None:
+    """Field names of ``model`` listed in a ``fields`` parameter, None for all of them."""
+    if fields is None:
+        return None
+    selected = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = selected - model.model_fields.keys()
+    if not selected or unknown:
+        raise HTTPException(status_code=400,
+                            detail=f"fields must be a comma-separated subset of {', '.join(model.model_fields)}")
+    return selected
+
+
+def _sparse_response(content: dict, response: Response) -> Response:
+    # Rows lack fields of the response model, so skip its validation by returning
+    # a response; that also skips headers set on the injected one, like the ETag.
+    sparse = FastJSONResponse(content)
+    sparse.headers.raw.extend(response.headers.raw)
+    return sparse
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # Weak comparison: compressed variants carry a weakened copy of the tag.
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+async def data_version_etag(
+        request: Request,
+        response: Response,
+        payload: TokenPayload = Depends(auth.access_token_required),
+) -> TokenPayload:
+    """Access-token dependency for user-data list endpoints.
+
+    Tags the response with a weak ETag built from the user's data version and
+    short-circuits with 304 when the client already holds that version, before
+    any of the endpoint's queries run.
+    """
+    _conditional_get(request, response, f'W/"{await get_data_version(int(payload.sub))}"')
+    return payload
+
+
+async def data_version_rates_etag(
+        request: Request,
+        response: Response,
+        payload: TokenPayload = Depends(auth.access_token_required),
+) -> TokenPayload:
+    """``data_version_etag`` for responses with amounts converted to rubles at live rates."""
+    version = await get_data_version(int(payload.sub))
+    _conditional_get(request, response, f'W/"{version}-{await exchange_rates_version()}"')
+    return payload
+
+
+def _conditional_get(request: Request, response: Response, etag: str) -> None:
+    if _etag_matches(request, etag):
+        raise HTTPException(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
+async def admin_required(payload: TokenPayload = Depends(auth.access_token_required)) -> TokenPayload:
+    if int(payload.sub) not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return payload
+
+
+@app.get(
+    "/api/metrics",
+    tags=["other"],
+    operation_id="getMetrics",
+    summary="Метрики сервера в формате Prometheus (только для администраторов)",
+    response_class=PlainTextResponse,
+)
+async def metrics_endpoint(payload: TokenPayload = Depends(admin_required)) -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get(
     "/api/transactions",
     tags=["transactions"],
     operation_id="listTransactions",
     summary="Получить транзакции за период",
+    response_model=TransactionsResponse,
 )
 async def get_user_transactions(
         date_from: Annotated[date, Query(title="начальная дата", description="Начальная дата в формате yyyy-MM-dd")],
         date_to: Annotated[date, Query(title="конечная дата", description="Конечная дата в формате yyyy-MM-dd")],
-        payload: TokenPayload = Depends(auth.access_token_required)
+        response: Response,
+        account_id: Annotated[int | None, Query(description="Только транзакции этого счёта")] = None,
+        category_id: Annotated[int | None, Query(description="Только транзакции этой категории")] = None,
+        type: Annotated[Literal['income', 'expense'] | None, Query(description="Только доходы или только расходы")] = None,
+        tag: Annotated[list[str] | None, Query(description="Тег транзакции, можно указать несколько: нужны все")] = None,
+        min_amount: Annotated[float | None, Query(description="Минимальная сумма в валюте счёта")] = None,
+        max_amount: Annotated[float | None, Query(description="Максимальная сумма в валюте счёта")] = None,
+        description_contains: Annotated[str | None, Query(description="Подстрока описания без учёта регистра")] = None,
+        fields: Annotated[str | None, FIELDS_QUERY] = None,
+        payload: TokenPayload = Depends(data_version_etag)
 ) -> \
-        TransactionsResponse:
-    user_id = int(payload.sub)
-    transactions = await get_transactions_for_period(user_id, date_from, date_to)
-    tags_by_transaction_id = await get_transaction_tags_by_transaction_ids(
-        user_id,
-        [transaction.id for transaction in transactions],
-    )
-    converted_transactions = [convert_transaction_to_dto(tx, tags_by_transaction_id.get(tx.id, [])) for tx in transactions]
-    return TransactionsResponse(transactions=converted_transactions, total_amount_rubles=sum([
-        amount.amount_rubles for amount in converted_transactions if amount.amount_rubles is not None
-    ]))
+        TransactionsResponse | Response:
+    filters = TransactionFilter(account_id=account_id, category_id=category_id, type=type, tags=tuple(tag or ()),
+                                min_amount=min_amount, max_amount=max_amount,
+                                description_contains=description_contains)
+    selected = _parse_fields(fields, Transaction)
+    if selected is None:
+        return await build_transactions_response(int(payload.sub), date_from, date_to, filters)
+    content = await build_sparse_transactions_response(int(payload.sub), date_from, date_to, filters, selected)
+    return _sparse_response(content, response)
 
 @app.get(
     "/api/transactions/{transaction_id}",
@@ -234,17 +498,27 @@ async def get_transaction(
 )
 async def create_transaction_endpoint(
         transaction_create: TransactionCreateRequest,
-        payload: TokenPayload = Depends(auth.access_token_required)
+        payload: TokenPayload = Depends(auth.access_token_required),
+        idempotency_key: str | None = IDEMPOTENCY_KEY_HEADER,
 ) -> Transaction:
     user_id = int(payload.sub)
+    if idempotency_key is not None:
+        return await _idempotent(user_id, idempotency_key, "createTransaction", transaction_create,
+                                 lambda: _create_transaction(user_id, transaction_create))
+    return await _create_transaction(user_id, transaction_create)
+
+
+async def _create_transaction(user_id: int, transaction_create: TransactionCreateRequest) -> Transaction:
     account = await get_active_account_by_id(user_id, transaction_create.account_id)
     if account is None:
         raise HTTPException(status_code=400, detail="account not found or deleted")
     category = await get_category_by_id(user_id, transaction_create.category_id)
     transaction = convert_transaction_create_to_model(user_id, transaction_create, account, category,
                                                       await get_currency_exchange_rate(account.currency_code))
-    transaction = await save_transaction(transaction)
-    tags = await set_transaction_tags(user_id, transaction.id, transaction_create.tags)
+    tags = await create_transaction(
+        transaction, transaction_create.tags,
+        on_created=lambda created, created_tags: store_response(convert_transaction_to_dto(created, created_tags)),
+    )
     return convert_transaction_to_dto(transaction, tags)
 
 @app.put(
@@ -284,9 +558,9 @@ async def update_transaction_endpoint(
     summary="Получить список тегов пользователя",
 )
 async def get_user_tags_endpoint(
-        payload: TokenPayload = Depends(auth.access_token_required)
+        payload: TokenPayload = Depends(data_version_etag)
 ) -> UserTagsResponse:
-    return UserTagsResponse(tags=await get_user_tags(int(payload.sub)))
+    return await build_tags_response(int(payload.sub))
 
 @app.delete(
     "/api/transactions/{transaction_id}",
@@ -302,6 +576,69 @@ async def delete_transaction_endpoint(
 
 
 
+@app.get(
+    "/api/sync",
+    tags=["sync"],
+    operation_id="syncChanges",
+    summary="Получить изменения после курсора",
+)
+async def sync_endpoint(
+        since: Annotated[int, Query(ge=0, description="Курсор из предыдущего ответа, 0 для первой синхронизации")] = 0,
+        limit: Annotated[int, Query(ge=1, le=SYNC_PAGE_MAX, description="Максимум изменений на страницу")] = 500,
+        payload: TokenPayload = Depends(auth.access_token_required)
+) -> SyncResponse:
+    page = await get_changes_since(int(payload.sub), since, limit)
+    return SyncResponse(
+        cursor=page.cursor,
+        has_more=page.has_more,
+        transactions=[convert_transaction_to_dto(tx, page.transaction_tags.get(tx.id, [])) for tx in page.transactions],
+        accounts=[await convert_account_with_balance_to_dto(acc, balance) for acc, balance in page.accounts],
+        categories=[convert_category_to_dto(category) for category in page.categories],
+        tags=page.tags,
+        deleted=DeletedEntities(
+            transactions=page.deleted['transaction'],
+            accounts=page.deleted['account'],
+            categories=page.deleted['category'],
+        ),
+    )
+
+
+async def _event_stream(subscription: Subscription):
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if event is None:
+                # Dropped as a slow consumer: the client should reconnect and catch up via /api/sync.
+                yield "event: dropped\ndata: {}\n\n"
+                return
+            yield f"id: {event['cursor']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        events.unsubscribe(subscription)
+
+
+@app.get(
+    "/api/events",
+    tags=["sync"],
+    operation_id="streamEvents",
+    summary="Поток изменений пользователя (Server-Sent Events)",
+    response_class=StreamingResponse,
+)
+async def events_endpoint(
+        payload: TokenPayload = Depends(auth.access_token_required)
+) -> StreamingResponse:
+    subscription = events.subscribe(int(payload.sub))
+    return StreamingResponse(
+        _event_stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 def _issue_token_pair(user_id: int) -> tuple[str, str]:
     uid = str(user_id)
     return auth.create_access_token(uid=uid), auth.create_refresh_token(uid=uid)
@@ -392,8 +729,7 @@ async def logout_endpoint(response: Response) -> LogoutResponse:
 async def me_endpoint(
         payload: TokenPayload = Depends(auth.access_token_required)
 ) -> MeResponse:
-    user = await get_user_by_id(int(payload.sub))
-    return MeResponse(id=user.id, username=user.username, telegram_id=user.telegram_id)
+    return await build_me_response(int(payload.sub))
 
 
 @app.put(
@@ -421,18 +757,17 @@ async def change_password_endpoint(
     tags=["accounts"],
     operation_id="listAccounts",
     summary="Получить все счета с балансами",
+    response_model=AccountsResponse,
 )
 async def get_user_accounts(
-        payload: TokenPayload = Depends(auth.access_token_required)
-) -> AccountsResponse:
-    accounts = await get_user_accounts_with_balance(int(payload.sub))
-    account_map = {acc.id: (await convert_account_with_balance_to_dto(acc, am)) for acc, am in accounts}
-    return AccountsResponse(
-        accounts=account_map,
-        total=len(accounts),
-        total_amount_rubles=sum(
-            [account.amount_rubles for account in account_map.values() if account.amount_rubles is not None])
-    )
+        response: Response,
+        fields: Annotated[str | None, FIELDS_QUERY] = None,
+        payload: TokenPayload = Depends(data_version_rates_etag)
+) -> AccountsResponse | Response:
+    selected = _parse_fields(fields, AccountDto)
+    if selected is None:
+        return await build_accounts_response(int(payload.sub))
+    return _sparse_response(await build_sparse_accounts_response(int(payload.sub), selected), response)
 
 @app.get(
     "/api/accounts/account/{account_id}",
@@ -488,23 +823,125 @@ async def delete_account_endpoint(
 )
 async def create_account_endpoint(
         create_request: AccountCreateRequest,
-        payload: TokenPayload = Depends(auth.access_token_required)
+        payload: TokenPayload = Depends(auth.access_token_required),
+        idempotency_key: str | None = IDEMPOTENCY_KEY_HEADER,
 ) -> AccountDto:
-    account = await create_account(int(payload.sub), create_request.name, create_request.amount, create_request.currency_code)
-    return await convert_account_with_balance_to_dto(account, create_request.amount)
+    user_id = int(payload.sub)
+    if idempotency_key is not None:
+        return await _idempotent(user_id, idempotency_key, "createAccount", create_request,
+                                 lambda: _create_account(user_id, create_request))
+    return await _create_account(user_id, create_request)
+
+
+async def _create_account(user_id: int, create_request: AccountCreateRequest) -> AccountDto:
+    rate = await get_currency_exchange_rate(create_request.currency_code)
+
+    def to_dto(account: Account) -> AccountDto:
+        # A new account's balance is its initial amount.
+        return AccountDto(id=account.id, user_id=user_id, name=account.name, amount=create_request.amount,
+                          amount_rubles=create_request.amount * rate, currency_code=account.currency_code)
+
+    account = await create_account(user_id, create_request.name, create_request.amount, create_request.currency_code,
+                                   on_created=lambda created: store_response(to_dto(created)))
+    return to_dto(account)
+
+async def _bootstrap_versions(user_id: int) -> BootstrapVersions:
+    versions = await get_entity_versions(user_id)
+    return BootstrapVersions(
+        # balances move with transactions, transaction rows embed account and category names
+        accounts=max(versions['account'], versions['transaction']),
+        categories=versions['category'],
+        tags=versions['tag'],
+        transactions=max(versions['transaction'], versions['account'], versions['category']),
+        currency_codes=currency_codes_payload()[1],
+    )
+
+
+async def _skipped_section():
+    return None
+
+
+@app.get(
+    "/api/bootstrap",
+    tags=["other"],
+    operation_id="bootstrap",
+    summary="Получить все стартовые данные одним запросом",
+    description="Профиль, счета, категории, теги, коды валют и транзакции за период (по умолчанию текущий месяц). "
+                "Секции, для которых передан `*_since`, равный текущей версии из `versions`, возвращаются как null. "
+                "При смене периода не передавайте `transactions_since`.",
+)
+async def bootstrap_endpoint(
+        request: Request,
+        response: Response,
+        date_from: Annotated[date | None, Query(description="Начальная дата в формате yyyy-MM-dd")] = None,
+        date_to: Annotated[date | None, Query(description="Конечная дата в формате yyyy-MM-dd")] = None,
+        accounts_since: Annotated[int | None, Query()] = None,
+        categories_since: Annotated[int | None, Query()] = None,
+        tags_since: Annotated[int | None, Query()] = None,
+        transactions_since: Annotated[int | None, Query()] = None,
+        currency_codes_since: Annotated[str | None, Query()] = None,
+        payload: TokenPayload = Depends(auth.access_token_required)
+) -> BootstrapResponse:
+    user_id = int(payload.sub)
+    if date_from is None or date_to is None:
+        today = datetime.now(UTC).date()
+        date_from = today.replace(day=1)
+        date_to = today.replace(day=calendar.monthrange(today.year, today.month)[1])
+    # The default period moves with the calendar and account balances with the
+    # rates, so the same URL and data version do not mean the same response.
+    version = await get_data_version(user_id)
+    _conditional_get(request, response, f'W/"{version}-{date_from:%Y%m%d}-{date_to:%Y%m%d}-'
+                                        f'{currency_codes_payload()[1]}-{await exchange_rates_version()}"')
+
+    versions = await _bootstrap_versions(user_id)
+
+    async def categories_section():
+        categories, created_defaults = await build_categories_response(user_id)
+        return categories, created_defaults
+
+    me, accounts, categories, tags, transactions = await asyncio.gather(
+        build_me_response(user_id),
+        build_accounts_response(user_id) if accounts_since != versions.accounts else _skipped_section(),
+        categories_section() if categories_since != versions.categories else _skipped_section(),
+        build_tags_response(user_id) if tags_since != versions.tags else _skipped_section(),
+        build_transactions_response(user_id, date_from, date_to)
+        if transactions_since != versions.transactions else _skipped_section(),
+    )
+    if categories is not None:
+        categories, created_defaults = categories
+        if created_defaults:
+            versions = await _bootstrap_versions(user_id)
+    return BootstrapResponse(
+        versions=versions,
+        me=me,
+        accounts=accounts,
+        categories=categories,
+        tags=tags,
+        currency_codes=build_currency_codes() if currency_codes_since != versions.currency_codes else None,
+        transactions=transactions,
+    )
+
 
 @app.get(
     "/api/currency/codes",
     tags=["other"],
     operation_id="listCurrencyCodes",
     summary="Получить поддерживаемые коды валют",
+    response_model=CurrencyCodes,
 )
-async def get_currency_codes() -> CurrencyCodes:
-    return CurrencyCodes(
-        codes={code.get("CharCode"): CurrencyCode(
-            num_code=int(code.get("NumCode", None)) if code.get("NumCode", None) is not None else None,
-            char_code=code.get("CharCode")) for code in CODES.values()}
-    )
+async def get_currency_codes(request: Request) -> Response:
+    body, version = currency_codes_payload()
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400", "Vary": "Accept-Encoding"}
+    compressed = COMPRESSION_MIN_BYTES > 0 and accepts_gzip(request.scope)
+    if compressed:
+        headers["ETag"] = f"W/{etag}"
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if compressed:
+        return Response(currency_codes_gzip(), media_type="application/json",
+                        headers={**headers, "Content-Encoding": "gzip"})
+    return Response(body, media_type="application/json", headers=headers)
 
 @app.get(
     "/api/categories",
@@ -513,16 +950,13 @@ async def get_currency_codes() -> CurrencyCodes:
     summary="Получить категории пользователя",
 )
 async def get_user_categories_endpoint(
-        payload: TokenPayload = Depends(auth.access_token_required)
+        response: Response,
+        payload: TokenPayload = Depends(data_version_etag)
 ) -> CategoriesResponse:
-    income, expense = await get_user_categories(int(payload.sub))
-    if not income or not expense:
-        await create_default_categories(int(payload.sub))
-        income, expense = await get_user_categories(int(payload.sub))
-    categories = {category.id : convert_category_to_dto(category) for category in income + expense}
-    return CategoriesResponse(
-        categories=categories
-    )
+    categories, created_defaults = await build_categories_response(int(payload.sub))
+    if created_defaults:
+        response.headers["ETag"] = f'W/"{await get_data_version(int(payload.sub))}"'
+    return categories
 
 @app.get(
     "/api/categories/{category_id}",
@@ -579,6 +1013,132 @@ async def delete_category_endpoint(
 ):
     await delete_category_by_id_and_user_id(int(payload.sub), category_id)
 
+async def build_transactions_response(user_id: int, date_from: date, date_to: date,
+                                      filters: TransactionFilter | None = None) -> TransactionsResponse:
+    transactions = await get_transactions_for_period(user_id, date_from, date_to, filters)
+    tags_by_transaction_id = await get_transaction_tags_by_transaction_ids(
+        user_id,
+        [transaction.id for transaction in transactions],
+    )
+    converted_transactions = [convert_transaction_to_dto(tx, tags_by_transaction_id.get(tx.id, [])) for tx in transactions]
+    return TransactionsResponse(transactions=converted_transactions, total_amount_rubles=sum([
+        amount.amount_rubles for amount in converted_transactions if amount.amount_rubles is not None
+    ]))
+
+
+async def build_accounts_response(user_id: int) -> AccountsResponse:
+    accounts = await get_user_accounts_with_balance(user_id)
+    account_map = {acc.id: (await convert_account_with_balance_to_dto(acc, am)) for acc, am in accounts}
+    return AccountsResponse(
+        accounts=account_map,
+        total=len(accounts),
+        total_amount_rubles=sum(
+            [account.amount_rubles for account in account_map.values() if account.amount_rubles is not None])
+    )
+
+
+async def build_sparse_transactions_response(user_id: int, date_from: date, date_to: date,
+                                             filters: TransactionFilter | None, fields: set[str]) -> dict:
+    """``TransactionsResponse`` content with only ``fields`` in each transaction.
+
+    Relations and tags are loaded only when a selected field needs them, and
+    the total only when ``amount_rubles`` is selected.
+    """
+    related = ([Account] if fields & _ACCOUNT_FIELDS else []) + ([Category] if fields & _CATEGORY_FIELDS else [])
+    transactions = await get_transactions_for_period(user_id, date_from, date_to, filters, related)
+    tags_by_transaction_id = {}
+    if "tags" in fields:
+        tags_by_transaction_id = await get_transaction_tags_by_transaction_ids(
+            user_id,
+            [transaction.id for transaction in transactions],
+        )
+    getters = [(name, _TRANSACTION_FIELDS[name]) for name in Transaction.model_fields if name in fields]
+    rows = [{name: get(tx, tags_by_transaction_id.get(tx.id, [])) for name, get in getters} for tx in transactions]
+    content = {"transactions": rows}
+    if "amount_rubles" in fields:
+        content["total_amount_rubles"] = sum(
+            row["amount_rubles"] for row in rows if row["amount_rubles"] is not None
+        )
+    return content
+
+
+async def build_sparse_accounts_response(user_id: int, fields: set[str]) -> dict:
+    """``AccountsResponse`` content with only ``fields`` in each account.
+
+    Balances are computed only when ``amount`` or ``amount_rubles`` is
+    selected, and the total only with ``amount_rubles``.
+    """
+    if fields & {"amount", "amount_rubles"}:
+        accounts = await get_user_accounts_with_balance(user_id)
+    else:
+        accounts = [(account, None) for account in await list_user_accounts(user_id)]
+    names = [name for name in AccountDto.model_fields if name in fields]
+    account_map = {}
+    for account, balance in accounts:
+        row = {}
+        for name in names:
+            if name == "amount":
+                row[name] = balance
+            elif name == "amount_rubles":
+                row[name] = await convert_to_rubles(balance, account.currency_code)
+            else:
+                row[name] = getattr(account, name)
+        account_map[account.id] = row
+    content = {"accounts": account_map, "total": len(accounts)}
+    if "amount_rubles" in fields:
+        content["total_amount_rubles"] = sum(
+            row["amount_rubles"] for row in account_map.values() if row["amount_rubles"] is not None
+        )
+    return content
+
+
+async def build_categories_response(user_id: int) -> tuple[CategoriesResponse, bool]:
+    """Categories of the user, creating the defaults on first use.
+
+    The flag tells whether defaults were just created, i.e. the user's data
+    version moved while the response was being built.
+    """
+    created_defaults = False
+    income, expense = await get_user_categories(user_id)
+    if not income or not expense:
+        await create_default_categories(user_id)
+        income, expense = await get_user_categories(user_id)
+        created_defaults = True
+    categories = {category.id : convert_category_to_dto(category) for category in income + expense}
+    return CategoriesResponse(categories=categories), created_defaults
+
+
+async def build_tags_response(user_id: int) -> UserTagsResponse:
+    return UserTagsResponse(tags=await get_user_tags(user_id))
+
+
+async def build_me_response(user_id: int) -> MeResponse:
+    user = await get_user_by_id(user_id)
+    return MeResponse(id=user.id, username=user.username, telegram_id=user.telegram_id)
+
+
+@functools.cache
+def build_currency_codes() -> CurrencyCodes:
+    return CurrencyCodes(
+        codes={code.get("CharCode"): CurrencyCode(
+            num_code=int(code.get("NumCode", None)) if code.get("NumCode", None) is not None else None,
+            char_code=code.get("CharCode")) for code in CODES.values()}
+    )
+
+
+@functools.cache
+def currency_codes_payload() -> tuple[bytes, str]:
+    """Encoded /api/currency/codes body and its content hash, built once per process."""
+    body = build_currency_codes().model_dump_json().encode("utf-8")
+    return body, hashlib.sha256(body).hexdigest()[:32]
+
+
+@functools.cache
+def currency_codes_gzip() -> bytes:
+    """Gzipped /api/currency/codes body, compressed once at the highest level."""
+    return gzip.compress(currency_codes_payload()[0], 9, mtime=0)
+
+
 async def convert_account_with_balance_to_dto(account: Account, balance: float):
     return AccountDto(
         id=account.id,
@@ -590,14 +1150,17 @@ async def convert_account_with_balance_to_dto(account: Account, balance: float):
     )
 
 
-def convert_transaction_to_dto(transaction: ModelTransaction, tags: list[str] | None = None) -> Transaction:
+def _account_display_name(account: Account) -> str:
     # TODO: suffix is a temporary UI marker; replace with a dedicated `is_deleted` field on the DTO when Flutter supports it.
-    name: str = transaction.account.name
-    if transaction.account.is_deleted:
-        name = f"{name} (удалён)"
+    if account.is_deleted:
+        return f"{account.name} (удалён)"
+    return account.name
+
+
+def convert_transaction_to_dto(transaction: ModelTransaction, tags: list[str] | None = None) -> Transaction:
     return Transaction(
         id=transaction.id,
-        account=name,
+        account=_account_display_name(transaction.account),
         account_id=transaction.account.id,
         type=transaction.category.type,
         category=transaction.category.name,
@@ -610,6 +1173,27 @@ def convert_transaction_to_dto(transaction: ModelTransaction, tags: list[str] |
         created_at=transaction.created_at
     )
 
+# Sparse fieldsets: each Transaction field from a transaction row and its tags.
+# account_id and category_id are the row's own columns; the other account and
+# category fields need those relations prefetched.
+_TRANSACTION_FIELDS = {
+    "id": lambda transaction, tags: transaction.id,
+    "account": lambda transaction, tags: _account_display_name(transaction.account),
+    "account_id": lambda transaction, tags: transaction.account_id,
+    "type": lambda transaction, tags: transaction.category.type,
+    "category": lambda transaction, tags: transaction.category.name,
+    "category_id": lambda transaction, tags: transaction.category_id,
+    "amount": lambda transaction, tags: transaction.amount,
+    "amount_rubles": lambda transaction, tags: transaction.amount * transaction.exchange_rate,
+    "description": lambda transaction, tags: transaction.description,
+    "tags": lambda transaction, tags: tags,
+    "currency_code": lambda transaction, tags: transaction.account.currency_code,
+    "created_at": lambda transaction, tags: transaction.created_at,
+}
+_ACCOUNT_FIELDS = {"account", "currency_code"}
+_CATEGORY_FIELDS = {"type", "category"}
+
+
 def convert_category_to_dto(category: Category) -> CategoryDto:
     return CategoryDto(
         id=category.id,
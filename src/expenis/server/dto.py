@@ -3,7 +3,7 @@ from typing import Literal
 
 from pydantic import BaseModel, field_validator
 
-from src.expenis.core.utils.currency_codes import CODES
+from src.expenis.core.utils.currency_codes import CHAR_CODES
 
 
 class Transaction(BaseModel):
@@ -70,7 +70,7 @@ class AccountCreateRequest(BaseModel):
     @field_validator("currency_code")
     @classmethod
     def name_must_contain_space(cls, v: str) -> str:
-        if v not in CODES:
+        if v not in CHAR_CODES:
             raise ValueError("Unknown currency code")
         return v
 
@@ -98,6 +98,22 @@ class CategoryCreateRequest(BaseModel):
     name: str
 
 
+class DeletedEntities(BaseModel):
+    transactions: list[int]
+    accounts: list[int]
+    categories: list[int]
+
+
+class SyncResponse(BaseModel):
+    cursor: int
+    has_more: bool
+    transactions: list[Transaction]
+    accounts: list[AccountDto]
+    categories: list[CategoryDto]
+    tags: list[str]
+    deleted: DeletedEntities
+
+
 class LoginRequest(BaseModel):
     username: str
     password: str
@@ -171,3 +187,22 @@ class MeResponse(BaseModel):
     id: int
     username: str | None
     telegram_id: int | None
+
+
+class BootstrapVersions(BaseModel):
+    accounts: int
+    categories: int
+    tags: int
+    transactions: int
+    currency_codes: str
+
+
+class BootstrapResponse(BaseModel):
+    """Sections the client already has at the requested version are null."""
+    versions: BootstrapVersions
+    me: MeResponse
+    accounts: AccountsResponse | None
+    categories: CategoriesResponse | None
+    tags: UserTagsResponse | None
+    currency_codes: CurrencyCodes | None
+    transactions: TransactionsResponse | None
@@ -0,0 +1,284 @@
+import asyncio
+import gzip
+import logging
+import re
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..core.metrics import registry
+from ..core.profiling import RequestProfile
+from ..core.sql_stats import track_queries
+from ..core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+HTTP_REQUEST_SECONDS = registry.histogram("http_request_duration_seconds", "HTTP request latency by route template",
+                                          ("method", "route"))
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP requests by route template and status",
+                                 ("method", "route", "status"))
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being served", ("method",))
+HTTP_COMPRESSION_BYTES = registry.counter("http_compression_bytes_total",
+                                          "Response body bytes before and after gzip", ("stage",))
+
+
+def route_template(scope: Scope) -> str:
+    """Path template of the matched route, e.g. ``/api/transactions/{transaction_id}``.
+
+    Raw paths would give every id its own series. Requests that matched no
+    route share a single label.
+    """
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, cheaper than ``BaseHTTPMiddleware`` and safe for streaming responses.
+
+    The router stores the matched route in the shared scope, so the template
+    is known once the inner app returns.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status))
+            HTTP_IN_FLIGHT.dec(method)
+
+
+class SqlStatsMiddleware:
+    """Attributes executed SQL to the request and optionally reports it in ``Server-Timing``.
+
+    The header is written when the response starts, so statements issued
+    while a streaming body is produced are not included in it.
+    """
+
+    def __init__(self, app: ASGIApp, debug_headers: bool = False):
+        self.app = app
+        self.debug_headers = debug_headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries(f"{scope['method']} {scope['path']}") as stats:
+            if not self.debug_headers:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing",
+                                   f'db;dur={stats.seconds * 1000:.2f};desc="{stats.count} queries"')
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+
+_PROFILE_MODES = {"1": "sample", "sample": "sample", "cprofile": "cprofile"}
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9]+")
+
+
+def _requested_profile_mode(scope: Scope) -> str | None:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return _PROFILE_MODES.get(value.decode("latin-1").strip().lower())
+    query = scope.get("query_string", b"")
+    if b"profile=" in query:
+        values = parse_qs(query.decode("latin-1")).get("profile")
+        if values:
+            return _PROFILE_MODES.get(values[-1].lower())
+    return None
+
+
+class ProfilingMiddleware:
+    """Profiles a single request when an admin asks for it with ``X-Profile: 1``
+    (or ``?profile=1``; ``cprofile`` selects the deterministic profiler).
+
+    Requests without the flag only pay for the header scan. The profile file
+    name is returned in ``X-Profile-File``.
+    """
+
+    def __init__(self, app: ASGIApp, authorize: Callable[[Scope], Awaitable[bool]], directory: str,
+                 retention: int, interval_seconds: float):
+        self.app = app
+        self.authorize = authorize
+        self.directory = Path(directory)
+        self.retention = retention
+        self.interval_seconds = interval_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mode = _requested_profile_mode(scope)
+        if mode is None or not await self.authorize(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{scope['method']}{_UNSAFE_NAME.sub('_', scope['path'])}".rstrip("_")
+        profile = RequestProfile(self.directory, name, mode, self.interval_seconds)
+        response_start: Message | None = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_start
+            # Hold the response start until the profile is written so its name fits in a header.
+            if message["type"] == "http.response.start":
+                response_start = message
+                return
+            if response_start is not None:
+                path = profile.stop(self.retention)
+                MutableHeaders(scope=response_start).append("X-Profile-File", path.name)
+                logger.info("request profiled: %s %s -> %s", scope["method"], scope["path"], path)
+                await send(response_start)
+                response_start = None
+            await send(message)
+
+        profile.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profile.path is None:
+                profile.stop(self.retention)
+
+
+class TracingMiddleware:
+    """Opens the root span of each request and returns its id in ``X-Trace-Id``."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with tracer.span(f"{scope['method']} {scope['path']}") as span:
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    MutableHeaders(scope=message).append("X-Trace-Id", span.trace_id)
+                await send(message)
+
+            span.set_attribute("http.method", scope["method"])
+            span.set_attribute("http.target", scope["path"])
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                span.name = f"{scope['method']} {route_template(scope)}"
+
+
+_COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "application/xml", "text/")
+# Bodies this large are compressed off the event loop; zlib releases the GIL.
+_COMPRESS_IN_THREAD_BYTES = 256 * 1024
+
+
+def accepts_gzip(scope: Scope) -> bool:
+    """Whether ``Accept-Encoding`` allows gzip (``gzip;q=0`` and ``*;q=0`` do not)."""
+    for name, value in scope["headers"]:
+        if name != b"accept-encoding":
+            continue
+        for item in value.decode("latin-1").lower().split(","):
+            coding, _, params = item.strip().partition(";")
+            if coding.strip() in ("gzip", "*"):
+                q = params.strip().removeprefix("q=").strip()
+                try:
+                    return not q or float(q) > 0
+                except ValueError:
+                    return False
+    return False
+
+
+def _compressible(headers: MutableHeaders) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(_COMPRESSIBLE_TYPES) and not content_type.startswith("text/event-stream")
+
+
+class CompressionMiddleware:
+    """Gzips complete JSON and text responses of at least ``minimum_size`` bytes.
+
+    Only responses sent in one body message are compressed, streaming ones
+    (SSE, exports) pass through untouched, as do responses that already carry a
+    ``Content-Encoding``. Strong ETags are weakened on the compressed variant,
+    the same way nginx does it.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, level: int = 6):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.minimum_size <= 0 or not accepts_gzip(scope):
+            await self.app(scope, receive, send)
+            return
+
+        response_start: Message | None = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                if _compressible(MutableHeaders(scope=message)):
+                    response_start = message
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+
+            body = message.get("body", b"")
+            passthrough = True
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(response_start)
+                await send(message)
+                return
+
+            if len(body) >= _COMPRESS_IN_THREAD_BYTES:
+                compressed = await asyncio.to_thread(gzip.compress, body, self.level, mtime=0)
+            else:
+                compressed = gzip.compress(body, self.level, mtime=0)
+            HTTP_COMPRESSION_BYTES.inc("raw", amount=len(body))
+            HTTP_COMPRESSION_BYTES.inc("sent", amount=len(compressed))
+            headers = MutableHeaders(scope=response_start)
+            headers["Content-Encoding"] = "gzip"
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            await send(response_start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,64 @@
+"""uvicorn settings of the runtime profiles selected with ``--profile``."""
+import importlib.util
+import inspect
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from pydantic_core import to_json
+
+from ..config import SERVER_BACKLOG, SERVER_KEEP_ALIVE_SECONDS, SERVER_LIMIT_CONCURRENCY
+
+PROFILES = ("default", "production")
+
+# Newer FastAPI dumps response models straight to JSON bytes with pydantic-core,
+# as long as the default response class is left alone.
+NATIVE_JSON_RESPONSES = "dump_json" in inspect.signature(serialize_response).parameters
+
+
+class FastJSONResponse(JSONResponse):
+    """Encodes with pydantic-core's serializer instead of ``json.dumps``.
+
+    The app's default response class where FastAPI lacks the native path.
+    """
+
+    def render(self, content) -> bytes:
+        return to_json(content)
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def uvicorn_options(profile: str) -> dict:
+    """Options for ``uvicorn.run`` on top of host, port, workers and logging."""
+    if profile != "production":
+        return {}
+    return {
+        "loop": "uvloop" if _available("uvloop") else "asyncio",
+        "http": "httptools" if _available("httptools") else "h11",
+        "backlog": SERVER_BACKLOG,
+        "timeout_keep_alive": SERVER_KEEP_ALIVE_SECONDS,
+        "limit_concurrency": SERVER_LIMIT_CONCURRENCY or None,
+        # nginx already writes an access log, with upstream timings.
+        "access_log": False,
+    }
+
+
+def describe(profile: str, options: dict) -> str:
+    """One line with the settings uvicorn ends up using, defaults resolved."""
+    loop = options.get("loop", "auto")
+    http = options.get("http", "auto")
+    effective = {
+        "profile": profile,
+        "workers": options.get("workers", 1),
+        "reload": options.get("reload", False),
+        # What uvicorn's "auto" picks.
+        "loop": ("uvloop" if _available("uvloop") else "asyncio") if loop == "auto" else loop,
+        "http": ("httptools" if _available("httptools") else "h11") if http == "auto" else http,
+        "backlog": options.get("backlog", 2048),
+        "keep_alive_s": options.get("timeout_keep_alive", 5),
+        "limit_concurrency": options.get("limit_concurrency"),
+        "access_log": options.get("access_log", True),
+        "json": "fastapi-native" if NATIVE_JSON_RESPONSES else "FastJSONResponse",
+    }
+    return " ".join(f"{name}={value}" for name, value in effective.items())
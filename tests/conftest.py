@@ -1,15 +1,17 @@
 import pytest
 
 from src.expenis.core.models import (
-    Account, Category, Session, Tag, Transaction, TransactionTag, User, db,
+    Account, Category, Change, DataVersion, IdempotencyKey, Session, Tag, Transaction, TransactionTag, User, db,
 )
+from src.expenis.core.service.data_version_service import reset_data_version_cache
+from src.expenis.core.service.idempotency_service import reset_idempotency_cache
 
 
 @pytest.fixture(autouse=True)
 async def run_before_each_test():
     async with db:
         await db.run(lambda: db.create_tables(
-            [User, Account, Category, Transaction, Session, Tag, TransactionTag],
+            [User, Account, Category, Transaction, Session, Tag, TransactionTag, DataVersion, Change, IdempotencyKey],
             safe=True,
         ))
         await db.run(TransactionTag.truncate_table)
@@ -19,5 +21,10 @@ async def run_before_each_test():
         await db.run(Category.truncate_table)
         await db.run(Session.truncate_table)
         await db.run(User.truncate_table)
+        await db.run(DataVersion.truncate_table)
+        await db.run(Change.truncate_table)
+        await db.run(IdempotencyKey.truncate_table)
+    reset_data_version_cache()
+    reset_idempotency_cache()
     yield
     await db.close_pool()
\ No newline at end of file
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from src.expenis.core.admission import DB_ADMISSION_REJECTED, Budget
+from src.expenis.core.errors import OverloadedException
+from src.expenis.core.models import User, db
+from src.expenis.server.application import overloaded_handler
+
+
+async def test_waiters_are_admitted_in_order_and_the_rest_rejected():
+    budget = Budget("read", concurrency=1, queue=2, timeout_seconds=5, retry_after=1)
+    admitted = []
+
+    async def operation(name):
+        await budget.acquire()
+        admitted.append(name)
+
+    await budget.acquire()
+    waiters = [asyncio.create_task(operation(name)) for name in ("a", "b")]
+    await asyncio.sleep(0)
+    assert budget.queued == 2
+
+    rejected = DB_ADMISSION_REJECTED.value("read", "queue_full")
+    with pytest.raises(OverloadedException):
+        await budget.acquire()
+    assert DB_ADMISSION_REJECTED.value("read", "queue_full") == rejected + 1
+
+    budget.release()
+    await asyncio.sleep(0)
+    assert admitted == ["a"]
+    budget.release()
+    await asyncio.gather(*waiters)
+    assert admitted == ["a", "b"]
+    assert (budget.in_flight, budget.queued) == (1, 0)
+
+
+async def test_waiting_past_the_timeout_is_rejected():
+    budget = Budget("write", concurrency=1, queue=10, timeout_seconds=0.05, retry_after=2)
+    await budget.acquire()
+
+    with pytest.raises(OverloadedException) as e:
+        await budget.acquire()
+
+    assert e.value.retry_after == 2
+    assert (budget.in_flight, budget.queued) == (1, 0)
+
+
+async def test_transaction_holds_the_write_slot(monkeypatch):
+    monkeypatch.setattr(db, "writes", Budget("write", concurrency=1, queue=0, timeout_seconds=5, retry_after=1))
+
+    async def other_writer():
+        async with db.atomic():
+            pass
+
+    async with db.atomic():
+        # Queries of the transaction itself are never held back.
+        assert await db.count(User.select()) == 0
+        with pytest.raises(OverloadedException) as e:
+            await asyncio.create_task(other_writer())
+        assert e.value.kind == "write"
+    assert db.writes.in_flight == 0
+    await asyncio.create_task(other_writer())
+
+
+async def test_task_holds_its_read_slot_until_it_finishes(monkeypatch):
+    monkeypatch.setattr(db, "reads", Budget("read", concurrency=1, queue=0, timeout_seconds=5, retry_after=1))
+    finish = asyncio.Event()
+
+    async def request():
+        await db.count(User.select())
+        await finish.wait()
+        # Admitted once: later queries of the task are never turned away.
+        return await db.count(User.select())
+
+    first = asyncio.create_task(request())
+    await asyncio.sleep(0.01)
+    assert (db.reads.in_flight, db.checked_out) == (1, 1)
+    with pytest.raises(OverloadedException):
+        await asyncio.create_task(db.count(User.select()))
+
+    finish.set()
+    assert await first == 0
+    # The finished task's connection goes back to the pool in a callback.
+    await asyncio.sleep(0.01)
+    assert (db.reads.in_flight, db.checked_out) == (0, 0)
+    assert await asyncio.create_task(db.count(User.select())) == 0
+
+
+async def test_overload_is_answered_with_503_and_retry_after():
+    request = Request({"type": "http", "method": "GET", "path": "/api/accounts", "query_string": b"",
+                       "headers": []})
+
+    response = await overloaded_handler(request, OverloadedException("read", 3))
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "3"
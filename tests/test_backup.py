@@ -0,0 +1,60 @@
+import gzip
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from src.expenis.core.backup import backup_database, latest_backup_time
+from src.expenis.core.models import db
+from src.expenis.core.seed import seed
+
+
+@pytest.mark.asyncio
+async def test_backup_is_compressed_verified_and_restorable(tmp_path):
+    async with db:
+        await seed(users=1, transactions_per_user=200, seed=1)
+
+    path = Path(backup_database(db.database, str(tmp_path), max_backups=5, max_mb_per_second=0))
+
+    manifest = json.loads(path.with_name(path.name.replace(".db.gz", ".json")).read_text())
+    raw = gzip.decompress(path.read_bytes())
+    assert manifest["file"] == path.name
+    assert manifest["quick_check"] == "ok"
+    assert manifest["raw_bytes"] == len(raw)
+    assert manifest["raw_sha256"] == hashlib.sha256(raw).hexdigest()
+    assert manifest["bytes"] < manifest["raw_bytes"]
+
+    restored = tmp_path / "restored.db"
+    restored.write_bytes(raw)
+    conn = sqlite3.connect(restored)
+    assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 200
+    conn.close()
+    assert latest_backup_time(str(tmp_path)) is not None
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_rotation_keeps_newest_backups_and_their_manifests(tmp_path):
+    for stamp in ("20240101_000000", "20240102_000000"):
+        (tmp_path / f"expenis_backup_{stamp}.db").write_bytes(b"old")
+    (tmp_path / "expenis_backup_20240103_000000.db.gz").write_bytes(b"old")
+    (tmp_path / "expenis_backup_20240103_000000.json").write_text("{}")
+
+    backup_database(db.database, str(tmp_path), max_backups=2, max_mb_per_second=0)
+
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert len([n for n in names if n.endswith((".db", ".db.gz"))]) == 2
+    assert "expenis_backup_20240103_000000.db.gz" in names
+    assert "expenis_backup_20240103_000000.json" in names
+    assert "expenis_backup_20240101_000000.db" not in names
+
+
+def test_unreadable_source_fails_and_leaves_no_partial_files(tmp_path):
+    source = tmp_path / "broken.db"
+    source.write_bytes(b"not a database" * 100)
+
+    with pytest.raises(RuntimeError, match="Database backup failed"):
+        backup_database(str(source), str(tmp_path / "backups"), max_mb_per_second=0)
+
+    assert list((tmp_path / "backups").iterdir()) == []
@@ -0,0 +1,89 @@
+import gzip
+import json
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.expenis.server.application import app, currency_codes_payload
+from src.expenis.server.middleware import CompressionMiddleware
+
+ROWS = [{"id": i, "account": "Наличные", "category": "Продукты", "amount": 100.5} for i in range(200)]
+
+
+async def rows(request):
+    return JSONResponse(ROWS, headers={"ETag": '"v1"'})
+
+
+async def small(request):
+    return JSONResponse({"ok": True})
+
+
+async def stream(request):
+    async def chunks():
+        for _ in range(3):
+            yield b"x" * 2048
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+async def encoded(request):
+    return Response(gzip.compress(json.dumps(ROWS).encode()), media_type="application/json",
+                    headers={"Content-Encoding": "gzip"})
+
+
+async def image(request):
+    return Response(b"\x89PNG" * 1024, media_type="image/png")
+
+
+client = TestClient(CompressionMiddleware(Starlette(routes=[
+    Route("/rows", rows), Route("/small", small), Route("/stream", stream), Route("/encoded", encoded),
+    Route("/image", image),
+]), minimum_size=1024))
+
+
+def test_large_json_is_gzipped_with_vary_and_a_weak_etag():
+    response = client.get("/rows", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert int(response.headers["content-length"]) < len(json.dumps(ROWS)) / 5
+    assert response.json() == ROWS
+
+
+def test_identity_when_not_accepted_or_below_threshold():
+    for accept in ("identity", "gzip;q=0", "br"):
+        response = client.get("/rows", headers={"Accept-Encoding": accept})
+        assert "content-encoding" not in response.headers
+        assert response.headers["etag"] == '"v1"'
+
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_streaming_encoded_and_binary_responses_pass_through():
+    streamed = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in streamed.headers
+    assert streamed.content == b"x" * 6144
+
+    encoded_response = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+    assert encoded_response.json() == ROWS
+
+    assert "content-encoding" not in client.get("/image", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_currency_codes_are_served_precompressed_and_revalidated():
+    api = TestClient(app)
+    body, version = currency_codes_payload()
+
+    response = api.get("/api/currency/codes", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == f'W/"{version}"'
+    assert response.content == body
+
+    revalidated = api.get("/api/currency/codes", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    plain = api.get("/api/currency/codes", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.content == body
@@ -0,0 +1,74 @@
+from datetime import date
+
+import pytest
+from authx import TokenPayload
+from fastapi import HTTPException, Response
+from starlette.requests import Request
+
+from src.expenis.core import cache
+from src.expenis.core.seed import SEED_EXCHANGE_RATES
+from src.expenis.core.service.exchage_rate_service import exchange_rates_version, get_course
+from src.expenis.core.service import register_user
+from src.expenis.server.application import bootstrap_endpoint, data_version_rates_etag
+
+
+def _request(if_none_match: str | None = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "query_string": b""})
+
+
+@pytest.fixture
+def rates():
+    cache.prime(get_course, SEED_EXCHANGE_RATES)
+    yield
+    cache.prime(get_course, SEED_EXCHANGE_RATES)
+
+
+async def test_rates_version_follows_refetches(rates):
+    before = await exchange_rates_version()
+    assert await exchange_rates_version() == before
+
+    cache.prime(get_course, {**SEED_EXCHANGE_RATES, "Timestamp": "later"})
+
+    assert await exchange_rates_version() != before
+
+
+async def test_new_rates_revalidate_ruble_responses(rates):
+    payload = TokenPayload(sub="1")
+    response = Response()
+    await data_version_rates_etag(_request(), response, payload)
+    etag = response.headers["etag"]
+
+    with pytest.raises(HTTPException) as e:
+        await data_version_rates_etag(_request(etag), Response(), payload)
+    assert e.value.status_code == 304
+
+    cache.prime(get_course, {**SEED_EXCHANGE_RATES, "Timestamp": "later"})
+    response = Response()
+    await data_version_rates_etag(_request(etag), response, payload)
+    assert response.headers["etag"] != etag
+
+
+async def _bootstrap(request: Request, response: Response, user_id: int, date_from: date | None = None,
+                     date_to: date | None = None):
+    return await bootstrap_endpoint(request, response, date_from, date_to, None, None, None, None, None,
+                                    TokenPayload(sub=str(user_id)))
+
+
+async def test_bootstrap_etag_covers_the_period(rates):
+    user = await register_user("alice", "secret1")
+    # The first bootstrap creates the default categories.
+    await _bootstrap(_request(), Response(), user.id)
+    response = Response()
+    await _bootstrap(_request(), response, user.id)
+    etag = response.headers["etag"]
+
+    with pytest.raises(HTTPException) as e:
+        await _bootstrap(_request(etag), Response(), user.id)
+    assert e.value.status_code == 304
+
+    # Another period, e.g. the default one once the month is over.
+    response = Response()
+    body = await _bootstrap(_request(etag), response, user.id, date(2020, 1, 1), date(2020, 1, 31))
+    assert body.transactions is not None
+    assert response.headers["etag"] != etag
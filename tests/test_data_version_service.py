@@ -0,0 +1,79 @@
+import pytest
+
+from src.expenis.core.models import Account, Category, DataVersion, Transaction, db
+from src.expenis.core.service import create_account, create_category, delete_account_by_id_and_user_id, \
+    delete_category_by_id_and_user_id, update_account
+from src.expenis.core.service.data_version_service import bump_data_version, get_data_version, \
+    reset_data_version_cache
+from src.expenis.core.service.transaction_service import delete_transaction_by_id_and_user_id, save_transaction, \
+    set_transaction_tags
+
+
+@pytest.mark.asyncio
+async def test_version_starts_at_zero():
+    async with db:
+        assert await get_data_version(1) == 0
+
+
+@pytest.mark.asyncio
+async def test_writes_bump_version_per_user():
+    async with db:
+        account = await create_account(user_id=1, name="cash", adjustment_amount=0.0)
+        after_create = await get_data_version(1)
+        assert after_create > 0
+        assert await get_data_version(2) == 0
+
+        await update_account(1, account, 100.0)
+        after_update = await get_data_version(1)
+        assert after_update > after_create
+
+        category = await create_category(1, "food", "expense")
+        after_category = await get_data_version(1)
+        assert after_category > after_update
+
+        transaction = Transaction(user_id=1, account=account, category=category, amount=5.0)
+        await save_transaction(transaction)
+        await set_transaction_tags(1, transaction.id, ["lunch"])
+        after_transaction = await get_data_version(1)
+        assert after_transaction > after_category
+
+        await delete_transaction_by_id_and_user_id(1, transaction.id)
+        await delete_category_by_id_and_user_id(1, category.id)
+        await delete_account_by_id_and_user_id(1, account.id)
+        assert await get_data_version(1) > after_transaction
+        assert await get_data_version(2) == 0
+
+
+@pytest.mark.asyncio
+async def test_version_is_persisted_and_survives_cache_reset():
+    async with db:
+        await create_account(user_id=1, name="cash", adjustment_amount=0.0)
+        cached = await get_data_version(1)
+
+        reset_data_version_cache()
+
+        assert await get_data_version(1) == cached
+        row = await db.run(lambda: DataVersion.get(DataVersion.user_id == 1))
+        assert row.version == cached
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_bump_is_not_visible():
+    async with db:
+        before = await get_data_version(1)
+        with pytest.raises(RuntimeError):
+            async with db.atomic():
+                await db.run(bump_data_version, 1)
+                raise RuntimeError("boom")
+
+        assert await get_data_version(1) == before
+        reset_data_version_cache()
+        assert await get_data_version(1) == before
+
+
+@pytest.mark.asyncio
+async def test_deleting_missing_rows_does_not_bump():
+    async with db:
+        await delete_transaction_by_id_and_user_id(1, 12345)
+        await delete_category_by_id_and_user_id(1, 12345)
+        assert await get_data_version(1) == 0
@@ -0,0 +1,80 @@
+import pytest
+
+from src.expenis.core import events
+from src.expenis.core.events import EventBus
+from src.expenis.core.models import db
+from src.expenis.core.service import create_category
+
+
+@pytest.mark.asyncio
+async def test_publish_reaches_only_that_users_subscribers():
+    bus = EventBus(queue_size=10)
+    alice = bus.subscribe(1)
+    bob = bus.subscribe(2)
+
+    bus.publish(1, {"type": "change", "cursor": 5})
+
+    assert alice.queue.get_nowait() == {"type": "change", "cursor": 5}
+    assert bob.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped_without_blocking_others():
+    bus = EventBus(queue_size=2)
+    slow = bus.subscribe(1)
+    fast = bus.subscribe(1)
+
+    for cursor in range(3):
+        bus.publish(1, {"type": "change", "cursor": cursor})
+        while not fast.queue.empty():
+            fast.queue.get_nowait()
+
+    assert slow.dropped
+    assert slow.queue.get_nowait() is None
+    assert not fast.dropped
+    assert bus.subscriber_count() == 1
+
+
+@pytest.mark.asyncio
+async def test_unsubscribe_removes_subscriber():
+    bus = EventBus()
+    subscription = bus.subscribe(1)
+    bus.unsubscribe(subscription)
+
+    bus.publish(1, {"type": "change", "cursor": 1})
+
+    assert subscription.queue.empty()
+    assert bus.subscriber_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_service_write_publishes_after_commit():
+    subscription = events.subscribe(1)
+    try:
+        async with db:
+            category = await create_category(1, "food", "expense")
+
+        event = subscription.queue.get_nowait()
+        assert event["type"] == "change"
+        assert event["entity"] == "category"
+        assert event["op"] == "upsert"
+        assert event["cursor"] > 0
+        assert category.id is not None
+    finally:
+        events.unsubscribe(subscription)
+
+
+@pytest.mark.asyncio
+async def test_fanout_poll_publishes_changes_from_other_writers():
+    bus = EventBus()
+    subscription = bus.subscribe(1)
+    async with db:
+        await create_category(1, "food", "expense")
+        last_seen = await bus._poll_changes(0)
+
+    assert last_seen > 0
+    assert subscription.queue.get_nowait()["cursor"] == last_seen
+
+    async with db:
+        assert await bus._poll_changes(last_seen) == last_seen
+    assert subscription.queue.empty()
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from src.expenis.core import group_commit
+from src.expenis.core.group_commit import GROUP_COMMIT_BATCH_SIZE, atomic_write, start_group_commit, \
+    stop_group_commit
+from src.expenis.core.models import Account, db
+from src.expenis.core.service import create_account
+from src.expenis.core.service.data_version_service import get_data_version, record_changes
+from src.expenis.core.sql_stats import track_queries
+
+
+@pytest.fixture
+async def committer():
+    start_group_commit(max_batch=64, max_delay_seconds=0.05, max_pending=1024)
+    yield
+    await stop_group_commit()
+
+
+async def test_concurrent_writes_share_one_commit(committer):
+    batches = GROUP_COMMIT_BATCH_SIZE.count()
+
+    accounts = await asyncio.gather(*(create_account(user_id=1, name=f"account {i}", adjustment_amount=i)
+                                      for i in range(20)))
+
+    assert GROUP_COMMIT_BATCH_SIZE.count() == batches + 1
+    assert len({account.id for account in accounts}) == 20
+    assert await db.count(Account.select()) == 20
+    assert await get_data_version(1) == 20
+
+
+async def test_failed_write_only_rolls_back_itself(committer):
+    def broken():
+        record_changes(2, 'account', [99])
+        Account.create(user_id=2, name="half done", adjustment_amount=0)
+        raise ValueError("validation failed late")
+
+    results = await asyncio.gather(create_account(user_id=1, name="cash", adjustment_amount=0),
+                                   atomic_write(broken), return_exceptions=True)
+
+    assert isinstance(results[1], ValueError)
+    assert [account.name for account in await db.list(Account.select())] == ["cash"]
+    # The rolled back version bump did not reach the cache either.
+    assert await get_data_version(2) == 0
+    assert await get_data_version(1) == 1
+
+
+async def test_stop_commits_pending_writes():
+    start_group_commit(max_batch=64, max_delay_seconds=10, max_pending=1024)
+    write = asyncio.create_task(create_account(user_id=1, name="cash", adjustment_amount=0))
+    await asyncio.sleep(0)
+
+    await stop_group_commit()
+
+    assert (await write).id is not None
+    assert group_commit._committer is None
+
+
+async def test_batched_statements_count_for_their_caller(committer):
+    async def request(name):
+        with track_queries(name) as stats:
+            await create_account(user_id=1, name=name, adjustment_amount=0)
+        return stats
+
+    first, second = await asyncio.gather(request("cash"), request("card"))
+
+    for stats in (first, second):
+        assert any(fingerprint.startswith('INSERT INTO "accounts"') for fingerprint in stats.by_fingerprint)
+        assert stats.count == first.count
+
+
+async def test_held_commit_callbacks_are_dropped_with_their_savepoint():
+    ran = []
+
+    def write():
+        db.after_commit(lambda: ran.append("outer"))
+        with pytest.raises(ValueError):
+            with db.holding_commit_callbacks() as held, db.atomic():
+                db.after_commit(lambda: ran.append("rolled back"))
+                raise ValueError("late validation")
+        assert len(held) == 1
+
+    async with db.atomic():
+        await db.run(write)
+
+    assert ran == ["outer"]
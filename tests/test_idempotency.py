@@ -0,0 +1,160 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from src.expenis.core import cache
+from src.expenis.core.models import Account, IdempotencyKey, db
+from src.expenis.core.seed import SEED_EXCHANGE_RATES
+from src.expenis.core.service import idempotency_service
+from src.expenis.core.service.exchage_rate_service import get_course
+from src.expenis.core.service.idempotency_service import delete_expired_idempotency_keys, request_hash, \
+    reset_idempotency_cache, run_idempotent
+from src.expenis.server.application import _create_account, _idempotent
+from src.expenis.server.dto import AccountCreateRequest
+
+
+class Created(BaseModel):
+    id: int
+
+
+class Request(BaseModel):
+    amount: float
+
+
+def producer(delay: float = 0):
+    calls = []
+
+    async def produce() -> Created:
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return Created(id=len(calls))
+
+    return produce, calls
+
+
+HASH = request_hash("createTransaction", Request(amount=5))
+
+
+async def test_repeat_gets_the_stored_response():
+    produce, calls = producer()
+
+    first, replayed_first = await run_idempotent(1, "key-1", HASH, produce)
+    second, replayed_second = await run_idempotent(1, "key-1", HASH, produce)
+    reset_idempotency_cache()
+    from_database, _ = await run_idempotent(1, "key-1", HASH, produce)
+
+    assert calls == [1]
+    assert (replayed_first, replayed_second) == (False, True)
+    assert first.body == second.body == from_database.body == b'{"id":1}'
+
+
+async def test_keys_belong_to_one_user():
+    produce, calls = producer()
+
+    await run_idempotent(1, "key-1", HASH, produce)
+    await run_idempotent(2, "key-1", HASH, produce)
+
+    assert len(calls) == 2
+
+
+async def test_concurrent_duplicates_run_once():
+    produce, calls = producer(delay=0.05)
+
+    results = await asyncio.gather(*(run_idempotent(1, "key-1", HASH, produce) for _ in range(3)))
+
+    assert calls == [1]
+    assert sorted(replayed for _, replayed in results) == [False, True, True]
+
+
+async def test_key_reused_for_another_request_is_rejected():
+    produce, _ = producer()
+    await run_idempotent(1, "key-1", HASH, produce)
+
+    with pytest.raises(HTTPException) as e:
+        await run_idempotent(1, "key-1", request_hash("createTransaction", Request(amount=6)), produce)
+
+    assert e.value.status_code == 422
+
+
+async def test_failed_request_releases_its_key():
+    async def fail() -> Created:
+        raise HTTPException(status_code=400, detail="account not found or deleted")
+
+    with pytest.raises(HTTPException):
+        await run_idempotent(1, "key-1", HASH, fail)
+    produce, calls = producer()
+    _, replayed = await run_idempotent(1, "key-1", HASH, produce)
+
+    assert calls == [1]
+    assert not replayed
+
+
+async def test_expired_keys_are_taken_over_and_collected():
+    old = datetime.now(UTC) - timedelta(days=2)
+    await db.run(lambda: IdempotencyKey.insert_many([
+        {"user_id": 1, "key": "key-1", "request_hash": HASH, "status_code": 200, "body": b'{"id":7}', "created_at": old},
+        {"user_id": 1, "key": "key-2", "request_hash": HASH, "status_code": 200, "body": b'{"id":8}', "created_at": old},
+    ]).execute())
+    produce, calls = producer()
+
+    stored, replayed = await run_idempotent(1, "key-1", HASH, produce)
+    assert (stored.body, replayed) == (b'{"id":1}', False)
+
+    assert await delete_expired_idempotency_keys() == 1
+    assert [row.key for row in await db.list(IdempotencyKey.select())] == ["key-1"]
+
+
+async def test_replays_are_marked_in_the_response():
+    produce, _ = producer()
+
+    first = await _idempotent(1, "key-1", "createTransaction", Request(amount=5), produce)
+    second = await _idempotent(1, "key-1", "createTransaction", Request(amount=5), produce)
+
+    assert first.body == second.body
+    assert "idempotent-replayed" not in first.headers
+    assert second.headers["idempotent-replayed"] == "true"
+
+
+async def test_response_commits_with_the_create(monkeypatch):
+    cache.prime(get_course, SEED_EXCHANGE_RATES)
+    create = AccountCreateRequest(name="Cash", amount=10.0, currency_code="RUB")
+
+    def fail(*args):
+        raise RuntimeError("database is locked")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(idempotency_service, "_complete", fail)
+        with pytest.raises(RuntimeError):
+            await _idempotent(1, "key-1", "createAccount", create, lambda: _create_account(1, create))
+    assert await db.run(Account.select().count) == 0
+
+    first = await _idempotent(1, "key-1", "createAccount", create, lambda: _create_account(1, create))
+    second = await _idempotent(1, "key-1", "createAccount", create, lambda: _create_account(1, create))
+
+    assert await db.run(Account.select().count) == 1
+    assert first.body == second.body
+    assert second.headers["idempotent-replayed"] == "true"
+
+
+async def test_committed_create_is_never_taken_over():
+    cache.prime(get_course, SEED_EXCHANGE_RATES)
+    create = AccountCreateRequest(name="Cash", amount=10.0, currency_code="RUB")
+
+    async def crash_after_commit():
+        await _create_account(1, create)
+        raise ConnectionError("client went away")
+
+    with pytest.raises(ConnectionError):
+        await _idempotent(1, "key-1", "createAccount", create, crash_after_commit)
+    # Long past the pending timeout, as if the process had died.
+    await db.run(lambda: IdempotencyKey.update(created_at=datetime.now(UTC) - timedelta(hours=1)).execute())
+    reset_idempotency_cache()
+
+    retry = await _idempotent(1, "key-1", "createAccount", create, lambda: _create_account(1, create))
+
+    assert await db.run(Account.select().count) == 1
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert b'"name":"Cash"' in retry.body
@@ -0,0 +1,89 @@
+import json
+import logging
+
+from src.expenis.core.logging_config import BackgroundQueueHandler, DeduplicateFilter, JsonFormatter
+from src.expenis.core.tracing import TraceIdFilter, tracer
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.lines = []
+
+    def emit(self, record):
+        self.records.append(record)
+        self.lines.append(self.format(record))
+
+
+def _logger(name, *filters):
+    output = _ListHandler()
+    handler = BackgroundQueueHandler([output])
+    for f in filters:
+        handler.addFilter(f)
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger, handler, output
+
+
+def test_records_are_written_by_the_listener_with_the_callers_trace_id():
+    logger, handler, output = _logger("test.queue", TraceIdFilter())
+    output.setFormatter(logging.Formatter("%(trace_id)s %(message)s"))
+    args = ["before"]
+
+    with tracer.span("job") as span:
+        logger.info("value %s", args)
+    args[0] = "after"
+    handler.close()
+
+    assert output.lines == [f"{span.trace_id} value ['before']"]
+
+
+def test_exceptions_survive_the_queue_as_text():
+    logger, handler, output = _logger("test.queue.exc")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("failed")
+    handler.close()
+
+    record = output.records[0]
+    assert record.exc_info is None
+    assert "ValueError: boom" in record.exc_text
+    assert "ValueError: boom" in output.lines[0]
+
+
+def test_dedup_lets_a_burst_through_then_reports_the_suppressed_count(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("src.expenis.core.logging_config.time.monotonic", lambda: clock[0])
+    logger, handler, output = _logger("test.queue.dedup", DeduplicateFilter(window_seconds=10, burst=2))
+
+    for i in range(5):
+        logger.error("auth failure: %s", i)
+    logger.info("not deduplicated")
+    logger.info("not deduplicated")
+    clock[0] += 10
+    logger.error("auth failure: %s", 5)
+    handler.close()
+
+    assert [r.getMessage() for r in output.records] == [
+        "auth failure: 0",
+        "auth failure: 1",
+        "not deduplicated",
+        "not deduplicated",
+        "auth failure: 5 [3 similar suppressed in the previous 10s]",
+    ]
+
+
+def test_json_formatter_emits_one_parseable_object():
+    record = logging.LogRecord("expenis", logging.WARNING, __file__, 1, "hello %s", ("мир",), None)
+    record.trace_id = "abc"
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["level"] == "WARNING"
+    assert entry["logger"] == "expenis"
+    assert entry["trace_id"] == "abc"
+    assert entry["message"] == "hello мир"
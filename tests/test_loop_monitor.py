@@ -0,0 +1,42 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from src.expenis.core.loop_monitor import LOOP_LAG_SECONDS, LOOP_STALLS, LoopLagMonitor
+
+
+def _block_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_blocking_call_is_reported_with_its_stack(caplog):
+    caplog.set_level(logging.WARNING, logger="src.expenis.core.loop_monitor")
+    monitor = LoopLagMonitor(interval_seconds=0.01, threshold_seconds=0.05)
+    stalls = LOOP_STALLS.value()
+    observed = LOOP_LAG_SECONDS.count()
+
+    monitor.start()
+    await asyncio.sleep(0.03)
+    _block_loop(0.2)
+    await asyncio.sleep(0.03)
+    await monitor.stop()
+
+    assert LOOP_STALLS.value() == stalls + 1
+    assert LOOP_LAG_SECONDS.count() > observed
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("event loop blocked" in message and "_block_loop" in message for message in messages)
+
+
+@pytest.mark.asyncio
+async def test_idle_loop_reports_no_stalls():
+    monitor = LoopLagMonitor(interval_seconds=0.01, threshold_seconds=0.05)
+    stalls = LOOP_STALLS.value()
+
+    monitor.start()
+    await asyncio.sleep(0.1)
+    await monitor.stop()
+
+    assert LOOP_STALLS.value() == stalls
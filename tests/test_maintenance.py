@@ -0,0 +1,98 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from src.expenis.core.maintenance import DB_MAINTENANCE_PAGES, DB_QUICK_CHECK_FAILURES, checkpoint_wal, \
+    collect_stats, optimize, periodic_optimize, quick_check_next_table, rebuild_derived, vacuum_free_pages
+from src.expenis.core.models import Change, DataVersion, Transaction, db
+from src.expenis.core.seed import seed
+
+
+@pytest.mark.asyncio
+async def test_stats_report_rows_and_heaviest_users():
+    async with db:
+        await seed(users=2, transactions_per_user=40, seed=1)
+        stats = await collect_stats(top_users=1)
+
+    assert stats.row_counts["transactions"] == 80
+    assert stats.db_bytes > 0
+    assert any(index.table == "changes" for index in stats.indexes)
+    assert len(stats.top_users) == 1
+    assert stats.top_users[0][2] == 40
+
+
+@pytest.mark.asyncio
+async def test_optimize_fills_planner_statistics():
+    async with db:
+        await seed(users=1, transactions_per_user=40, seed=1)
+        result = await optimize()
+        stats = await collect_stats()
+
+    assert result.freelist_after <= result.freelist_before or result.auto_vacuum != "incremental"
+    assert any(index.stat for index in stats.indexes if index.table == "transactions")
+
+
+@pytest.mark.asyncio
+async def test_rebuild_derived_backfills_change_log_and_bumps_versions():
+    async with db:
+        await seed(users=1, transactions_per_user=10, seed=1)
+        transaction_id = await db.run(lambda: Transaction.select(Transaction.id).order_by(Transaction.id).scalar())
+        await db.run(lambda: Change.delete().where(
+            (Change.entity == 'transaction') & (Change.entity_id == transaction_id)).execute())
+        before = await db.run(lambda: DataVersion.select(DataVersion.version).scalar())
+
+        result = await rebuild_derived()
+        again = await rebuild_derived()
+        after = await db.run(lambda: DataVersion.select(DataVersion.version).scalar())
+        logged = await db.run(lambda: Change.select().where(
+            (Change.entity == 'transaction') & (Change.entity_id == transaction_id)).count())
+
+    assert result.backfilled_changes == {'account': 0, 'category': 0, 'tag': 0, 'transaction': 1}
+    assert sum(again.backfilled_changes.values()) == 0
+    assert logged == 1
+    assert after == before + 2
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_truncates_wal_over_threshold():
+    wal = Path(db.database + "-wal")
+    async with db:
+        await seed(users=1, transactions_per_user=500, seed=1)
+        assert await checkpoint_wal(threshold_bytes=1 << 40) == 0
+
+        pages = await checkpoint_wal(threshold_bytes=0)
+
+    assert pages > 0
+    assert not wal.exists() or wal.stat().st_size == 0
+
+
+@pytest.mark.asyncio
+async def test_incremental_vacuum_returns_free_pages():
+    conn = sqlite3.connect(db.database)
+    conn.executescript("PRAGMA auto_vacuum = INCREMENTAL; VACUUM;")
+    conn.close()
+    reclaimed_before = DB_MAINTENANCE_PAGES.value("incremental_vacuum")
+    async with db:
+        await seed(users=1, transactions_per_user=2000, seed=1)
+        await db.run(lambda: Change.delete().execute())
+        await checkpoint_wal(threshold_bytes=0)
+
+        reclaimed = await vacuum_free_pages(step_pages=8)
+        stats = await collect_stats()
+
+    assert reclaimed > 0
+    assert stats.freelist_pages == 0
+    assert DB_MAINTENANCE_PAGES.value("incremental_vacuum") == reclaimed_before + reclaimed
+
+
+@pytest.mark.asyncio
+async def test_quick_check_walks_every_table():
+    failures = DB_QUICK_CHECK_FAILURES.value()
+    async with db:
+        await periodic_optimize(analyze=True)
+        tables = (await collect_stats()).row_counts
+        checked = {await quick_check_next_table() for _ in range(len(tables) + 2)}
+
+    assert set(tables) <= checked
+    assert DB_QUICK_CHECK_FAILURES.value() == failures
@@ -0,0 +1,68 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.expenis.core.metrics import Registry
+from src.expenis.core.models import User, db
+from src.expenis.core.models.database import DB_RUN_SECONDS
+from src.expenis.server.middleware import HTTP_IN_FLIGHT, HTTP_REQUESTS, MetricsMiddleware
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5, "/a")
+
+    text = registry.render()
+
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/a"} 3' in text
+    assert 'latency_seconds_sum{route="/a"} 5.55' in text
+
+
+def test_registry_returns_existing_metric_and_rejects_type_clash():
+    registry = Registry()
+    counter = registry.counter("hits_total", "Hits")
+
+    assert registry.counter("hits_total", "Hits") is counter
+    with pytest.raises(ValueError):
+        registry.gauge("hits_total", "Hits")
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter("odd_total", "Odd", ("name",)).inc('a"b\\c')
+
+    assert 'odd_total{name="a\\"b\\\\c"} 1' in registry.render()
+
+
+def test_middleware_labels_requests_by_route_template():
+    async def item(request):
+        return PlainTextResponse(request.path_params["item_id"])
+
+    client = TestClient(MetricsMiddleware(Starlette(routes=[Route("/items/{item_id}", item)])))
+    before = HTTP_REQUESTS.value("GET", "/items/{item_id}", "200")
+
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/nowhere")
+
+    assert HTTP_REQUESTS.value("GET", "/items/{item_id}", "200") == before + 2
+    assert HTTP_REQUESTS.value("GET", "unmatched", "404") >= 1
+    assert HTTP_IN_FLIGHT.value("GET") == 0
+
+
+@pytest.mark.asyncio
+async def test_db_run_is_timed():
+    before = DB_RUN_SECONDS.count()
+    async with db:
+        await db.run(lambda: User.select().count())
+
+    assert DB_RUN_SECONDS.count() > before
@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.expenis.core.profiling import SamplingProfiler, prune_profiles
+from src.expenis.server.middleware import ProfilingMiddleware
+
+
+def _busy(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_sampling_profiler_collects_collapsed_stacks():
+    profiler = SamplingProfiler(threading.get_ident(), interval_seconds=0.001)
+    profiler.start()
+    _busy(0.05)
+    stacks = profiler.stop()
+
+    assert any(":_busy:" in stack for stack in stacks)
+    assert all(";" in stack for stack in stacks)
+
+
+def test_prune_keeps_newest_profiles(tmp_path):
+    for i in range(5):
+        path = tmp_path / f"{i}.collapsed"
+        path.write_text("a 1\n")
+        os.utime(path, (i, i))
+
+    prune_profiles(tmp_path, retention=2)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["3.collapsed", "4.collapsed"]
+
+
+@pytest.mark.parametrize("allowed, expect_profile", [(False, False), (True, True)])
+def test_middleware_profiles_only_authorized_flagged_requests(tmp_path, allowed, expect_profile):
+    async def authorize(scope):
+        return allowed
+
+    async def endpoint(request):
+        return PlainTextResponse("ok")
+
+    app = ProfilingMiddleware(Starlette(routes=[Route("/work", endpoint)]), authorize=authorize,
+                              directory=str(tmp_path), retention=10, interval_seconds=0.001)
+    client = TestClient(app)
+
+    plain = client.get("/work")
+    flagged = client.get("/work", headers={"X-Profile": "1"})
+
+    assert "x-profile-file" not in plain.headers
+    assert ("x-profile-file" in flagged.headers) is expect_profile
+    assert len(list(tmp_path.iterdir())) == int(expect_profile)
@@ -0,0 +1,33 @@
+import json
+from datetime import datetime
+
+from starlette.responses import JSONResponse
+
+from src.expenis.server.runtime import FastJSONResponse, describe, uvicorn_options
+
+
+def test_default_profile_keeps_uvicorn_defaults():
+    assert uvicorn_options("default") == {}
+    line = describe("default", {})
+    assert "backlog=2048" in line
+    assert "access_log=True" in line
+
+
+def test_production_profile_tunes_uvicorn():
+    options = uvicorn_options("production")
+
+    assert options["loop"] in ("uvloop", "asyncio")
+    assert options["http"] in ("httptools", "h11")
+    assert options["access_log"] is False
+    assert options["timeout_keep_alive"] > 60
+    assert f"backlog={options['backlog']}" in describe("production", options)
+
+
+def test_fast_json_response_matches_json_response():
+    content = {"transactions": [{"id": 1, "category": "Продукты", "amount": 12.5, "tags": [], "note": None}],
+               "total_amount_rubles": -12.5, "created_at": datetime(2025, 1, 2, 3, 4, 5).isoformat()}
+
+    fast = FastJSONResponse(content)
+
+    assert json.loads(fast.body) == json.loads(JSONResponse(content).body)
+    assert fast.headers["content-type"] == "application/json"
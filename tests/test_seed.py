@@ -0,0 +1,45 @@
+import pytest
+
+from src.expenis.core.models import Account, Category, Change, DataVersion, Tag, Transaction, TransactionTag, User, db
+from src.expenis.core.seed import SEED_PASSWORD, seed
+from src.expenis.core.service import authenticate_user
+from src.expenis.core.service.sync_service import get_changes_since
+
+
+async def _snapshot() -> list[tuple]:
+    return await db.run(lambda: list(
+        Transaction.select(Transaction.amount, Transaction.description, Transaction.created_at)
+        .order_by(Transaction.id).tuples()
+    ))
+
+
+async def _wipe() -> None:
+    for model in (TransactionTag, Tag, Transaction, Account, Category, User, DataVersion, Change):
+        await db.run(model.truncate_table)
+
+
+@pytest.mark.asyncio
+async def test_same_seed_produces_same_data():
+    async with db:
+        await seed(users=2, transactions_per_user=300, seed=7)
+        first = await _snapshot()
+        await _wipe()
+        await seed(users=2, transactions_per_user=300, seed=7)
+        second = await _snapshot()
+
+    assert len(first) == 600
+    assert first == second
+
+
+@pytest.mark.asyncio
+async def test_seeded_user_can_log_in_and_sync():
+    async with db:
+        stats = await seed(users=1, transactions_per_user=50, seed=3)
+        user = await authenticate_user("seed3-user0", SEED_PASSWORD)
+        page = await get_changes_since(user.id, 0, limit=1000)
+        tagged = await db.run(lambda: TransactionTag.select().count())
+
+    assert stats.transactions == 50
+    assert len(page.transactions) == 50
+    assert len(page.accounts) == stats.accounts
+    assert tagged == stats.transaction_tags
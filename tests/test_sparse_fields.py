@@ -0,0 +1,84 @@
+from datetime import date
+
+import pytest
+from fastapi import HTTPException, Response
+
+from src.expenis.core.models import Account, Category, Transaction, db
+from src.expenis.core.service import save_transaction, set_transaction_tags
+from src.expenis.core.sql_stats import track_queries
+from src.expenis.server.application import _parse_fields, _sparse_response, build_sparse_accounts_response, \
+    build_sparse_transactions_response
+from src.expenis.server.dto import Transaction as TransactionDto
+
+
+@pytest.fixture
+async def transaction():
+    async with db:
+        account = Account(user_id=1, name="Cash", adjustment_amount=10.0)
+        category = Category(user_id=1, name="Food", type="expense")
+        await db.run(account.save)
+        await db.run(category.save)
+        transaction = Transaction(user_id=1, account=account, category=category, amount=4.0, exchange_rate=2.0,
+                                  description="lunch")
+        await save_transaction(transaction)
+        await set_transaction_tags(1, transaction.id, ["work"])
+        return transaction
+
+
+async def test_unused_relations_and_tags_are_not_queried(transaction):
+    today = date.today()
+
+    async with db:
+        with track_queries("test") as stats:
+            content = await build_sparse_transactions_response(1, today, today, None,
+                                                               {"id", "amount_rubles", "created_at"})
+
+    assert stats.count == 1
+    assert content == {"transactions": [{"id": transaction.id, "amount_rubles": 8.0,
+                                         "created_at": transaction.created_at}],
+                       "total_amount_rubles": 8.0}
+
+
+async def test_selected_relations_are_loaded(transaction):
+    today = date.today()
+
+    async with db:
+        with track_queries("test") as stats:
+            content = await build_sparse_transactions_response(1, today, today, None,
+                                                               {"category", "tags", "account_id"})
+
+    # Transactions, their categories and their tags.
+    assert stats.count == 3
+    assert content == {"transactions": [{"account_id": transaction.account_id, "category": "Food",
+                                         "tags": ["work"]}]}
+
+
+async def test_accounts_without_amounts_skip_balances(transaction):
+    async with db:
+        with track_queries("test") as stats:
+            content = await build_sparse_accounts_response(1, {"name"})
+        with_balance = await build_sparse_accounts_response(1, {"amount"})
+
+    assert "SUM" not in " ".join(stats.by_fingerprint)
+    assert content == {"accounts": {transaction.account_id: {"name": "Cash"}}, "total": 1}
+    assert with_balance["accounts"][transaction.account_id] == {"amount": 6.0}
+
+
+def test_unknown_fields_are_rejected():
+    assert _parse_fields(None, TransactionDto) is None
+    assert _parse_fields(" id, amount_rubles ,", TransactionDto) == {"id", "amount_rubles"}
+    for fields in ("", "id,password"):
+        with pytest.raises(HTTPException) as e:
+            _parse_fields(fields, TransactionDto)
+        assert e.value.status_code == 400
+
+
+def test_sparse_response_keeps_dependency_headers():
+    response = Response()
+    del response.headers["content-length"]
+    response.headers["ETag"] = 'W/"3"'
+
+    sparse = _sparse_response({"accounts": {1: {"name": "Cash"}}, "total": 1}, response)
+
+    assert sparse.headers["etag"] == 'W/"3"'
+    assert sparse.body == b'{"accounts":{"1":{"name":"Cash"}},"total":1}'
@@ -0,0 +1,62 @@
+import logging
+
+import pytest
+
+from src.expenis.core.models import User, db
+from src.expenis.core.sql_stats import fingerprint, param_shape, track_queries
+from src.expenis.core.service import create_category
+
+
+def test_fingerprint_collapses_values_and_in_lists():
+    first = fingerprint('SELECT * FROM "t" WHERE ("id" IN (?, ?, ?)) AND "x" = 5')
+    second = fingerprint('SELECT  * FROM "t"\nWHERE ("id" IN (?)) AND "x" = 7')
+
+    assert first == second == 'SELECT * FROM "t" WHERE ("id" IN (...)) AND "x" = ?'
+
+
+def test_fingerprint_collapses_multi_row_values():
+    assert fingerprint('INSERT INTO "t" ("a", "b") VALUES (?, ?), (?, ?), (?, ?)') == \
+        'INSERT INTO "t" ("a", "b") VALUES (...), ...'
+
+
+def test_param_shape_hides_values():
+    assert param_shape([1, "secret", None]) == "(int, str, NoneType)"
+    assert param_shape(None) == "()"
+    assert param_shape(list(range(40))).endswith(", int, ... 40 params)")
+
+
+@pytest.mark.asyncio
+async def test_queries_are_attributed_to_the_active_request():
+    async with db:
+        with track_queries("test") as stats:
+            await create_category(user_id=1, name="food", type="expense")
+            await db.run(lambda: User.select().count())
+
+    assert stats.count >= 3
+    assert stats.seconds > 0
+    assert sum(stats.by_fingerprint.values()) == stats.count
+
+
+@pytest.mark.asyncio
+async def test_repeated_statement_is_reported_once(monkeypatch, caplog):
+    monkeypatch.setattr("src.expenis.core.sql_stats.SQL_REPEATED_QUERY_THRESHOLD", 3)
+    caplog.set_level(logging.WARNING, logger="src.expenis.core.sql_stats")
+    async with db:
+        with track_queries("GET /n-plus-one"):
+            for user_id in range(6):
+                await db.run(lambda: User.get_or_none(User.id == user_id))
+
+    warnings = [record for record in caplog.records if "possible N+1" in record.getMessage()]
+    assert len(warnings) == 1
+    assert "GET /n-plus-one" in warnings[0].getMessage()
+
+
+@pytest.mark.asyncio
+async def test_slow_queries_are_logged(monkeypatch, caplog):
+    monkeypatch.setattr("src.expenis.core.sql_stats.SQL_SLOW_QUERY_MS", 0)
+    caplog.set_level(logging.WARNING, logger="src.expenis.core.sql_stats")
+    async with db:
+        await db.run(lambda: User.get_or_none(User.id == 1))
+
+    assert any("slow query" in record.getMessage() and "(int, int, int)" in record.getMessage()
+               for record in caplog.records)
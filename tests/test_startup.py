@@ -0,0 +1,65 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFERRED = ("httpx", "apscheduler", "src.expenis.core.maintenance", "src.expenis.core.backup",
+            "src.expenis.core.wal_archive")
+
+# Cumulative import time budgets in microseconds, about twice what a 1-CPU
+# VM measures. fastapi and pydantic make up most of authx's share.
+IMPORT_BUDGETS_US = {
+    "src.expenis.server.application": 2_000_000,
+    "authx": 1_400_000,
+    "src.expenis.server.dto": 200_000,
+    "src.expenis.core.models": 100_000,
+    "src.expenis.core.service": 100_000,
+}
+
+
+def _import_times(module: str) -> dict[str, int]:
+    """Cumulative microseconds per module from ``-X importtime`` in a fresh interpreter."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_application_import_leaves_background_modules_for_later():
+    # A fresh interpreter: the test session has imported everything already.
+    code = ("import sys, src.expenis.server.application\n"
+            f"print(','.join(m for m in {DEFERRED!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
+
+def _over_budget(times: dict[str, int]) -> dict[str, int]:
+    return {module: times[module] for module, budget in IMPORT_BUDGETS_US.items() if times[module] > budget}
+
+
+# generate_openapi only adds json and pathlib to the application import.
+@pytest.mark.parametrize("entry_point", ["src.expenis.server.application", "generate_openapi"])
+def test_import_time_budgets(entry_point):
+    times = _import_times(entry_point)
+    assert not set(DEFERRED) & times.keys()
+
+    # A busy machine only ever adds time: keep the fastest of a few runs.
+    for _ in range(2):
+        if not _over_budget(times):
+            break
+        again = _import_times(entry_point)
+        times = {module: min(times[module], again[module]) for module in IMPORT_BUDGETS_US}
+
+    assert _over_budget(times) == {}, f"import time over budget (us): {_over_budget(times)}"
@@ -0,0 +1,134 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from src.expenis.core.models import Tag, Transaction, db
+from src.expenis.core.service import create_account, create_category, delete_account_by_id_and_user_id, \
+    delete_category_by_id_and_user_id
+from src.expenis.core.service.data_version_service import record_changes
+from src.expenis.core.service.sync_service import get_changes_since, get_entity_versions
+from src.expenis.core.service.transaction_service import delete_transaction_by_id_and_user_id, save_transaction, \
+    set_transaction_tags, update_transaction
+
+
+async def _seed(user_id: int = 1):
+    account = await create_account(user_id=user_id, name="cash", adjustment_amount=10.0)
+    category = await create_category(user_id, "food", "expense")
+    transaction = Transaction(user_id=user_id, account=account, category=category, amount=3.0)
+    await save_transaction(transaction)
+    await set_transaction_tags(user_id, transaction.id, ["lunch"])
+    return account, category, transaction
+
+
+@pytest.mark.asyncio
+async def test_initial_sync_returns_current_state():
+    async with db:
+        account, category, transaction = await _seed()
+
+        page = await get_changes_since(1, 0)
+
+        assert not page.has_more
+        assert [a.id for a, _ in page.accounts] == [account.id]
+        assert page.accounts[0][1] == 7.0
+        assert [c.id for c in page.categories] == [category.id]
+        assert [t.id for t in page.transactions] == [transaction.id]
+        assert page.transaction_tags[transaction.id] == ["lunch"]
+        assert page.tags == ["lunch"]
+        assert page.deleted == {'transaction': [], 'account': [], 'category': [], 'tag': []}
+
+
+@pytest.mark.asyncio
+async def test_sync_since_cursor_returns_only_new_changes_and_tombstones():
+    async with db:
+        account, category, transaction = await _seed()
+        cursor = (await get_changes_since(1, 0)).cursor
+
+        assert (await get_changes_since(1, cursor)).transactions == []
+
+        await delete_transaction_by_id_and_user_id(1, transaction.id)
+        other = await create_category(1, "rent", "expense")
+        await delete_category_by_id_and_user_id(1, category.id)
+        await delete_account_by_id_and_user_id(1, account.id)
+
+        page = await get_changes_since(1, cursor)
+        assert page.cursor > cursor
+        assert page.transactions == []
+        assert page.accounts == []
+        assert [c.id for c in page.categories] == [other.id]
+        assert page.deleted == {'transaction': [transaction.id], 'account': [account.id],
+                                'category': [category.id], 'tag': []}
+
+
+@pytest.mark.asyncio
+async def test_sync_pages_through_changes():
+    async with db:
+        for i in range(5):
+            await create_category(1, f"category {i}", "expense")
+
+        seen = []
+        cursor, has_more = 0, True
+        while has_more:
+            page = await get_changes_since(1, cursor, limit=2)
+            seen.extend(c.name for c in page.categories)
+            cursor, has_more = page.cursor, page.has_more
+
+        assert seen == [f"category {i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_sync_is_scoped_by_user():
+    async with db:
+        await _seed(user_id=1)
+        await create_category(2, "other", "income")
+
+        page = await get_changes_since(2, 0)
+        assert [c.name for c in page.categories] == ["other"]
+        assert page.transactions == []
+        assert page.accounts == []
+
+
+@pytest.mark.asyncio
+async def test_entity_versions_track_latest_change_per_entity():
+    async with db:
+        assert await get_entity_versions(1) == {'transaction': 0, 'account': 0, 'category': 0, 'tag': 0}
+
+        account, category, transaction = await _seed()
+        versions = await get_entity_versions(1)
+        # Saving the transaction also logs its account, whose balance moved.
+        assert versions['transaction'] > versions['account'] > versions['category'] > 0
+        assert versions['tag'] > 0
+
+        await create_category(1, "rent", "expense")
+        after = await get_entity_versions(1)
+        assert after['category'] > versions['category']
+        assert after['account'] == versions['account']
+        assert after['transaction'] == versions['transaction']
+        assert await get_entity_versions(2) == {'transaction': 0, 'account': 0, 'category': 0, 'tag': 0}
+
+
+@pytest.mark.asyncio
+async def test_transaction_writes_resync_account_balances():
+    async with db:
+        account, category, transaction = await _seed()
+        other = await create_account(user_id=1, name="card", adjustment_amount=0.0)
+        cursor = (await get_changes_since(1, 0)).cursor
+
+        transaction.account = other
+        await update_transaction(transaction)
+        page = await get_changes_since(1, cursor)
+        assert dict((a.id, balance) for a, balance in page.accounts) == {account.id: 10.0, other.id: -3.0}
+
+        cursor = page.cursor
+        await delete_transaction_by_id_and_user_id(1, transaction.id)
+        page = await get_changes_since(1, cursor)
+        assert [(a.id, balance) for a, balance in page.accounts] == [(other.id, 0.0)]
+
+
+@pytest.mark.asyncio
+async def test_tag_tombstones_are_served():
+    async with db:
+        tag = await db.run(lambda: Tag.create(user_id=1, name="old", created_at=datetime.now(UTC)))
+        await db.run(record_changes, 1, 'tag', [tag.id], 'delete')
+
+        page = await get_changes_since(1, 0)
+        assert page.deleted['tag'] == [tag.id]
@@ -0,0 +1,68 @@
+import logging
+
+import pytest
+
+from src.expenis.core.models import User, db
+from src.expenis.core.service import create_category
+from src.expenis.core.tracing import TraceIdFilter, current_trace_id, tracer
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = ListExporter()
+    monkeypatch.setattr(tracer, "exporter", exporter)
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    yield exporter
+    tracer.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_service_and_db_spans_are_children_of_the_root(exporter):
+    async with db:
+        with tracer.span("GET /test") as root:
+            await create_category(user_id=1, name="food", type="expense")
+    tracer.shutdown()
+
+    by_name = {span.name: span for span in exporter.spans}
+    service = by_name["category_service.create_category"]
+    assert service.parent_id == root.span_id
+    assert by_name["db.run"].parent_id == service.span_id
+    assert {span.trace_id for span in exporter.spans} == {root.trace_id}
+    assert by_name["GET /test"].end_ns >= service.end_ns
+
+
+@pytest.mark.asyncio
+async def test_unsampled_trace_exports_nothing_but_keeps_trace_id(exporter, monkeypatch):
+    monkeypatch.setattr(tracer, "sample_rate", 0.0)
+    async with db:
+        with tracer.span("GET /test") as root:
+            assert current_trace_id() == root.trace_id
+            await db.run(lambda: User.select().count())
+    tracer.shutdown()
+
+    assert exporter.spans == []
+
+
+def test_failed_span_records_error(exporter):
+    with pytest.raises(ValueError):
+        with tracer.span("boom"):
+            raise ValueError("bad")
+    tracer.shutdown()
+
+    assert exporter.spans[0].error == "ValueError: bad"
+
+
+def test_trace_id_filter_tags_log_records():
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "msg", None, None)
+    with tracer.span("job") as span:
+        TraceIdFilter().filter(record)
+
+    assert record.trace_id == span.trace_id
@@ -0,0 +1,96 @@
+import sqlite3
+import time
+from datetime import datetime
+
+import pytest
+
+from src.expenis.core.wal_archive import RestoreError, archive, restore
+
+
+def _writer(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = wal")
+    conn.execute("PRAGMA wal_autocheckpoint = 0")
+    conn.execute("CREATE TABLE IF NOT EXISTS t (id INTEGER PRIMARY KEY, v TEXT)")
+    return conn
+
+
+def _insert(conn, start, count):
+    with conn:
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO t (id, v) VALUES (?, ?)", [(i, "x" * 500) for i in range(start, start + count)])
+
+
+def _ids(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute("SELECT id FROM t ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def _pause():
+    # Archive file names carry millisecond timestamps.
+    time.sleep(0.01)
+
+
+def test_restore_replays_segments_up_to_the_requested_time(tmp_path):
+    db_path, archive_dir = tmp_path / "app.db", tmp_path / "archive"
+    conn = _writer(db_path)
+    _insert(conn, 0, 10)
+    first = archive(str(db_path), str(archive_dir))
+    assert first.base is not None
+
+    _pause()
+    _insert(conn, 10, 200)
+    second = archive(str(db_path), str(archive_dir))
+    _pause()
+    middle = datetime.now()
+    _pause()
+    conn.execute("DELETE FROM t WHERE id < 5")
+    _insert(conn, 210, 5)
+    third = archive(str(db_path), str(archive_dir))
+    conn.close()
+
+    assert second.frames > 0 and second.segment is not None and second.base is None
+    assert third.segment is not None
+
+    at_middle = restore(str(archive_dir), str(tmp_path / "middle.db"), to=middle)
+    assert _ids(tmp_path / "middle.db") == list(range(210))
+    assert at_middle.segments == [second.segment]
+
+    restore(str(archive_dir), str(tmp_path / "latest.db"))
+    assert _ids(tmp_path / "latest.db") == list(range(5, 215))
+
+
+def test_foreign_checkpoint_starts_a_new_base(tmp_path):
+    db_path, archive_dir = tmp_path / "app.db", tmp_path / "archive"
+    conn = _writer(db_path)
+    _insert(conn, 0, 10)
+    archive(str(db_path), str(archive_dir))
+
+    _pause()
+    _insert(conn, 10, 10)
+    # Frames reach the database file without passing through the archive.
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    _insert(conn, 20, 10)
+    result = archive(str(db_path), str(archive_dir))
+    conn.close()
+
+    assert result.segment is None
+    assert result.base is not None
+    restore(str(archive_dir), str(tmp_path / "restored.db"))
+    assert _ids(tmp_path / "restored.db") == list(range(30))
+
+
+def test_restore_refuses_times_before_the_first_base(tmp_path):
+    db_path, archive_dir = tmp_path / "app.db", tmp_path / "archive"
+    conn = _writer(db_path)
+    before = datetime.now()
+    _pause()
+    archive(str(db_path), str(archive_dir))
+    conn.close()
+
+    with pytest.raises(RestoreError):
+        restore(str(archive_dir), str(tmp_path / "restored.db"), to=before)
+    assert not (tmp_path / "restored.db").exists()
@@ -0,0 +1,63 @@
+import asyncio
+
+from src.expenis.core.cache import Cache
+from src.expenis.core.models import DataVersion, db
+from src.expenis.core.service import data_version_service
+from src.expenis.core.service.data_version_service import bump_data_version, get_data_version, share_data_versions
+from src.expenis.core.workers import LeaderLock, SharedCounters
+
+
+def test_only_one_leader_until_it_releases(tmp_path):
+    first, second = LeaderLock(tmp_path / "scheduler.lock"), LeaderLock(tmp_path / "scheduler.lock")
+
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_counters_are_shared_between_mappings(tmp_path):
+    one, other = SharedCounters(tmp_path / "counters", slots=8), SharedCounters(tmp_path / "counters", slots=8)
+
+    one.bump(3)
+    one.bump(11)
+
+    assert other.get(3) == 2
+    assert other.get(4) == 0
+    one.close()
+    other.close()
+
+
+async def test_cached_version_is_reloaded_after_another_worker_commits(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_version_service, "_counters", None)
+    share_data_versions(SharedCounters(tmp_path / "data_versions"))
+    other_worker = SharedCounters(tmp_path / "data_versions")
+
+    async with db:
+        async with db.atomic():
+            await db.run(bump_data_version, 1)
+        assert await get_data_version(1) == 1
+
+        # Another process commits a write: the row changes, then the stamp.
+        await db.run(lambda: DataVersion.update(version=5).where(DataVersion.user_id == 1).execute())
+        assert await get_data_version(1) == 1
+        other_worker.bump(1)
+        assert await get_data_version(1) == 5
+
+
+async def test_shared_entry_is_computed_by_one_caller(tmp_path, monkeypatch):
+    monkeypatch.setattr(Cache, "_cache", {})
+    calls = []
+
+    async def rates():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"USD": 90.0}
+
+    worker_a = Cache(str(tmp_path)).cached(ttl_seconds=60, shared=True)(rates)
+    worker_b = Cache(str(tmp_path)).cached(ttl_seconds=60, shared=True)(rates)
+
+    assert await asyncio.gather(worker_a(), worker_b()) == [{"USD": 90.0}, {"USD": 90.0}]
+    assert len(calls) == 1
+    assert (tmp_path / "rates.json").exists()
@@ -11,7 +11,7 @@ from src.expenis.core.service.transaction_service import (delete_transaction,
                                                           get_transactions_for_period,
                                                           get_user_tags,
                                                           set_transaction_tags,
-                                                          save_transaction)
+                                                          save_transaction, TransactionFilter)
 
 
 @pytest.fixture
@@ -190,3 +190,51 @@ async def test_get_user_tags_is_scoped_by_user(test_account, test_category):
 
         assert await get_user_tags(1) == ["food"]
         assert await get_user_tags(2) == ["food", "transport"]
+
+
+@pytest.mark.asyncio
+async def test_get_transactions_for_period_filters(test_account, test_category):
+    today = date.today()
+
+    async with db:
+        other_account = Account(user_id=1, name="Card")
+        expense_category = Category(user_id=1, name="Food", type="expense")
+        await db.run(other_account.save)
+        await db.run(expense_category.save)
+        salary = Transaction(user_id=1, account=test_account, category=test_category, amount=1000.0,
+                             description="Зарплата")
+        groceries = Transaction(user_id=1, account=other_account, category=expense_category, amount=50.0,
+                                description="Продукты в МАГАЗИНЕ")
+        lunch = Transaction(user_id=1, account=other_account, category=expense_category, amount=15.0,
+                            description="Обед")
+        for transaction in (salary, groceries, lunch):
+            await save_transaction(transaction)
+        await set_transaction_tags(1, groceries.id, ["home", "food"])
+        await set_transaction_tags(1, lunch.id, ["food"])
+
+        async def ids(**filters) -> set[int]:
+            transactions = await get_transactions_for_period(1, today, today, TransactionFilter(**filters))
+            return {transaction.id for transaction in transactions}
+
+        assert await ids() == {salary.id, groceries.id, lunch.id}
+        assert await ids(account_id=other_account.id) == {groceries.id, lunch.id}
+        assert await ids(category_id=test_category.id) == {salary.id}
+        assert await ids(type="expense") == {groceries.id, lunch.id}
+        assert await ids(tags=("food",)) == {groceries.id, lunch.id}
+        assert await ids(tags=("food", "home")) == {groceries.id}
+        assert await ids(min_amount=15.0, max_amount=50.0) == {groceries.id, lunch.id}
+        assert await ids(min_amount=20.0) == {salary.id, groceries.id}
+        assert await ids(description_contains="магазине") == {groceries.id}
+        assert await ids(type="expense", max_amount=20.0, tags=("food",)) == {lunch.id}
+
+
+@pytest.mark.asyncio
+async def test_tag_filter_is_scoped_by_user(test_account, test_category):
+    today = date.today()
+
+    async with db:
+        transaction = Transaction(user_id=1, account=test_account, category=test_category, amount=10.0)
+        await save_transaction(transaction)
+        await set_transaction_tags(1, transaction.id, ["food"])
+
+        assert await get_transactions_for_period(2, today, today, TransactionFilter(tags=("food",))) == []